@@ -0,0 +1,187 @@
+import asyncio
+
+import numpy as np
+
+from app.loader import parse_month_url, peek_loaded, refresh_month
+from app.metrics import cache_access
+from app.stats import heatmap_matrices
+from app.storage import local_month_state, read_json, write_json
+from app.store import RESULT_LOSS, get_month_store_paths, source_mtime_ns
+
+# Versione del formato degli aggregati mensili: se cambia, vengono ricalcolati
+AGGREGATE_VERSION = 1
+
+# Funzione per ottenere la chiave con cui salvare la heatmap di un fuso orario
+def timezone_key(timezone):
+    return getattr(timezone, "key", None) or "server"
+
+# Funzione per ottenere il percorso dell'aggregato di un mese
+def get_month_aggregate_path(username, year, month):
+    npz_path, _ = get_month_store_paths(username, year, month)
+    return npz_path.with_suffix(".agg.json")
+
+# Funzione per contare i risultati [sconfitte, patte, vittorie] di un array di codici risultato
+def _result_counts(result):
+    return np.bincount(np.asarray(result, dtype=np.int64) - RESULT_LOSS, minlength=3).tolist()
+
+# Funzione per calcolare la heatmap 7x24x3 (giorno, ora, [sconfitte, patte, vittorie]) di un mese
+def _month_heatmap(columns, timezone):
+    matrices = heatmap_matrices(columns["end_time"], columns["result"], timezone)
+    return np.stack([matrices["losses"], matrices["draws"], matrices["wins"]], axis=2).tolist()
+
+# Funzione per calcolare l'aggregato di un mese dalle sue colonne:
+# risultati per colore, risultati e rating (primo/ultimo/min/max) per cadenza, heatmap per fuso orario
+def month_aggregate(columns, timezone=None):
+    end_time = columns["end_time"]
+    result = columns["result"]
+    is_white = columns["is_white"]
+    user_rating = columns["user_rating"]
+
+    time_classes = {}
+    codes = columns["time_class_codes"]
+    for code, name in enumerate(columns["time_class_names"].tolist()):
+        mask = codes == code
+        if not mask.any():
+            continue
+        times = end_time[mask]
+        ratings = user_rating[mask]
+        first, last = np.argmin(times), np.argmax(times)
+        time_classes[name] = {
+            "results": _result_counts(result[mask]),
+            "first_time": int(times[first]),
+            "first_rating": int(ratings[first]),
+            "last_time": int(times[last]),
+            "last_rating": int(ratings[last]),
+            "min_rating": int(ratings.min()),
+            "max_rating": int(ratings.max()),
+        }
+
+    record = {
+        "version": AGGREGATE_VERSION,
+        "games": int(len(end_time)),
+        "results": {
+            "white": _result_counts(result[is_white]),
+            "black": _result_counts(result[~is_white]),
+        },
+        "time_classes": time_classes,
+        "heatmap": {},
+    }
+    if timezone is not None:
+        record["heatmap"][timezone_key(timezone)] = _month_heatmap(columns, timezone)
+    return record
+
+# Funzione per leggere l'aggregato salvato di un mese (None se mancante o non più valido)
+def load_month_aggregate(username, year, month):
+    record = read_json(get_month_aggregate_path(username, year, month))
+    if record is None:
+        return None
+    if record.get("version") != AGGREGATE_VERSION or record.get("source_mtime_ns") != source_mtime_ns(username, year, month):
+        return None
+    return record
+
+# Funzione per salvare l'aggregato di un mese chiuso
+def save_month_aggregate(username, year, month, record):
+    record = {**record, "source_mtime_ns": source_mtime_ns(username, year, month)}
+    write_json(get_month_aggregate_path(username, year, month), record)
+
+# Funzione per verificare se un mese è chiuso e già in cache (quindi il suo aggregato non cambia più)
+def _is_month_final(username, year, month):
+    _, _, immutable = local_month_state(username, year, month)
+    return immutable
+
+# Funzione per ottenere l'aggregato aggiornato di un mese.
+# I mesi chiusi vengono riassunti una sola volta e poi letti dal file .agg.json;
+# gli altri (il mese corrente) vengono ricalcolati dalle colonne a ogni richiesta.
+async def _month_aggregate(username, year, month, month_url, timezone, loaded_columns):
+    stored = None
+    final = await asyncio.to_thread(_is_month_final, username, year, month)
+    if final:
+        stored = await asyncio.to_thread(load_month_aggregate, username, year, month)
+        if stored is not None and (timezone is None or timezone_key(timezone) in stored["heatmap"]):
+            cache_access("aggregate", "hit")
+            return "cache", stored
+    cache_access("aggregate", "miss")
+
+    if loaded_columns is not None:
+        source, columns = "cache", loaded_columns
+    else:
+        source, columns = await refresh_month(username, year, month, month_url)
+    if columns is None:
+        return source, None
+
+    record = month_aggregate(columns, timezone)
+    if stored is not None:
+        # Mantiene le heatmap già calcolate per altri fusi orari
+        record["heatmap"] = {**stored["heatmap"], **record["heatmap"]}
+    if final or await asyncio.to_thread(_is_month_final, username, year, month):
+        await asyncio.to_thread(save_month_aggregate, username, year, month, record)
+    return source, record
+
+# Funzione per ottenere gli aggregati di un insieme di mesi.
+# Se le partite sono appena state caricate (ad es. da download-games) si riusano le loro colonne.
+async def load_month_aggregates(username, month_urls, timezone=None):
+    loaded = peek_loaded(username, month_urls)
+    loaded_segments = dict(loaded["segments"]) if loaded else {}
+
+    month_infos = [(*parse_month_url(month_url), month_url) for month_url in month_urls]
+    results = await asyncio.gather(*[
+        _month_aggregate(username, year, month, month_url, timezone, loaded_segments.get((year, month)))
+        for year, month, month_url in month_infos
+    ], return_exceptions=True)
+
+    records = []
+    cache_used = 0
+    api_requests = 0
+    for (year, month, _), result in zip(month_infos, results):
+        if isinstance(result, Exception):
+            print(f"Errore nel calcolo dell'aggregato del mese {year}/{month}: {str(result)}")
+            continue
+        source, record = result
+        if source == "api":
+            api_requests += 1
+        else:
+            cache_used += 1
+        if record is not None:
+            records.append(record)
+
+    cache_info = loaded["cache_info"] if loaded else {
+        "months_from_cache": cache_used,
+        "months_from_api": api_requests
+    }
+    return records, cache_info
+
+# Funzione per sommare gli aggregati di più mesi: sommario, statistiche per cadenza e heatmap
+def combine_aggregates(records, timezone=None):
+    by_color = {"white": np.zeros(3, dtype=np.int64), "black": np.zeros(3, dtype=np.int64)}
+    time_classes = {}
+    heatmap = np.zeros((7, 24, 3), dtype=np.int64)
+    key = timezone_key(timezone) if timezone is not None else None
+
+    for record in records:
+        for color in by_color:
+            by_color[color] += record["results"][color]
+        for name, stats in record["time_classes"].items():
+            current = time_classes.get(name)
+            if current is None:
+                time_classes[name] = {**stats, "results": list(stats["results"])}
+                continue
+            current["results"] = [a + b for a, b in zip(current["results"], stats["results"])]
+            if stats["first_time"] < current["first_time"]:
+                current["first_time"], current["first_rating"] = stats["first_time"], stats["first_rating"]
+            if stats["last_time"] > current["last_time"]:
+                current["last_time"], current["last_rating"] = stats["last_time"], stats["last_rating"]
+            current["min_rating"] = min(current["min_rating"], stats["min_rating"])
+            current["max_rating"] = max(current["max_rating"], stats["max_rating"])
+        if key is not None:
+            heatmap += np.asarray(record["heatmap"][key], dtype=np.int64)
+
+    totals = by_color["white"] + by_color["black"]
+    summary = {
+        "total_games": int(totals.sum()),
+        "wins": int(totals[2]),
+        "losses": int(totals[0]),
+        "draws": int(totals[1]),
+        "as_white": int(by_color["white"].sum()),
+        "as_black": int(by_color["black"].sum()),
+    }
+    return {"summary": summary, "time_classes": time_classes, "heatmap": heatmap}
@@ -0,0 +1,55 @@
+import threading
+from collections import OrderedDict
+
+from app.gamedb import DEFAULT_RATING_BUCKET, month_key, results_by_rating_diff, streaks, sync_games, top_opponents
+from app.metrics import cache_access
+
+# Numero di avversari riportati di default (i più affrontati) e massimo consentito
+DEFAULT_TOP_OPPONENTS = 10
+MAX_TOP_OPPONENTS = 100
+
+# Numero massimo di risultati tenuti in memoria (i meno usati di recente vengono scartati)
+MAX_CACHED_ANALYTICS = 64
+
+# Analisi già calcolate: (utente, impronta dei mesi, parametri) -> (versione dei dati, risultato)
+_analytics_cache = OrderedDict()
+
+# Il calcolo avviene nei thread (asyncio.to_thread), quindi la cache va protetta da un lock
+_cache_lock = threading.Lock()
+
+# Funzione per calcolare le statistiche avanzate dei mesi caricati (loaded["segments"]) con le query
+# sul database delle partite: risultati per fascia di differenza di rating, bilancio contro i top
+# avversari e serie di risultati consecutivi. I mesi cambiati vengono prima importati nel database.
+def compute_analytics(username, segments, bucket=DEFAULT_RATING_BUCKET, top=DEFAULT_TOP_OPPONENTS, time_class=None):
+    sync_games(username, segments)
+    months = [month_key(year, month) for (year, month), _ in segments]
+    rating_diff = results_by_rating_diff(username, months, bucket, time_class)
+    return {
+        "total_games": sum(row["games"] for row in rating_diff),
+        "time_class": time_class,
+        "bucket": bucket,
+        "rating_diff": rating_diff,
+        "opponents": top_opponents(username, months, top, time_class),
+        "streaks": streaks(username, months, time_class),
+    }
+
+# Funzione per ottenere le statistiche avanzate di un caricamento, memorizzate per
+# (utente, impronta dei mesi, parametri): si ricalcolano solo se cambia la versione dei dati.
+# Ritorna (risultato, True se riusato dalla cache).
+def cached_analytics(username, fingerprint, version, segments, bucket=DEFAULT_RATING_BUCKET, top=DEFAULT_TOP_OPPONENTS, time_class=None):
+    key = (username.lower(), fingerprint, bucket, top, time_class or "")
+    with _cache_lock:
+        cached = _analytics_cache.get(key)
+        if cached is not None and cached[0] == version:
+            _analytics_cache.move_to_end(key)
+            cache_access("analytics", "hit")
+            return cached[1], True
+
+    cache_access("analytics", "miss")
+    result = compute_analytics(username, segments, bucket, top, time_class)
+    with _cache_lock:
+        _analytics_cache[key] = (version, result)
+        _analytics_cache.move_to_end(key)
+        while len(_analytics_cache) > MAX_CACHED_ANALYTICS:
+            _analytics_cache.popitem(last=False)
+    return result, False
@@ -0,0 +1,250 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.metrics import cache_access, inc, observe, span
+from app.scheduler import (
+    MAX_RETRIES,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_MONTH,
+    RETRY_STATUSES,
+    acquire,
+    backoff_delay,
+    parse_retry_after,
+    record_response,
+    reset_scheduler,
+)
+from app.shared_cache import shared_get, shared_lock, shared_set
+from app.storage import dumps_json, loads_json
+
+# URL base delle API pubbliche di Chess.com (configurabile, ad es. per usare un server di test locale)
+CHESS_COM_API = os.environ.get("CHESS_STAT_API_BASE", "https://api.chess.com/pub").rstrip("/")
+
+# Definizione degli headers standard per le richieste all'API di Chess.com
+CHESS_COM_HEADERS = {
+    "User-Agent": "Chess.com Stats Downloader/1.0 (Python/FastAPI; Contact: your-email@example.com)",
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive"
+}
+
+# Timeout (in secondi) per ogni richiesta verso Chess.com
+REQUEST_TIMEOUT = 10
+
+# Numero massimo di richieste contemporanee verso lo stesso host
+MAX_CONCURRENCY_PER_HOST = int(os.environ.get("CHESS_STAT_MAX_CONCURRENCY_PER_HOST", "4"))
+
+# Durata (in secondi) in cache delle risposte di profilo, statistiche e archivi
+LOOKUP_TTL = int(os.environ.get("CHESS_STAT_LOOKUP_TTL", "300"))
+
+# Durata (in secondi) in cache delle risposte 404 (utente inesistente o senza archivi)
+NOT_FOUND_TTL = int(os.environ.get("CHESS_STAT_NOT_FOUND_TTL", "60"))
+
+# Numero massimo di risposte tenute in cache (le meno usate di recente vengono scartate)
+MAX_CACHED_LOOKUPS = 1024
+
+# Client HTTP condiviso (pool di connessioni) per tutta la durata dell'applicazione
+_client = None
+
+# Semafori per limitare la concorrenza verso ciascun host
+_host_semaphores = {}
+
+# Risposte in cache in ordine di utilizzo: URL -> (scadenza, risposta)
+_lookup_cache = OrderedDict()
+
+# Richieste in corso: URL -> task condiviso tra le richieste concorrenti
+_lookup_in_flight = {}
+
+# Funzione per creare il client HTTP condiviso (chiamata all'avvio dell'app)
+async def start_client():
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers=CHESS_COM_HEADERS,
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=MAX_CONCURRENCY_PER_HOST * 4,
+                max_keepalive_connections=MAX_CONCURRENCY_PER_HOST * 2
+            ),
+            follow_redirects=True
+        )
+    return _client
+
+# Funzione per chiudere il client HTTP condiviso (chiamata allo spegnimento dell'app)
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _host_semaphores.clear()
+    _lookup_cache.clear()
+    _lookup_in_flight.clear()
+    reset_scheduler()
+
+# Funzione per ottenere il semaforo associato all'host di un URL
+def get_host_semaphore(url):
+    host = urlsplit(url).netloc
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(MAX_CONCURRENCY_PER_HOST)
+        _host_semaphores[host] = semaphore
+    return semaphore
+
+# Funzione per eseguire una GET verso Chess.com passando dallo scheduler: attende il proprio turno
+# (token bucket + priorità), rispetta il limite di concorrenza per host e ripete la richiesta con
+# backoff esponenziale su 403/429/5xx ed errori di rete. Dopo MAX_RETRIES tentativi ritorna l'ultima risposta.
+async def api_get(url, headers=None, priority=PRIORITY_INTERACTIVE):
+    client = await start_client()
+    for attempt in range(MAX_RETRIES + 1):
+        await acquire(priority)
+        try:
+            async with get_host_semaphore(url):
+                response = await _timed_get(client, url, headers)
+        except httpx.TransportError as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Errore di rete verso {url} ({str(e)}): nuovo tentativo tra {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        record_response(response.status_code, retry_after)
+        if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            return response
+        delay = backoff_delay(attempt, retry_after)
+        print(f"Chess.com ha risposto {response.status_code} per {url}: nuovo tentativo tra {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+# Funzione per eseguire una GET registrando latenza, esito e richieste in corso verso Chess.com
+async def _timed_get(client, url, headers):
+    inc("chess_stat_upstream_in_flight")
+    started = time.perf_counter()
+    status = "error"
+    try:
+        response = await client.get(url, headers=headers)
+        status = response.status_code
+        return response
+    finally:
+        inc("chess_stat_upstream_in_flight", -1)
+        observe("chess_stat_upstream_seconds", time.perf_counter() - started)
+        inc("chess_stat_upstream_requests_total", status=status)
+
+# Funzione chiamata al termine di una richiesta in cache: memorizza le risposte 200 per LOOKUP_TTL
+# secondi e i 404 per NOT_FOUND_TTL. Errori e limitazioni (403/429/5xx) non vengono memorizzati.
+def _finish_lookup(key, task, ttl):
+    _lookup_in_flight.pop(key, None)
+    if task.cancelled() or task.exception() is not None:
+        return
+    response = task.result()
+    if response.status_code == 200:
+        expires_in = ttl
+    elif response.status_code == 404:
+        expires_in = NOT_FOUND_TTL
+    else:
+        return
+    _lookup_cache[key] = (time.monotonic() + expires_in, response)
+    _lookup_cache.move_to_end(key)
+    while len(_lookup_cache) > MAX_CACHED_LOOKUPS:
+        _lookup_cache.popitem(last=False)
+
+# Funzione per ricostruire una risposta salvata nella cache condivisa tra i worker (None se assente)
+async def _shared_response(shared_key, url):
+    raw = await shared_get(shared_key)
+    if raw is None:
+        return None
+    stored = loads_json(raw)
+    return httpx.Response(
+        stored["status"],
+        headers={"Content-Type": stored["content_type"]},
+        content=stored["content"].encode("utf-8"),
+        request=httpx.Request("GET", url)
+    )
+
+# Funzione per eseguire una GET passando dalla cache condivisa tra i worker: se un altro worker ha già
+# la risposta la si riusa, altrimenti un solo worker alla volta la richiede a Chess.com e la salva
+# (200 per ttl secondi, 404 per NOT_FOUND_TTL)
+async def _shared_lookup(key, url, ttl):
+    shared_key = f"lookup:{key}"
+    response = await _shared_response(shared_key, url)
+    if response is not None:
+        cache_access("shared_lookup", "hit")
+        return response
+
+    async with shared_lock(shared_key):
+        # Mentre si attendeva il lock un altro worker potrebbe aver già salvato la risposta
+        response = await _shared_response(shared_key, url)
+        if response is not None:
+            cache_access("shared_lookup", "hit")
+            return response
+
+        cache_access("shared_lookup", "miss")
+        response = await api_get(url)
+        if response.status_code in (200, 404):
+            stored = {
+                "status": response.status_code,
+                "content_type": response.headers.get("Content-Type", "application/json"),
+                "content": response.text
+            }
+            await shared_set(shared_key, dumps_json(stored), ttl if response.status_code == 200 else NOT_FOUND_TTL)
+        return response
+
+# Funzione per eseguire una GET con cache (TTL + LRU) per profilo, statistiche e archivi.
+# Le richieste concorrenti per lo stesso URL condividono un'unica chiamata a Chess.com,
+# anche tra worker diversi grazie alla cache condivisa.
+async def cached_get(url, ttl=LOOKUP_TTL):
+    # I nomi utente di Chess.com non distinguono maiuscole e minuscole
+    key = url.lower()
+    cached = _lookup_cache.get(key)
+    if cached:
+        if cached[0] > time.monotonic():
+            _lookup_cache.move_to_end(key)
+            cache_access("lookup", "hit")
+            return cached[1]
+        del _lookup_cache[key]
+
+    task = _lookup_in_flight.get(key)
+    if task is None:
+        cache_access("lookup", "miss")
+        task = asyncio.ensure_future(_shared_lookup(key, url, ttl))
+        _lookup_in_flight[key] = task
+        task.add_done_callback(lambda finished: _finish_lookup(key, finished, ttl))
+    else:
+        cache_access("lookup", "shared")
+
+    # shield: se una richiesta viene annullata, la chiamata prosegue per le altre
+    return await asyncio.shield(task)
+
+# Funzione per scaricare un mese di partite con una richiesta condizionale.
+# validators contiene "etag" e "last_modified" della copia in cache (se presente).
+# Ritorna (status_code, dati, validatori): con 304 i dati sono None e la cache è ancora valida.
+# priority permette agli import massivi di lasciare il passo alle richieste della UI;
+# con parse=False i dati sono il JSON grezzo (bytes), da decodificare altrove.
+async def fetch_month(month_url, validators=None, priority=PRIORITY_MONTH, parse=True):
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    with span("upstream_fetch"):
+        response = await api_get(month_url, headers=headers, priority=priority)
+    new_validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified")
+    }
+    if response.status_code == 200:
+        if not parse:
+            return 200, response.content, new_validators
+        # La decodifica di un mese può richiedere decine di millisecondi: avviene in un thread
+        with span("parse"):
+            month_data = await asyncio.to_thread(loads_json, response.content)
+        return 200, month_data, new_validators
+    if response.status_code == 304:
+        return 304, None, {key: new_validators[key] or (validators or {}).get(key) for key in new_validators}
+    return response.status_code, None, validators
@@ -0,0 +1,122 @@
+import mimetypes
+import re
+import zlib
+from email.utils import formatdate
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from app.exports import EXPORTS_DIR
+
+# Dimensione dei blocchi letti dal disco e inviati al client
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# Tipi di contenuto dei file esportati (per le estensioni non note a mimetypes)
+CONTENT_TYPES = {
+    ".csv": "text/csv; charset=utf-8",
+    ".json": "application/json",
+    ".gz": "application/gzip",
+    ".parquet": "application/vnd.apache.parquet",
+}
+
+# Estensioni dei file che vale la pena comprimere al volo (gli altri sono già compressi)
+COMPRESSIBLE_SUFFIXES = {".csv", ".json"}
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Funzione per ottenere il percorso di un file scaricabile, verificando che sia dentro downloads/.
+# Ritorna None per nomi non validi, file inesistenti o percorsi che escono dalla cartella.
+def resolve_download_path(file_name):
+    base_dir = EXPORTS_DIR.resolve()
+    try:
+        full_path = (base_dir / file_name).resolve()
+    except (OSError, ValueError):
+        return None
+    if full_path.parent != base_dir or full_path.name.startswith(".") or not full_path.is_file():
+        return None
+    return full_path
+
+# Funzione per ottenere il Content-Type di un file esportato
+def content_type(path):
+    return CONTENT_TYPES.get(path.suffix) or mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+# Funzione per ottenere l'ETag di un file (dimensione + data di modifica)
+def file_etag(stat_result):
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+# Funzione per ottenere gli header comuni a tutte le risposte di download
+def download_headers(path, stat_result):
+    return {
+        "Content-Disposition": f'attachment; filename="{path.name}"',
+        "Accept-Ranges": "bytes",
+        "ETag": file_etag(stat_result),
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+    }
+
+# Funzione per interpretare l'header Range (un solo intervallo "bytes=inizio-fine").
+# Ritorna (inizio, fine inclusa), None se l'header va ignorato (si invia tutto il file)
+# oppure solleva ValueError se l'intervallo non è soddisfacibile.
+def parse_range(range_header, size):
+    match = _RANGE_RE.match(range_header.strip())
+    if not match or match.groups() == ("", ""):
+        # Intervalli multipli o sintassi non supportata: risposta completa (consentito dallo standard)
+        return None
+    first, last = match.groups()
+    if first == "":
+        # "bytes=-N": ultimi N byte
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Intervallo non soddisfacibile")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Intervallo non soddisfacibile")
+    return start, end
+
+# Funzione per scegliere la compressione al volo in base ad Accept-Encoding (zstd se disponibile, poi gzip)
+def negotiate_encoding(path, accept_encoding):
+    if path.suffix not in COMPRESSIBLE_SUFFIXES or not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    if zstandard is not None and accepted.get("zstd", 0) > 0:
+        return "zstd"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+# Generatore che legge un file (o un suo intervallo) a blocchi, con memoria costante
+def iter_file(path, start=0, end=None):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = f.read(DOWNLOAD_CHUNK_SIZE if remaining is None else min(DOWNLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+# Generatore che comprime al volo (gzip o zstd) il contenuto di un file letto a blocchi
+def iter_compressed(path, encoding):
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in iter_file(path):
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,202 @@
+import asyncio
+import gzip
+import hashlib
+import importlib.util
+import os
+import time
+import uuid
+from pathlib import Path
+
+from app.loader import data_version, load_games, months_fingerprint
+from app.metrics import span
+from app.shared_cache import get_backend, shared_get
+from app.stats import games_frame
+from app.storage import dumps_json, loads_json
+
+# Directory in cui vengono salvati i file esportati (la cache degli utenti è in downloads/users)
+EXPORTS_DIR = Path("downloads")
+EXPORTS_DIR.mkdir(exist_ok=True, parents=True)
+
+# Spazio massimo occupato dagli export: oltre questo limite vengono eliminati i file meno recenti
+EXPORTS_MAX_BYTES = int(os.environ.get("CHESS_STAT_EXPORTS_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Righe scritte per ogni blocco (ogni blocco aggiorna l'avanzamento del job)
+EXPORT_CHUNK_ROWS = 5000
+
+# Numero massimo di job conservati in memoria per le richieste di stato
+MAX_JOBS = 200
+
+# Per quanto tempo (in secondi) lo stato di un job resta consultabile dagli altri worker
+JOB_STATUS_TTL = 24 * 3600
+
+# Formati di export supportati e relativa estensione
+EXPORT_FORMATS = {
+    "csv": ".csv",
+    "csv.gz": ".csv.gz",
+    "json": ".json",
+    "json.gz": ".json.gz",
+    "parquet": ".parquet",
+}
+
+# Job di export: id -> stato del job
+_jobs = {}
+
+# Job in corso: (utente, mesi, formato) -> id, per non generare due volte lo stesso file
+_active_jobs = {}
+
+# Riferimenti ai task in esecuzione (evita che vengano raccolti dal garbage collector)
+_tasks = set()
+
+# Funzione per ottenere i formati disponibili (Parquet richiede pyarrow o fastparquet)
+def available_formats():
+    formats = [name for name in EXPORT_FORMATS if name != "parquet"]
+    if importlib.util.find_spec("pyarrow") or importlib.util.find_spec("fastparquet"):
+        formats.append("parquet")
+    return formats
+
+# Funzione per ottenere lo stato pubblico di un job (senza campi interni)
+def job_status(job):
+    return {key: value for key, value in job.items() if not key.startswith("_")}
+
+# Funzione per pubblicare lo stato di un job nella cache condivisa, così che anche gli altri worker
+# possano rispondere alle richieste di stato (sincrona: viene chiamata anche dal thread di scrittura)
+def publish_job(job):
+    try:
+        get_backend()["set"](f"export:{job['id']}", dumps_json(job_status(job)), JOB_STATUS_TTL)
+    except Exception as e:
+        print(f"Errore nella pubblicazione dello stato dell'export {job['id']}: {str(e)}")
+
+# Funzione per scrivere il DataFrame nel formato richiesto, a blocchi, aggiornando l'avanzamento
+def _write_export(loaded, export_format, path, job):
+    df = games_frame(loaded)
+    tmp_path = path.with_name(f".{path.name}.{job['id']}.tmp")
+
+    if export_format == "parquet":
+        df.to_parquet(tmp_path, index=False)
+    else:
+        opener = gzip.open if export_format.endswith(".gz") else open
+        total = max(len(df), 1)
+        with opener(tmp_path, "wt", encoding="utf-8", newline="") as f:
+            if export_format.startswith("json"):
+                f.write("[")
+            for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+                chunk = df.iloc[start:start + EXPORT_CHUNK_ROWS]
+                if export_format.startswith("csv"):
+                    chunk.to_csv(f, index=False, header=(start == 0))
+                else:
+                    # to_json produce "[...]": si tolgono le parentesi e si uniscono i blocchi con ","
+                    if start > 0:
+                        f.write(",")
+                    f.write(chunk.to_json(orient="records")[1:-1])
+                job["progress"] = round(min(start + EXPORT_CHUNK_ROWS, len(df)) / total, 3)
+                publish_job(job)
+            if export_format.startswith("json"):
+                f.write("]")
+
+    os.replace(tmp_path, path)
+
+# Funzione per mantenere la cartella degli export sotto EXPORTS_MAX_BYTES,
+# eliminando per primi i file usati meno di recente
+def cleanup_exports(keep=()):
+    files = [
+        path for path in EXPORTS_DIR.iterdir()
+        if path.is_file() and not path.name.startswith(".")
+    ]
+    total = sum(path.stat().st_size for path in files)
+    for path in sorted(files, key=lambda path: path.stat().st_mtime):
+        if total <= EXPORTS_MAX_BYTES:
+            break
+        if path in keep:
+            continue
+        size = path.stat().st_size
+        try:
+            path.unlink()
+            total -= size
+            print(f"Export eliminato per limite di spazio: {path.name}")
+        except OSError as e:
+            print(f"Errore nell'eliminazione dell'export {path.name}: {str(e)}")
+
+# Esecuzione di un job: carica le partite, genera il file (o riusa quello già esistente) e fa pulizia
+async def _run_export(job, key, username, month_urls):
+    try:
+        job["status"] = "running"
+        await asyncio.to_thread(publish_job, job)
+        loaded = await load_games(username, month_urls)
+        if not loaded["segments"]:
+            raise ValueError("Nessuna partita trovata per il periodo selezionato")
+
+        digest = hashlib.sha1(f"{key[1]}:{data_version(loaded)}".encode("utf-8")).hexdigest()[:16]
+        path = EXPORTS_DIR / f"{username.lower()}_games_{digest}{EXPORT_FORMATS[job['format']]}"
+
+        if path.exists():
+            # Stessi mesi, stessi dati e stesso formato: si riusa il file già generato
+            os.utime(path)
+            job["reused"] = True
+            print(f"Export riutilizzato per {username}: {path.name}")
+        else:
+            with span("export"):
+                await asyncio.to_thread(_write_export, loaded, job["format"], path, job)
+            print(f"Export generato per {username}: {path.name}")
+
+        job.update({
+            "status": "done",
+            "progress": 1.0,
+            "file": path.name,
+            "size": path.stat().st_size,
+            "finished_at": int(time.time())
+        })
+        await asyncio.to_thread(cleanup_exports, {path})
+    except Exception as e:
+        print(f"Errore durante l'export per {username}: {str(e)}")
+        job.update({"status": "error", "error": str(e), "finished_at": int(time.time())})
+    finally:
+        _active_jobs.pop(key, None)
+        await asyncio.to_thread(publish_job, job)
+
+# Funzione per rimuovere i job conclusi più vecchi quando se ne accumulano troppi
+def _trim_jobs():
+    finished = [job for job in _jobs.values() if job["status"] in ("done", "error")]
+    for job in sorted(finished, key=lambda job: job["created_at"])[:max(0, len(_jobs) - MAX_JOBS)]:
+        del _jobs[job["id"]]
+
+# Funzione per avviare (o riprendere, se già in corso) l'export di un insieme di mesi
+def start_export(username, month_urls, export_format):
+    if export_format not in available_formats():
+        raise ValueError(f"Formato di export non supportato: {export_format}")
+
+    key = (username.lower(), months_fingerprint(month_urls), export_format)
+    job_id = _active_jobs.get(key)
+    if job_id is not None:
+        return _jobs[job_id]
+
+    job = {
+        "id": uuid.uuid4().hex,
+        "username": username,
+        "format": export_format,
+        "months": len(set(month_urls)),
+        "status": "queued",
+        "progress": 0.0,
+        "file": None,
+        "size": None,
+        "reused": False,
+        "error": None,
+        "created_at": int(time.time()),
+        "finished_at": None
+    }
+    _jobs[job["id"]] = job
+    _active_jobs[key] = job["id"]
+    _trim_jobs()
+
+    task = asyncio.create_task(_run_export(job, key, username, month_urls))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job
+
+# Funzione per ottenere lo stato pubblico di un job dal suo id (None se sconosciuto).
+# Se il job è stato avviato da un altro worker, lo stato si legge dalla cache condivisa.
+async def get_export(job_id):
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job_status(job)
+    raw = await shared_get(f"export:{job_id}")
+    return loads_json(raw) if raw is not None else None
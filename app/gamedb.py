@@ -0,0 +1,267 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from app.store import RESULT_DRAW, RESULT_LOSS, RESULT_NAMES, RESULT_WIN
+from app.storage import DATA_DIR
+
+# Database SQLite delle partite: una riga per (partita, utente), con i campi dal punto di vista dell'utente.
+# È un indice derivato dalla cache dei mesi: può essere cancellato e viene ricostruito al bisogno.
+GAMES_DB_PATH = Path(os.environ.get("CHESS_STAT_GAMES_DB", str(DATA_DIR / "games.sqlite3")))
+
+# Versione dello schema: se cambia, le tabelle vengono ricreate e ripopolate dalla cache dei mesi
+GAMES_DB_VERSION = 1
+
+# Ampiezza di default (in punti Elo) delle fasce di differenza di rating
+DEFAULT_RATING_BUCKET = 100
+
+# Righe inserite per ogni transazione durante la sincronizzazione
+UPSERT_BATCH_ROWS = 5000
+
+# Schema: la chiave è l'URL della partita (per utente, perché la stessa partita vista dai due giocatori
+# ha colore, risultato e avversario opposti). month ("AAAA_MM") permette di filtrare i mesi selezionati.
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS games (
+        url TEXT NOT NULL,
+        username TEXT NOT NULL,
+        month TEXT NOT NULL,
+        end_time INTEGER NOT NULL,
+        is_white INTEGER NOT NULL,
+        result INTEGER NOT NULL,
+        user_rating INTEGER NOT NULL,
+        opponent_rating INTEGER NOT NULL,
+        opponent TEXT NOT NULL,
+        time_class TEXT NOT NULL,
+        time_control TEXT NOT NULL,
+        variant TEXT NOT NULL,
+        PRIMARY KEY (url, username)
+    )""",
+    "CREATE INDEX IF NOT EXISTS games_username_end_time ON games (username, end_time)",
+    "CREATE INDEX IF NOT EXISTS games_username_time_class ON games (username, time_class)",
+    "CREATE INDEX IF NOT EXISTS games_opponent ON games (opponent)",
+    # Versione della cache da cui è stato importato ogni mese, per non reimportare i mesi invariati
+    """CREATE TABLE IF NOT EXISTS synced_months (
+        username TEXT NOT NULL,
+        month TEXT NOT NULL,
+        source_mtime_ns INTEGER NOT NULL,
+        PRIMARY KEY (username, month)
+    )""",
+)
+
+UPSERT_GAME = """
+    INSERT INTO games (url, username, month, end_time, is_white, result, user_rating, opponent_rating,
+                       opponent, time_class, time_control, variant)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (url, username) DO UPDATE SET
+        month = excluded.month, end_time = excluded.end_time, is_white = excluded.is_white,
+        result = excluded.result, user_rating = excluded.user_rating, opponent_rating = excluded.opponent_rating,
+        opponent = excluded.opponent, time_class = excluded.time_class,
+        time_control = excluded.time_control, variant = excluded.variant
+"""
+
+# Connessioni SQLite, una per thread (le funzioni di questo modulo vengono eseguite con asyncio.to_thread)
+_local = threading.local()
+
+# Funzione per aprire (una volta per thread) la connessione al database delle partite,
+# ricreando le tabelle se lo schema è di una versione diversa
+def _connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        GAMES_DB_PATH.parent.mkdir(exist_ok=True, parents=True)
+        conn = sqlite3.connect(GAMES_DB_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if conn.execute("PRAGMA user_version").fetchone()[0] != GAMES_DB_VERSION:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DROP TABLE IF EXISTS games")
+            conn.execute("DROP TABLE IF EXISTS synced_months")
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {GAMES_DB_VERSION}")
+            conn.execute("COMMIT")
+        _local.conn = conn
+    return conn
+
+# Funzione per ottenere la chiave di un mese nel database, ad es. ("2023", "9") -> "2023_09"
+def month_key(year, month):
+    return f"{year}_{str(month).zfill(2)}"
+
+# Funzione per convertire le colonne di un mese (archivio .npz) nelle righe della tabella games
+def _month_rows(username, month, columns):
+    user = username.lower()
+    categories = {
+        name: columns[f"{name}_names"][columns[f"{name}_codes"]].tolist()
+        for name in ("opponent", "time_class", "time_control", "variant")
+    }
+    return zip(
+        columns["url"].astype(str).tolist(),
+        [user] * len(columns["end_time"]),
+        [month] * len(columns["end_time"]),
+        columns["end_time"].tolist(),
+        columns["is_white"].astype(int).tolist(),
+        columns["result"].tolist(),
+        columns["user_rating"].tolist(),
+        columns["opponent_rating"].tolist(),
+        categories["opponent"],
+        categories["time_class"],
+        categories["time_control"],
+        categories["variant"],
+    )
+
+# Funzione per sincronizzare il database con i mesi caricati (loaded["segments"]): vengono importati
+# (con upsert per URL) solo i mesi la cui cache è cambiata dall'ultima sincronizzazione.
+# Ritorna il numero di mesi importati.
+def sync_games(username, segments):
+    conn = _connection()
+    user = username.lower()
+    synced = dict(conn.execute("SELECT month, source_mtime_ns FROM synced_months WHERE username = ?", (user,)).fetchall())
+
+    imported = 0
+    for (year, month), columns in segments:
+        key = month_key(year, month)
+        version = int(columns["source_mtime_ns"])
+        if synced.get(key) == version:
+            continue
+        rows = list(_month_rows(username, key, columns))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for start in range(0, len(rows), UPSERT_BATCH_ROWS):
+                conn.executemany(UPSERT_GAME, rows[start:start + UPSERT_BATCH_ROWS])
+            conn.execute(
+                "INSERT INTO synced_months (username, month, source_mtime_ns) VALUES (?, ?, ?) "
+                "ON CONFLICT (username, month) DO UPDATE SET source_mtime_ns = excluded.source_mtime_ns",
+                (user, key, version)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        imported += 1
+    if imported:
+        print(f"Database partite aggiornato per {username}: {imported} mesi importati")
+    return imported
+
+# Funzione per costruire la clausola WHERE comune alle query: utente, mesi selezionati e cadenza opzionale
+def _where(username, months, time_class=None, extra=""):
+    clauses = ["username = ?", f"month IN ({','.join('?' * len(months))})"]
+    params = [username.lower(), *months]
+    if time_class:
+        clauses.append("time_class = ?")
+        params.append(time_class)
+    if extra:
+        clauses.append(extra)
+    return " AND ".join(clauses), params
+
+# Espressioni SQL per contare i risultati (sconfitte, patte, vittorie) e il colore di un gruppo di partite
+RESULT_COUNTS = (
+    f"SUM(result = {RESULT_WIN}) AS wins, SUM(result = {RESULT_DRAW}) AS draws, "
+    f"SUM(result = {RESULT_LOSS}) AS losses, SUM(is_white) AS as_white"
+)
+
+# Funzione per convertire una riga di conteggi (games, wins, draws, losses, as_white) in un dizionario
+def _counts(row):
+    games, wins, draws, losses, as_white = (int(value or 0) for value in row)
+    return {
+        "games": games,
+        "wins": wins,
+        "draws": draws,
+        "losses": losses,
+        "as_white": as_white,
+        "as_black": games - as_white,
+        "score": round((wins + draws / 2) / games, 4) if games else None,
+    }
+
+# Funzione per calcolare il bilancio contro un avversario: totale, per cadenza, prima e ultima partita
+def head_to_head(username, opponent, months):
+    if not months:
+        return {"opponent": opponent.lower(), **_counts((0, 0, 0, 0, 0)), "first_time": None, "last_time": None, "by_time_class": {}}
+    where, params = _where(username, months, extra="opponent = ?")
+    params.append(opponent.lower())
+    conn = _connection()
+
+    row = conn.execute(
+        f"SELECT COUNT(*), {RESULT_COUNTS}, MIN(end_time), MAX(end_time) FROM games WHERE {where}", params
+    ).fetchone()
+    by_time_class = {
+        time_class: _counts(counts)
+        for time_class, *counts in conn.execute(
+            f"SELECT time_class, COUNT(*), {RESULT_COUNTS} FROM games WHERE {where} GROUP BY time_class ORDER BY time_class",
+            params
+        )
+    }
+    return {
+        "opponent": opponent.lower(),
+        **_counts(row[:5]),
+        "first_time": row[5],
+        "last_time": row[6],
+        "by_time_class": by_time_class,
+    }
+
+# Funzione per calcolare i risultati per fascia di differenza di rating (rating avversario - rating utente).
+# La fascia è arrotondata per difetto a multipli di bucket: con bucket 100, -150 va nella fascia -200.
+def results_by_rating_diff(username, months, bucket=DEFAULT_RATING_BUCKET, time_class=None):
+    if not months:
+        return []
+    where, params = _where(username, months, time_class)
+    # La divisione intera di SQLite tronca verso zero: si sottrae il resto (sempre positivo) per arrotondare per difetto
+    bucket = int(bucket)
+    diff = "(opponent_rating - user_rating)"
+    lower = f"({diff} - ((({diff} % {bucket}) + {bucket}) % {bucket}))"
+    rows = _connection().execute(
+        f"SELECT {lower} AS lower, COUNT(*), {RESULT_COUNTS} FROM games WHERE {where} GROUP BY lower ORDER BY lower",
+        params
+    ).fetchall()
+    return [{"min_diff": lower, "max_diff": lower + bucket - 1, **_counts(counts)} for lower, *counts in rows]
+
+# Funzione per calcolare il bilancio contro i top avversari più affrontati
+# (a parità di partite, in ordine alfabetico), con rating medio dell'avversario e data dell'ultima partita
+def top_opponents(username, months, top, time_class=None):
+    if not months:
+        return []
+    where, params = _where(username, months, time_class)
+    rows = _connection().execute(
+        f"SELECT opponent, COUNT(*) AS games, {RESULT_COUNTS}, AVG(opponent_rating), MAX(end_time) "
+        f"FROM games WHERE {where} GROUP BY opponent ORDER BY games DESC, opponent LIMIT ?",
+        [*params, top]
+    ).fetchall()
+    return [
+        {"opponent": opponent, **_counts(counts[:5]), "avg_opponent_rating": round(counts[5]), "last_time": counts[6]}
+        for opponent, *counts in rows
+    ]
+
+# Funzione per trovare le serie di risultati consecutivi: la più lunga per ogni risultato e quella in corso.
+# Le serie si ottengono con le window function ("gaps and islands"): all'interno di una serie la differenza
+# tra la posizione della partita e la posizione tra le partite con lo stesso risultato resta costante.
+def streaks(username, months, time_class=None):
+    found = {"longest": {"win": None, "draw": None, "loss": None}, "current": None}
+    if not months:
+        return found
+    where, params = _where(username, months, time_class)
+    query = f"""
+        WITH ordered AS (
+            SELECT result, end_time,
+                   ROW_NUMBER() OVER (ORDER BY end_time, url) AS position,
+                   ROW_NUMBER() OVER (PARTITION BY result ORDER BY end_time, url) AS result_position
+            FROM games WHERE {where}
+        ),
+        runs AS (
+            SELECT result, COUNT(*) AS length, MIN(end_time) AS start_time, MAX(end_time) AS end_time,
+                   MAX(position) AS last_position
+            FROM ordered GROUP BY result, position - result_position
+        ),
+        ranked AS (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY result ORDER BY length DESC, last_position DESC) AS rank,
+                   MAX(last_position) OVER () AS total
+            FROM runs
+        )
+        SELECT result, length, start_time, end_time, rank, last_position = total AS current
+        FROM ranked WHERE rank = 1 OR last_position = total
+    """
+    for result, length, start_time, end_time, rank, current in _connection().execute(query, params):
+        streak = {"result": RESULT_NAMES[result], "length": length, "start_time": start_time, "end_time": end_time}
+        if rank == 1:
+            found["longest"][RESULT_NAMES[result]] = streak
+        if current:
+            found["current"] = streak
+    return found
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.chess_api import CHESS_COM_API, api_get, close_client, fetch_month, start_client
+from app.loader import parse_month_url, save_month_validators, shared_month_key, store_month_payload
+from app.scheduler import PRIORITY_BACKFILL
+from app.shared_cache import shared_lock
+from app.storage import DATA_DIR, is_month_closed, local_month_state
+
+# File di checkpoint dell'import massivo: mesi chiusi già completati ed errori.
+# Serve solo a riprendere un import interrotto: viene eliminato quando un import termina senza errori.
+CHECKPOINT_PATH = DATA_DIR / "ingest_checkpoint.json"
+
+# Intervallo minimo (in secondi) tra due salvataggi del checkpoint durante l'import
+CHECKPOINT_INTERVAL = 2
+
+# Funzione per ottenere la chiave di un mese nel checkpoint, ad es. "hikaru/2024/01"
+def _month_key(username, year, month):
+    return f"{username.lower()}/{year}/{str(month).zfill(2)}"
+
+# Funzione per leggere il checkpoint (vuoto se mancante)
+def load_checkpoint(path=CHECKPOINT_PATH):
+    if path.exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        return {"done": set(checkpoint.get("done", [])), "failed": checkpoint.get("failed", {})}
+    return {"done": set(), "failed": {}}
+
+# Funzione per eliminare il checkpoint (import completato)
+def clear_checkpoint(path=CHECKPOINT_PATH):
+    path.unlink(missing_ok=True)
+
+# Funzione per salvare il checkpoint in modo atomico (un'interruzione non lo lascia a metà)
+def save_checkpoint(checkpoint, path=CHECKPOINT_PATH):
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({**checkpoint, "done": sorted(checkpoint["done"])}, f)
+    os.replace(tmp_path, path)
+
+# Funzione per convertire "2024-01", "2024/1" o "202401" in (anno, mese) numerici
+def parse_month_arg(value):
+    digits = value.replace("-", "/").strip("/")
+    if "/" in digits:
+        year, month = digits.split("/", 1)
+    else:
+        year, month = digits[:4], digits[4:]
+    year, month = int(year), int(month)
+    if not 1 <= month <= 12:
+        raise ValueError(f"Mese non valido: {value}")
+    return year, month
+
+# Funzione per filtrare gli archivi di un utente per elenco di mesi e/o intervallo (estremi inclusi)
+def select_months(archives, months=None, since=None, until=None):
+    selected = []
+    for month_url in archives:
+        year, month = parse_month_url(month_url)
+        current = (int(year), int(month))
+        if months and current not in months:
+            continue
+        if since and current < since:
+            continue
+        if until and current > until:
+            continue
+        selected.append(month_url)
+    return selected
+
+# Funzione per ottenere gli archivi di un utente: l'elenco viene sempre richiesto di nuovo,
+# perché a ogni nuovo mese se ne aggiunge uno
+async def _user_archives(username):
+    response = await api_get(f"{CHESS_COM_API}/player/{username}/games/archives", priority=PRIORITY_BACKFILL)
+    if response.status_code == 404:
+        print(f"Nessun archivio trovato per l'utente {username}")
+        archives = []
+    elif response.status_code != 200:
+        raise RuntimeError(f"Errore nel recupero degli archivi di {username}: Status {response.status_code}")
+    else:
+        archives = response.json().get("archives", [])
+    return archives
+
+# Funzione per importare un mese: i mesi chiusi già in cache vengono saltati, gli altri vengono
+# richiesti in modo condizionale e, se cambiati, decodificati e salvati da un processo del pool.
+# Ritorna (origine, partite nuove).
+async def _ingest_month(username, month_url, pool):
+    year, month = parse_month_url(month_url)
+    exists, meta, immutable = await asyncio.to_thread(local_month_state, username, year, month)
+    if immutable:
+        return "cache", 0
+
+    # Lo stesso lock dei worker dell'app: un mese non viene scaricato due volte se il server è attivo
+    async with shared_lock(shared_month_key(username, year, month)):
+        exists, meta, immutable = await asyncio.to_thread(local_month_state, username, year, month)
+        if immutable:
+            return "cache", 0
+
+        status, payload, validators = await fetch_month(
+            month_url, meta if exists else None, priority=PRIORITY_BACKFILL, parse=False
+        )
+        if status == 200:
+            loop = asyncio.get_running_loop()
+            new_games = await loop.run_in_executor(pool, store_month_payload, username, year, month, payload, validators)
+            return "api", new_games
+        if status == 304:
+            await asyncio.to_thread(save_month_validators, username, year, month, validators)
+            return "revalidated", 0
+        raise RuntimeError(f"Status {status}")
+
+# Import massivo: elenca gli archivi di ogni utente, scarica i mesi selezionati con concorrenza
+# limitata e li salva nella cache di downloads/users usando un pool di processi.
+# Il checkpoint permette di riprendere dopo un'interruzione saltando i mesi chiusi già completati;
+# i mesi ancora aperti vengono ricontrollati a ogni import.
+async def ingest(usernames, months=None, since=None, until=None, concurrency=8, workers=None,
+                 checkpoint_path=CHECKPOINT_PATH, restart=False):
+    checkpoint = {"done": set(), "failed": {}} if restart else load_checkpoint(checkpoint_path)
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"cache": 0, "api": 0, "revalidated": 0, "skipped": 0, "failed": 0, "new_games": 0}
+    last_saved = time.monotonic()
+    started = time.perf_counter()
+    completed = False
+
+    await start_client()
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        tasks = []
+        all_archives = await asyncio.gather(*[_user_archives(username) for username in usernames], return_exceptions=True)
+        for username, archives in zip(usernames, all_archives):
+            if isinstance(archives, Exception):
+                print(str(archives))
+                stats["failed"] += 1
+                continue
+            for month_url in select_months(archives, months, since, until):
+                year, month = parse_month_url(month_url)
+                key = _month_key(username, year, month)
+                if key in checkpoint["done"]:
+                    stats["skipped"] += 1
+                else:
+                    tasks.append((key, username, month_url))
+
+        total = len(tasks)
+        print(f"Import di {total} mesi per {len(usernames)} utenti ({stats['skipped']} già completati nel checkpoint)")
+
+        async def run_task(index, key, username, month_url):
+            nonlocal last_saved
+            async with semaphore:
+                try:
+                    source, new_games = await _ingest_month(username, month_url, pool)
+                except Exception as e:
+                    print(f"[{index}/{total}] {key}: errore ({str(e)})")
+                    checkpoint["failed"][key] = str(e)
+                    stats["failed"] += 1
+                    return
+            # Solo i mesi chiusi sono definitivi: quelli aperti possono ricevere ancora partite
+            year, month = parse_month_url(month_url)
+            if is_month_closed(year, month):
+                checkpoint["done"].add(key)
+            checkpoint["failed"].pop(key, None)
+            stats[source] += 1
+            stats["new_games"] += new_games
+            print(f"[{index}/{total}] {key}: {source} ({new_games} partite nuove)")
+            if time.monotonic() - last_saved >= CHECKPOINT_INTERVAL:
+                save_checkpoint(checkpoint, checkpoint_path)
+                last_saved = time.monotonic()
+
+        await asyncio.gather(*[
+            run_task(index, key, username, month_url)
+            for index, (key, username, month_url) in enumerate(tasks, start=1)
+        ])
+        completed = stats["failed"] == 0
+    finally:
+        # Import riuscito: il checkpoint non serve più. Altrimenti (errori o Ctrl+C) si salva il punto raggiunto.
+        if completed:
+            clear_checkpoint(checkpoint_path)
+        else:
+            save_checkpoint(checkpoint, checkpoint_path)
+        pool.shutdown(wait=True, cancel_futures=True)
+        await close_client()
+
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import time
+import weakref
+
+from app.chess_api import fetch_month
+from app.metrics import cache_access, span
+from app.shared_cache import shared_lock
+from app.storage import (
+    is_month_closed,
+    load_month_data,
+    loads_json,
+    local_month_state,
+    merge_month_games,
+    month_exists_locally,
+    save_month_data,
+    save_month_meta,
+)
+from app.store import append_month_store, build_month_store, concat_month_columns, load_month_columns
+
+# Per quanto tempo (in secondi) il risultato di un caricamento resta riutilizzabile.
+# Basta a coprire le chiamate consecutive della UI (partite -> heatmap) senza rileggere i file.
+LOAD_TTL = 60
+
+# Per quanto tempo (in secondi) un mese appena ricontrollato con Chess.com non viene richiesto di nuovo.
+# Con più worker evita che ognuno ripeta la stessa richiesta condizionale subito dopo un altro.
+RECHECK_INTERVAL = 30
+
+# Numero massimo di insiemi di mesi tenuti in memoria
+MAX_LOADED_SETS = 16
+
+# Caricamenti completati: chiave -> (scadenza, risultato)
+_loaded = {}
+
+# Caricamenti in corso: chiave -> task condiviso tra le richieste concorrenti
+_in_flight = {}
+
+# Lock per mese, rilasciati automaticamente quando nessuno li usa più
+_month_locks = weakref.WeakValueDictionary()
+
+# Funzione per estrarre anno e mese dall'URL di un archivio, ad es. ".../games/2023/10" -> ("2023", "10")
+def parse_month_url(month_url):
+    parts = month_url.split("/")
+    return parts[-2], parts[-1]
+
+# Funzione per ottenere il lock di un mese: un solo aggiornamento alla volta per (utente, anno, mese)
+def _month_lock(username, year, month):
+    key = (username.lower(), str(year), str(month).zfill(2))
+    lock = _month_locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _month_locks[key] = lock
+    return lock
+
+# Funzione per ottenere la chiave del lock condiviso tra i worker per (utente, anno, mese)
+def shared_month_key(username, year, month):
+    return f"month:{username.lower()}:{year}:{str(month).zfill(2)}"
+
+# Funzione per salvare i validatori HTTP di un mese e segnarlo come immutabile se ormai chiuso
+def save_month_validators(username, year, month, validators):
+    meta = {
+        **(validators or {}),
+        "immutable": is_month_closed(year, month),
+        "checked_at": int(time.time())
+    }
+    save_month_meta(username, year, month, meta)
+
+# Funzione per salvare un payload appena scaricato, unendolo per URL alle partite già in cache.
+# Ritorna le colonne aggiornate del mese e il numero di partite nuove.
+def _store_downloaded_month(username, year, month, month_data, validators):
+    cached_data = load_month_data(username, year, month) if month_exists_locally(username, year, month) else None
+    merged_data, new_games = merge_month_games(cached_data, month_data)
+
+    if cached_data is not None and not new_games:
+        # Nessuna partita nuova: la cache resta com'è, si aggiornano solo i validatori
+        columns = load_month_columns(username, year, month)
+    else:
+        # Il JSON del mese viene riscritto per intero (in modo atomico) e non accodato: è la fonte da cui
+        # si ricostruisce l'archivio a colonne, quindi deve restare sempre un documento completo e valido.
+        # La risposta 200 contiene comunque tutto il mese, quindi la riscrittura costa quanto il download.
+        save_month_data(username, year, month, merged_data)
+        columns = None
+        if cached_data is not None:
+            columns = append_month_store(username, year, month, new_games)
+        if columns is None:
+            columns = build_month_store(username, year, month, merged_data)
+
+    save_month_validators(username, year, month, validators)
+    print(f"Scaricato mese {year}/{month} per {username} dall'API ({len(new_games)} partite nuove)")
+    return columns, len(new_games)
+
+# Funzione per salvare un payload mensile ancora in formato JSON grezzo (bytes).
+# Pensata per i processi dell'import massivo: decodifica, unione e archivio a colonne avvengono
+# nel processo che la esegue, e al chiamante torna solo il numero di partite nuove.
+def store_month_payload(username, year, month, payload, validators):
+    _, new_games = _store_downloaded_month(username, year, month, loads_json(payload), validators)
+    return new_games
+
+# Funzione per ottenere le colonne aggiornate di un mese.
+# I mesi chiusi già in cache non vengono più ricontrollati; gli altri (tipicamente il mese corrente)
+# vengono richiesti in modo condizionale: con 304 si riusa la cache, con 200 si uniscono le partite nuove.
+# Un mese ricontrollato da meno di RECHECK_INTERVAL secondi (anche da un altro worker) si legge dalla cache.
+# Ritorna (origine, colonne) con origine "cache", "revalidated" o "api".
+async def refresh_month(username, year, month, month_url):
+    async with _month_lock(username, year, month):
+        # Esistenza, metadati e immutabilità vengono letti dal disco in un thread, fuori dall'event loop
+        exists, meta, immutable = await asyncio.to_thread(local_month_state, username, year, month)
+        if immutable:
+            return "cache", await _read_cached_month(username, year, month)
+
+        # Con più worker, un solo processo alla volta scarica o ricontrolla lo stesso mese: gli altri
+        # attendono il lock e poi trovano la copia appena salvata
+        async with shared_lock(shared_month_key(username, year, month)):
+            exists, meta, immutable = await asyncio.to_thread(local_month_state, username, year, month)
+            if immutable or (exists and _recently_checked(meta)):
+                return "cache", await _read_cached_month(username, year, month)
+            return await _fetch_month_update(username, year, month, month_url, exists, meta)
+
+# Funzione per verificare se un mese è stato ricontrollato con Chess.com da meno di RECHECK_INTERVAL secondi
+def _recently_checked(meta):
+    return time.time() - (meta or {}).get("checked_at", 0) < RECHECK_INTERVAL
+
+# Funzione per leggere le colonne di un mese dalla cache locale
+async def _read_cached_month(username, year, month):
+    cache_access("month", "hit")
+    with span("cache_read"):
+        return await asyncio.to_thread(load_month_columns, username, year, month)
+
+# Funzione per richiedere un mese a Chess.com (in modo condizionale se è già in cache) e salvarlo
+async def _fetch_month_update(username, year, month, month_url, exists, meta):
+    try:
+        status, month_data, validators = await fetch_month(month_url, meta if exists else None)
+    except Exception as e:
+        print(f"Errore nel recupero delle partite per {month_url}: {str(e)}")
+        status, month_data, validators = None, None, None
+
+    if status == 200:
+        cache_access("month", "miss")
+        with span("cache_write"):
+            columns, _ = await asyncio.to_thread(_store_downloaded_month, username, year, month, month_data, validators)
+        return "api", columns
+
+    if status == 304:
+        await asyncio.to_thread(save_month_validators, username, year, month, validators)
+        print(f"Mese {year}/{month} per {username} invariato (304), uso la cache")
+    elif status is not None:
+        print(f"Errore nel recupero delle partite per {month_url}: Status {status}")
+
+    # 304 o errore: se c'è una copia locale la si usa comunque
+    if not exists:
+        cache_access("month", "miss")
+        return "api", None
+    cache_access("month", "revalidated" if status == 304 else "stale")
+    with span("cache_read"):
+        columns = await asyncio.to_thread(load_month_columns, username, year, month)
+    return ("revalidated" if status == 304 else "cache"), columns
+
+# Funzione che carica (dalla cache o dall'API) le colonne delle partite di un insieme di mesi.
+# I mesi vengono aggiornati in parallelo e ciascuno viene salvato appena arriva.
+async def _load_games(username, month_urls):
+    month_infos = [(*parse_month_url(month_url), month_url) for month_url in month_urls]
+    results = await asyncio.gather(*[
+        refresh_month(username, year, month, month_url)
+        for year, month, month_url in month_infos
+    ], return_exceptions=True)
+
+    # Log per monitorare i mesi scaricati vs quelli dalla cache
+    cache_used = 0
+    api_requests = 0
+    revalidated = 0
+    segments = []
+
+    for (year, month, month_url), result in zip(month_infos, results):
+        if isinstance(result, Exception):
+            print(f"Errore nel caricamento del mese {year}/{month}: {str(result)}")
+            continue
+        source, columns = result
+        if source == "api":
+            api_requests += 1
+        else:
+            cache_used += 1
+            revalidated += source == "revalidated"
+        if columns is not None:
+            segments.append(((year, month), columns))
+        else:
+            print(f"Nessun dato disponibile per il mese {year}/{month}")
+
+    print(f"Statistiche cache per {username}: {cache_used} mesi dalla cache ({revalidated} riconvalidati), {api_requests} mesi dall'API")
+
+    return {
+        "username": username,
+        "segments": segments,
+        # Colonne di tutte le partite, ordinate per data decrescente
+        "columns": concat_month_columns(segments),
+        "cache_info": {
+            "months_from_cache": cache_used,
+            "months_from_api": api_requests,
+            "months_revalidated": revalidated
+        }
+    }
+
+# Funzione per ottenere l'impronta di un insieme di mesi
+def months_fingerprint(month_urls):
+    return hashlib.sha1("\n".join(sorted(set(month_urls))).encode("utf-8")).hexdigest()
+
+# Funzione per ottenere la versione dei dati caricati: cambia solo se cambia la cache di un mese
+def data_version(loaded):
+    parts = [
+        f"{year}-{month}:{int(columns['source_mtime_ns'])}"
+        for (year, month), columns in sorted(loaded["segments"])
+    ]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+# Funzione per rimuovere i caricamenti scaduti e mantenere limitata la memoria usata
+def _evict_loaded(now):
+    for key in [key for key, (expires_at, _) in _loaded.items() if expires_at <= now]:
+        del _loaded[key]
+    while len(_loaded) >= MAX_LOADED_SETS:
+        oldest = min(_loaded, key=lambda key: _loaded[key][0])
+        del _loaded[oldest]
+
+# Funzione chiamata al termine di un caricamento: lo rende riutilizzabile per LOAD_TTL secondi
+def _finish_load(key, task):
+    _in_flight.pop(key, None)
+    if task.cancelled() or task.exception() is not None:
+        return
+    now = time.monotonic()
+    _evict_loaded(now)
+    _loaded[key] = (now + LOAD_TTL, task.result())
+
+# Funzione per ottenere la chiave di un insieme di mesi di un utente
+def _load_key(username, month_urls):
+    return (username.lower(), tuple(sorted(set(month_urls))))
+
+# Funzione per ottenere, se ancora valido, un caricamento già completato (senza avviarne uno nuovo)
+def peek_loaded(username, month_urls):
+    cached = _loaded.get(_load_key(username, month_urls))
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    return None
+
+# Punto di ingresso unico per ottenere le colonne delle partite di un utente in un insieme di mesi.
+# Le richieste concorrenti per lo stesso insieme condividono un unico caricamento e
+# quelle successive, entro LOAD_TTL secondi, riutilizzano le colonne già caricate.
+async def load_games(username, month_urls):
+    key = _load_key(username, month_urls)
+    now = time.monotonic()
+
+    cached = _loaded.get(key)
+    if cached and cached[0] > now:
+        print(f"Riutilizzo delle partite già caricate per {username} ({len(key[1])} mesi)")
+        cache_access("loaded", "hit")
+        return cached[1]
+
+    task = _in_flight.get(key)
+    if task is None:
+        cache_access("loaded", "miss")
+        task = asyncio.ensure_future(_load_games(username, list(key[1])))
+        _in_flight[key] = task
+        task.add_done_callback(lambda finished: _finish_load(key, finished))
+    else:
+        cache_access("loaded", "shared")
+        # Un'altra richiesta sta già caricando gli stessi mesi: attendi il suo risultato
+        print(f"Caricamento già in corso per {username} ({len(key[1])} mesi), in attesa del risultato")
+
+    # shield: se una richiesta viene annullata, il caricamento prosegue per le altre
+    return await asyncio.shield(task)
@@ -1,33 +1,58 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-import pandas as pd
-import requests
 import json
-from datetime import datetime, timedelta
-import os
-from pathlib import Path
-import shutil
 
-app = FastAPI(title="Chess.com Stats Downloader")
+from app.aggregates import combine_aggregates, load_month_aggregates
+from app.analytics import DEFAULT_TOP_OPPONENTS, MAX_TOP_OPPONENTS, cached_analytics
+from app.chess_api import CHESS_COM_API, cached_get, close_client, start_client
+from app.downloads import content_type, download_headers, iter_compressed, iter_file, negotiate_encoding, parse_range, resolve_download_path
+from app.exports import available_formats, get_export, job_status, start_export
+from app.gamedb import DEFAULT_RATING_BUCKET, head_to_head, month_key, sync_games
+from app.loader import data_version, load_games, months_fingerprint, parse_month_url
+from app.metrics import inc, observe, profile_report, profiling, render_metrics, span
+from app.pgn import DEFAULT_TOP_OPENINGS, MAX_TOP_OPENINGS, load_moves, move_stats, shutdown_pgn_pool
+from app.ranges import get_range_index, range_heatmap, range_summary, window_bounds
+from app.scheduler import scheduler_metrics
+from app.series import DEFAULT_SERIES_POINTS, elo_series
+from app.stats import DAYS_OF_WEEK, HOURS, frame_to_records, games_frame, resolve_timezone
+
+# Gestione del ciclo di vita: un unico pool di connessioni HTTP condiviso da tutte le richieste
+@asynccontextmanager
+async def lifespan(app):
+    await start_client()
+    yield
+    await close_client()
+    shutdown_pgn_pool()
+
+app = FastAPI(title="Chess.com Stats Downloader", lifespan=lifespan)
+
+# Middleware per le metriche HTTP: richieste in corso, durata e stato per percorso.
+# Si usa il modello del percorso (ad es. /api/exports/{job_id}) per non creare una serie per ogni URL.
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    inc("chess_stat_http_in_flight")
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        inc("chess_stat_http_in_flight", -1)
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        observe("chess_stat_http_request_seconds", time.perf_counter() - started, path=path)
+        inc("chess_stat_http_requests_total", path=path, method=request.method, status=status)
 
 # Configurazione dei percorsi per file statici e template
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-# Directory per lo storage dei dati utenti
-DATA_DIR = Path("downloads/users")
-DATA_DIR.mkdir(exist_ok=True, parents=True)
-
-# Definizione degli headers standard per le richieste all'API di Chess.com
-CHESS_COM_HEADERS = {
-    "User-Agent": "Chess.com Stats Downloader/1.0 (Python/FastAPI; Contact: your-email@example.com)",
-    "Accept": "application/json",
-    "Accept-Encoding": "gzip, deflate",
-    "Connection": "keep-alive"
-}
-
 # Funzione per ottenere il nome del mese in italiano
 def get_month_name(month):
     month_names = {
@@ -50,50 +75,10 @@ def get_month_number(month_name):
     }
     return month_numbers.get(month_name, "01")
 
-# Funzione per ottenere il percorso dove salvare i dati di un mese specifico
-def get_user_month_path(username, year, month):
-    month_str = str(month).zfill(2)
-    user_dir = DATA_DIR / username.lower()
-    user_dir.mkdir(exist_ok=True, parents=True)
-    return user_dir / f"{year}_{month_str}.json"
-
-# Funzione per verificare se un mese specifico esiste già localmente
-def month_exists_locally(username, year, month):
-    file_path = get_user_month_path(username, year, month)
-    return file_path.exists()
-
-# Funzione per salvare i dati di un mese specifico
-def save_month_data(username, year, month, data):
-    file_path = get_user_month_path(username, year, month)
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f)
-
-# Funzione per caricare i dati di un mese specifico
-def load_month_data(username, year, month):
-    file_path = get_user_month_path(username, year, month)
-    if file_path.exists():
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return None
-
-# Funzione per ottenere l'anno e mese correnti
-def get_current_year_month():
-    now = datetime.now()
-    return now.year, now.month
-
-# Funzione per verificare se un mese è il mese corrente
-def is_current_month(year, month):
-    current_year, current_month = get_current_year_month()
-    return int(year) == current_year and int(month) == current_month
-
 # Funzione per recuperare i dettagli del profilo di un giocatore
-def get_player_profile(username):
+async def get_player_profile(username):
     try:
-        response = requests.get(
-            f"https://api.chess.com/pub/player/{username}",
-            headers=CHESS_COM_HEADERS,
-            timeout=10
-        )
+        response = await cached_get(f"{CHESS_COM_API}/player/{username}")
         
         if response.status_code == 200:
             profile_data = response.json()
@@ -101,11 +86,7 @@ def get_player_profile(username):
             # Aggiungiamo altre API di Chess.com per recuperare informazioni aggiuntive
             # Stats
             try:
-                stats_response = requests.get(
-                    f"https://api.chess.com/pub/player/{username}/stats",
-                    headers=CHESS_COM_HEADERS,
-                    timeout=10
-                )
+                stats_response = await cached_get(f"{CHESS_COM_API}/player/{username}/stats")
                 if stats_response.status_code == 200:
                     profile_data["stats"] = stats_response.json()
             except Exception as e:
@@ -121,13 +102,9 @@ def get_player_profile(username):
         return None
 
 # Funzione per verificare se un utente esiste su Chess.com
-def check_user_exists(username):
+async def check_user_exists(username):
     try:
-        response = requests.get(
-            f"https://api.chess.com/pub/player/{username}", 
-            headers=CHESS_COM_HEADERS,
-            timeout=10
-        )
+        response = await cached_get(f"{CHESS_COM_API}/player/{username}")
         print(f"Verifica utente {username}: Status code {response.status_code}")
         
         if response.status_code == 200:
@@ -145,11 +122,7 @@ def check_user_exists(username):
             print(f"Accesso negato dall'API di Chess.com (403 Forbidden)")
             # Proviamo un approccio alternativo: verificare se esistono archivi per questo utente
             try:
-                archives_response = requests.get(
-                    f"https://api.chess.com/pub/player/{username}/games/archives",
-                    headers=CHESS_COM_HEADERS,
-                    timeout=10
-                )
+                archives_response = await cached_get(f"{CHESS_COM_API}/player/{username}/games/archives")
                 if archives_response.status_code == 200:
                     print(f"Utente verificato tramite endpoint archives: {username}")
                     return True
@@ -167,13 +140,9 @@ def check_user_exists(username):
         return False
 
 # Ottenere l'elenco dei mesi disponibili per un utente
-def get_available_months(username):
+async def get_available_months(username):
     try:
-        response = requests.get(
-            f"https://api.chess.com/pub/player/{username}/games/archives",
-            headers=CHESS_COM_HEADERS,
-            timeout=10
-        )
+        response = await cached_get(f"{CHESS_COM_API}/player/{username}/games/archives")
         print(f"Ricerca archivi per {username}: Status code {response.status_code}")
         
         if response.status_code == 200:
@@ -207,18 +176,17 @@ def format_month_name(archive_url):
 
 @app.get("/", response_class=HTMLResponse)
 async def get_home(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    # Il pulsante Parquet viene mostrato solo se sul server è installato pyarrow o fastparquet
+    return templates.TemplateResponse(request, "index.html", {"export_formats": available_formats()})
 
 @app.get("/api/check-username/{username}")
 async def check_username(username: str):
-    exists = check_user_exists(username)
+    exists = await check_user_exists(username)
     if (exists):
-        months = get_available_months(username)
+        # Archivi e profilo del giocatore in parallelo (il profilo è già in cache dalla verifica)
+        months, profile_data = await asyncio.gather(get_available_months(username), get_player_profile(username))
         formatted_months = [(url, format_month_name(url)) for url in months]
         
-        # Recupera i dati del profilo del giocatore
-        profile_data = get_player_profile(username)
-        
         return {
             "exists": True, 
             "months": formatted_months, 
@@ -227,7 +195,7 @@ async def check_username(username: str):
     else:
         # Cerca di ottenere un messaggio di errore più specifico
         try:
-            response = requests.get(f"https://api.chess.com/pub/player/{username}", headers=CHESS_COM_HEADERS)
+            response = await cached_get(f"{CHESS_COM_API}/player/{username}")
             if response.status_code == 403:
                 return {"exists": False, "error": "Accesso limitato dall'API di Chess.com. Potresti aver superato il limite di richieste. Attendi qualche minuto e riprova."}
             elif response.status_code == 404:
@@ -237,20 +205,73 @@ async def check_username(username: str):
         except Exception:
             return {"exists": False, "error": "Utente non trovato o errore di connessione all'API di Chess.com"}
 
+# Riferimenti ai task di sincronizzazione del database in esecuzione (evita che vengano raccolti dal garbage collector)
+_sync_tasks = set()
+
+# Funzione per importare nel database delle partite i mesi caricati, senza rallentare la risposta
+def schedule_games_sync(username, segments):
+    async def run():
+        try:
+            with span("games_db_sync"):
+                await asyncio.to_thread(sync_games, username, segments)
+        except Exception as e:
+            print(f"Errore nell'aggiornamento del database partite per {username}: {str(e)}")
+    task = asyncio.create_task(run())
+    _sync_tasks.add(task)
+    task.add_done_callback(_sync_tasks.discard)
+
+# Funzione per preparare il database delle partite per una query: carica i mesi selezionati (dalla cache
+# o dall'API), li importa se cambiati e ritorna le chiavi dei mesi da usare come filtro
+async def games_db_months(username, selected_months):
+    if not await check_user_exists(username):
+        raise HTTPException(status_code=404, detail="Utente non trovato su Chess.com")
+    
+    selected_months_list = json.loads(selected_months)
+    loaded = await load_games(username, selected_months_list)
+    with span("games_db_sync"):
+        await asyncio.to_thread(sync_games, username, loaded["segments"])
+    return [month_key(year, month) for (year, month), _ in loaded["segments"]]
+
+# Numero di partite per ogni riga NDJSON nella modalità streaming
+STREAM_CHUNK_SIZE = 1000
+
+# Generatore delle righe NDJSON: prima il sommario, poi le partite in ordine cronologico a blocchi.
+# Con la profilazione attiva, la riga finale contiene anche il dettaglio delle fasi.
+def iter_games_ndjson(summary, df, request_profile=None):
+    yield json.dumps({"type": "summary", "success": True, "summary": summary}) + "\n"
+    chronological = df.iloc[::-1]
+    for start in range(0, len(chronological), STREAM_CHUNK_SIZE):
+        # Ogni blocco viene prodotto in un contesto diverso: il profilo va riattivato ogni volta
+        with profiling(request_profile is not None, request_profile), span("serialize"):
+            line = json.dumps({"type": "games", "games": frame_to_records(chronological.iloc[start:start + STREAM_CHUNK_SIZE])}) + "\n"
+        yield line
+    end = {"type": "end", "total_games": len(df)}
+    if request_profile is not None:
+        end["profile"] = profile_report(request_profile)
+    yield json.dumps(end) + "\n"
+
 @app.post("/api/download-games")
-async def download_games(username: str = Form(...), selected_months: str = Form(...)):
-    if not check_user_exists(username):
+async def download_games(
+    username: str = Form(...),
+    selected_months: str = Form(...),
+    stream: bool = Form(False),
+    include_pgn: bool = Form(False),
+    profile: bool = Form(False)
+):
+    with profiling(profile) as request_profile:
+        return await _download_games(username, selected_months, stream, include_pgn, request_profile)
+
+# Corpo di /api/download-games, con le fasi misurate da span (e riportate nel profilo se richiesto)
+async def _download_games(username, selected_months, stream, include_pgn, request_profile):
+    if not await check_user_exists(username):
         raise HTTPException(status_code=404, detail="Utente non trovato su Chess.com")
     
     selected_months_list = json.loads(selected_months)
-    all_games = []
     
     # Estrai informazioni dai mesi selezionati per il periodo di tempo
     period_info = []
     for month_url in selected_months_list:
-        parts = month_url.split("/")
-        year = parts[-2]
-        month = parts[-1]
+        year, month = parse_month_url(month_url)
         period_info.append({"year": year, "month": month, "url": month_url})
     
     # Ordina per data per trovare il primo e l'ultimo mese
@@ -263,293 +284,265 @@ async def download_games(username: str = Form(...), selected_months: str = Form(
         "months": len(period_info)
     }
     
-    # Log per monitorare i mesi che verranno scaricati vs quelli dalla cache
-    cache_used = 0
-    api_requests = 0
+    # Carica le partite normalizzate (condivise con la heatmap se richieste subito dopo)
+    with span("load_games"):
+        loaded = await load_games(username, selected_months_list)
+    cache_info = loaded["cache_info"]
     
-    current_year, current_month = get_current_year_month()
+    # Le partite vengono importate nel database SQLite in background (solo i mesi cambiati)
+    schedule_games_sync(username, loaded["segments"])
     
-    for month_info in period_info:
-        year = month_info["year"]
-        month = month_info["month"]
-        month_url = month_info["url"]
-        
-        month_games = None
-        
-        # Verifica se si tratta del mese corrente (da riscaricari sempre) o se dobbiamo usare i dati salvati
-        if is_current_month(year, month) or not month_exists_locally(username, year, month):
-            # È il mese corrente o il mese non è disponibile localmente: scarica dall'API
-            try:
-                api_requests += 1
-                response = requests.get(month_url, headers=CHESS_COM_HEADERS, timeout=10)
-                if response.status_code == 200:
-                    month_data = response.json()
-                    month_games = month_data.get("games", [])
-                    
-                    # Salva i dati per uso futuro
-                    save_month_data(username, year, month, month_data)
-                    print(f"Scaricato e salvato mese {year}/{month} per {username} dall'API")
-                else:
-                    print(f"Errore nel recupero delle partite per {month_url}: Status {response.status_code}")
-            except Exception as e:
-                print(f"Errore nel recupero delle partite per {month_url}: {str(e)}")
-        else:
-            # Il mese è disponibile localmente: carica dalla cache
-            try:
-                cache_used += 1
-                month_data = load_month_data(username, year, month)
-                if month_data:
-                    month_games = month_data.get("games", [])
-                    print(f"Caricato mese {year}/{month} per {username} dalla cache")
-                else:
-                    print(f"File cache trovato ma con errori per il mese {year}/{month}")
-            except Exception as e:
-                print(f"Errore nel caricamento della cache per {year}/{month}: {str(e)}")
-        
-        # Aggiungi le partite del mese all'elenco completo
-        if month_games:
-            all_games.extend(month_games)
-    
-    print(f"Statistiche cache per {username}: {cache_used} mesi dalla cache, {api_requests} mesi dall'API")
-    
-    # Creazione di un DataFrame con pandas
-    processed_games = []
-    for game in all_games:
-        white_player = game.get("white", {}).get("username", "unknown").lower()
-        black_player = game.get("black", {}).get("username", "unknown").lower()
-        
-        # Determina se il giocatore richiesto era bianco o nero
-        is_white = (username.lower() == white_player)
-        user_color = "white" if is_white else "black"
-        opponent = black_player if is_white else white_player
-        
-        # Estrae dettagli della partita
-        time_control = game.get("time_control", "")
-        time_class = game.get("time_class", "")
-        variant = game.get("rules", "")
-        
-        # Estrai i dati Elo
-        white_rating = game.get("white", {}).get("rating", 0)
-        black_rating = game.get("black", {}).get("rating", 0)
-        user_rating = white_rating if is_white else black_rating
-        opponent_rating = black_rating if is_white else white_rating
-       
-        # Determina il risultato dal punto di vista dell'utente
-        result = ""
-        if game.get("white", {}).get("result", "") == "win":
-            result = "win" if is_white else "loss"
-        elif game.get("black", {}).get("result", "") == "win":
-            result = "win" if not is_white else "loss"
-        else:
-            result = "draw"
-            
-        # Converte il timestamp Unix in data e ora
-        date_played = datetime.fromtimestamp(game.get("end_time", 0))
-        date_str = date_played.strftime("%Y-%m-%d %H:%M:%S")
-        
-        processed_game = {
-            "date": date_str,
-            "timestamp": game.get("end_time", 0),  # Aggiungiamo il timestamp raw per ordinare cronologicamente
-            "user_color": user_color,
-            "opponent": opponent,
-            "result": result,
-            "time_control": time_control,
-            "time_class": time_class,
-            "variant": variant,
-            "user_rating": user_rating,
-            "opponent_rating": opponent_rating,
-            "pgn": game.get("pgn", ""),
-            "url": game.get("url", "")
-        }
-        processed_games.append(processed_game)
-    
-    # Ordina le partite per data decrescente (dal più recente al meno recente)
-    processed_games.sort(key=lambda x: x['timestamp'], reverse=True)
+    # Il sommario si ottiene sommando gli aggregati mensili (precalcolati per i mesi chiusi)
+    with span("aggregates"):
+        records, _ = await load_month_aggregates(username, selected_months_list)
+        aggregates = combine_aggregates(records)
 
-    # Crea un DataFrame con pandas
-    if processed_games:
-        df = pd.DataFrame(processed_games)
-        
-        # Crea la cartella downloads se non esiste
-        downloads_dir = Path("downloads")
-        downloads_dir.mkdir(exist_ok=True)
-        
-        # Salva il DataFrame in formato CSV e JSON
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        csv_path = f"downloads/{username}_games_{timestamp}.csv"
-        json_path = f"downloads/{username}_games_{timestamp}.json"
-        
-        df.to_csv(csv_path, index=False)
-        df.to_json(json_path, orient="records")
+    # Crea un DataFrame con pandas direttamente dalle colonne.
+    # Gli export CSV/JSON/Parquet non vengono più scritti qui: si generano su richiesta con /api/exports
+    with span("dataframe"):
+        df = games_frame(loaded, include_pgn=include_pgn)
+    if len(df):
         
         summary = {
-            "total_games": len(df),
-            "wins": len(df[df["result"] == "win"]),
-            "losses": len(df[df["result"] == "loss"]),
-            "draws": len(df[df["result"] == "draw"]),
-            "as_white": len(df[df["user_color"] == "white"]),
-            "as_black": len(df[df["user_color"] == "black"]),
-            "csv_path": csv_path,
-            "json_path": json_path,
+            **aggregates["summary"],
+            "by_time_class": aggregates["time_classes"],
             "period": period,
-            "cache_info": {
-                "months_from_cache": cache_used,
-                "months_from_api": api_requests
-            }
+            "cache_info": cache_info
         }
         
+        # I PGN vengono inviati solo se il client li richiede esplicitamente
+        games_df = df if include_pgn else df.drop(columns="pgn")
+        
+        # Modalità streaming: sommario subito, poi le partite a blocchi (NDJSON)
+        if stream:
+            return StreamingResponse(iter_games_ndjson(summary, games_df, request_profile), media_type="application/x-ndjson")
+        
         # Invia tutti i dati delle partite al frontend
-        return {"success": True, "summary": summary, "data": processed_games}
+        with span("serialize"):
+            result = {"success": True, "summary": summary, "data": frame_to_records(games_df)}
     else:
-        return {"success": False, "error": "Nessuna partita trovata per il periodo selezionato"}
+        result = {"success": False, "error": "Nessuna partita trovata per il periodo selezionato"}
+    if request_profile is not None:
+        result["profile"] = profile_report(request_profile)
+    return result
+
+# Funzione per trasformare la heatmap 7x24x3 (giorno, ora, [sconfitte, patte, vittorie]) nel formato del frontend
+def format_heatmap(heatmap, timezone, cache_info):
+    return {
+        "days": DAYS_OF_WEEK,
+        "hours": HOURS,
+        "wins": heatmap[:, :, 2].tolist(),
+        "losses": heatmap[:, :, 0].tolist(),
+        "draws": heatmap[:, :, 1].tolist(),
+        "totals": heatmap.sum(axis=2).tolist(),
+        "timezone": timezone or "server",
+        "cache_info": cache_info
+    }
 
 @app.post("/api/heatmap-data")
-async def get_heatmap_data(username: str = Form(...), selected_months: str = Form(...)):
-    if not check_user_exists(username):
+async def get_heatmap_data(
+    username: str = Form(...),
+    selected_months: str = Form(...),
+    timezone: str = Form(None),
+    profile: bool = Form(False)
+):
+    try:
+        tzinfo = resolve_timezone(timezone)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not await check_user_exists(username):
         raise HTTPException(status_code=404, detail="Utente non trovato su Chess.com")
     
     selected_months_list = json.loads(selected_months)
-    all_games = []
     
-    # Log per monitorare i mesi che verranno scaricati vs quelli dalla cache
-    cache_used = 0
-    api_requests = 0
+    # Somma le heatmap precalcolate dei mesi chiusi (calcolate nel fuso di chi visualizza) e
+    # ricalcola solo i mesi ancora aperti; riusa le partite appena caricate da download_games
+    with profiling(profile) as request_profile:
+        with span("aggregates"):
+            records, cache_info = await load_month_aggregates(username, selected_months_list, tzinfo)
+            heatmap = combine_aggregates(records, tzinfo)["heatmap"]
+        with span("serialize"):
+            result = {"success": True, "heatmap_data": format_heatmap(heatmap, timezone, cache_info)}
+    if request_profile is not None:
+        result["profile"] = profile_report(request_profile)
+    return result
+
+@app.post("/api/move-stats")
+async def get_move_stats(username: str = Form(...), selected_months: str = Form(...), top: int = Form(DEFAULT_TOP_OPENINGS)):
+    if not 1 <= top <= MAX_TOP_OPENINGS:
+        raise HTTPException(status_code=400, detail=f"Il numero di aperture deve essere tra 1 e {MAX_TOP_OPENINGS}")
+    
+    if not await check_user_exists(username):
+        raise HTTPException(status_code=404, detail="Utente non trovato su Chess.com")
     
-    current_year, current_month = get_current_year_month()
+    selected_months_list = json.loads(selected_months)
+    loaded = await load_games(username, selected_months_list)
     
-    for month_url in selected_months_list:
-        parts = month_url.split("/")
-        year = parts[-2]
-        month = parts[-1]
-        
-        month_games = None
-        
-        # Verifica se si tratta del mese corrente o se dobbiamo usare i dati salvati
-        if is_current_month(year, month) or not month_exists_locally(username, year, month):
-            # È il mese corrente o il mese non è disponibile localmente: scarica dall'API
-            try:
-                api_requests += 1
-                response = requests.get(month_url, headers=CHESS_COM_HEADERS, timeout=10)
-                if response.status_code == 200:
-                    month_data = response.json()
-                    month_games = month_data.get("games", [])
-                    
-                    # Salva i dati per uso futuro
-                    save_month_data(username, year, month, month_data)
-                    print(f"Heatmap: Scaricato e salvato mese {year}/{month} per {username} dall'API")
-                else:
-                    print(f"Heatmap: Errore nel recupero delle partite per {month_url}: Status {response.status_code}")
-            except Exception as e:
-                print(f"Heatmap: Errore nel recupero delle partite per {month_url}: {str(e)}")
-        else:
-            # Il mese è disponibile localmente: carica dalla cache
-            try:
-                cache_used += 1
-                month_data = load_month_data(username, year, month)
-                if month_data:
-                    month_games = month_data.get("games", [])
-                    print(f"Heatmap: Caricato mese {year}/{month} per {username} dalla cache")
-                else:
-                    print(f"Heatmap: File cache trovato ma con errori per il mese {year}/{month}")
-            except Exception as e:
-                print(f"Heatmap: Errore nel caricamento della cache per {year}/{month}: {str(e)}")
-        
-        # Aggiungi le partite del mese all'elenco completo
-        if month_games:
-            all_games.extend(month_games)
+    # I PGN vengono analizzati solo ora, e solo quelli delle partite mai analizzate prima
+    moves = await load_moves(loaded)
+    stats = await asyncio.to_thread(move_stats, loaded["columns"], moves, top)
+    return {"success": True, "move_stats": stats, "cache_info": loaded["cache_info"]}
+
+@app.post("/api/elo-series")
+async def get_elo_series(
+    username: str = Form(...),
+    selected_months: str = Form(...),
+    points: int = Form(DEFAULT_SERIES_POINTS),
+    start: int = Form(None),
+    end: int = Form(None)
+):
+    if not await check_user_exists(username):
+        raise HTTPException(status_code=404, detail="Utente non trovato su Chess.com")
     
-    print(f"Heatmap: Statistiche cache per {username}: {cache_used} mesi dalla cache, {api_requests} mesi dall'API")
+    selected_months_list = json.loads(selected_months)
+    loaded = await load_games(username, selected_months_list)
     
-    # Inizializza la struttura per la heatmap
-    days_of_week = ["Domenica", "Lunedì", "Martedì", "Mercoledì", "Giovedì", "Venerdì", "Sabato"]
-    hours = list(range(24))  # 0-23 ore
+    # Serie per cadenza già ridotte a "points" punti: il grafico resta leggero anche con anni di partite
+    def compute_series():
+        index = get_range_index(loaded)
+        lo, hi = window_bounds(index, start, end)
+        return elo_series(loaded["columns"], index, lo, hi, points)
     
-    # Inizializza i conteggi per vittorie, sconfitte e pareggi
-    heatmap_wins = {day: {hour: 0 for hour in hours} for day in days_of_week}
-    heatmap_losses = {day: {hour: 0 for hour in hours} for day in days_of_week}
-    heatmap_draws = {day: {hour: 0 for hour in hours} for day in days_of_week}
+    series = await asyncio.to_thread(compute_series)
+    return {"success": True, "series": series, "cache_info": loaded["cache_info"]}
+
+@app.post("/api/range-stats")
+async def get_range_stats(
+    username: str = Form(...),
+    selected_months: str = Form(...),
+    start: int = Form(None),
+    end: int = Form(None),
+    timezone: str = Form(None),
+    points: int = Form(DEFAULT_SERIES_POINTS)
+):
+    try:
+        tzinfo = resolve_timezone(timezone)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Inizializza il conteggio totale di partite per calcolare le percentuali
-    heatmap_totals = {day: {hour: 0 for hour in hours} for day in days_of_week}
+    if not await check_user_exists(username):
+        raise HTTPException(status_code=404, detail="Utente non trovato su Chess.com")
     
-    # Processa i dati delle partite
-    for game in all_games:
-        white_player = game.get("white", {}).get("username", "unknown").lower()
-        black_player = game.get("black", {}).get("username", "unknown").lower()
-        
-        # Determina se il giocatore richiesto era bianco o nero
-        is_white = (username.lower() == white_player)
-        
-        # Determina il risultato dal punto di vista dell'utente
-        result = ""
-        if game.get("white", {}).get("result", "") == "win":
-            result = "win" if is_white else "loss"
-        elif game.get("black", {}).get("result", "") == "win":
-            result = "win" if not is_white else "loss"
-        else:
-            result = "draw"
-            
-        # Converte il timestamp Unix in data e ora
-        date_played = datetime.fromtimestamp(game.get("end_time", 0))
-        day_name = days_of_week[date_played.weekday()]
-        hour = date_played.hour
-        
-        # Aggiorna i contatori appropriati
-        if result == "win":
-            heatmap_wins[day_name][hour] += 1
-        elif result == "loss":
-            heatmap_losses[day_name][hour] += 1
-        else:  # draw
-            heatmap_draws[day_name][hour] += 1
-            
-        # Aggiorna il contatore totale
-        heatmap_totals[day_name][hour] += 1
+    selected_months_list = json.loads(selected_months)
+    loaded = await load_games(username, selected_months_list)
     
-    # Trasforma i dati in un formato adatto per il frontend
-    heatmap_data = {
-        "days": days_of_week,
-        "hours": hours,
-        "wins": [
-            [heatmap_wins[day][hour] for hour in hours] 
-            for day in days_of_week
-        ],
-        "losses": [
-            [heatmap_losses[day][hour] for hour in hours] 
-            for day in days_of_week
-        ],
-        "draws": [
-            [heatmap_draws[day][hour] for hour in hours] 
-            for day in days_of_week
-        ],
-        "totals": [
-            [heatmap_totals[day][hour] for hour in hours] 
-            for day in days_of_week
-        ],
-        "cache_info": {
-            "months_from_cache": cache_used,
-            "months_from_api": api_requests
+    # Sommario, heatmap e serie Elo dello stesso intervallo [start, end] con un'unica risposta:
+    # la ricerca binaria sull'indice ordinato per data trova l'intervallo, le somme prefisse danno i conteggi
+    def compute_range():
+        index = get_range_index(loaded, tzinfo)
+        lo, hi = window_bounds(index, start, end)
+        aggregates = range_summary(index, lo, hi)
+        return {
+            "summary": {**aggregates["summary"], "by_time_class": aggregates["time_classes"]},
+            "heatmap_data": format_heatmap(range_heatmap(index, lo, hi), timezone, loaded["cache_info"]),
+            "series": elo_series(loaded["columns"], index, lo, hi, points),
         }
-    }
     
-    return {"success": True, "heatmap_data": heatmap_data}
+    stats = await asyncio.to_thread(compute_range)
+    return {"success": True, "start": start, "end": end, **stats}
 
-@app.get("/api/download-file/{file_path}")
-async def download_file(file_path: str):
-    full_path = Path(f"downloads/{file_path}")
+@app.post("/api/head-to-head")
+async def get_head_to_head(username: str = Form(...), selected_months: str = Form(...), opponent: str = Form(...)):
+    # Bilancio contro un avversario, calcolato con una query sul database delle partite
+    months = await games_db_months(username, selected_months)
+    record = await asyncio.to_thread(head_to_head, username, opponent, months)
+    return {"success": True, "head_to_head": record}
+
+@app.post("/api/analytics")
+async def get_analytics(
+    username: str = Form(...),
+    selected_months: str = Form(...),
+    bucket: int = Form(DEFAULT_RATING_BUCKET),
+    top: int = Form(DEFAULT_TOP_OPPONENTS),
+    time_class: str = Form(None)
+):
+    if bucket < 1:
+        raise HTTPException(status_code=400, detail="L'ampiezza delle fasce deve essere almeno 1")
+    if not 1 <= top <= MAX_TOP_OPPONENTS:
+        raise HTTPException(status_code=400, detail=f"Il numero di avversari deve essere tra 1 e {MAX_TOP_OPPONENTS}")
     
-    if not full_path.exists():
-        raise HTTPException(status_code=404, detail="File non trovato")
+    if not await check_user_exists(username):
+        raise HTTPException(status_code=404, detail="Utente non trovato su Chess.com")
     
-    file_content = full_path.read_bytes()
-    file_name = full_path.name
+    selected_months_list = json.loads(selected_months)
+    loaded = await load_games(username, selected_months_list)
     
-    return JSONResponse(
-        content={
-            "file_name": file_name,
-            "file_content_base64": file_content.hex(),
-            "mime_type": "text/csv" if file_name.endswith(".csv") else "application/json"
-        }
+    # Fasce di differenza di rating, top avversari e serie dalle query sul database delle partite,
+    # memorizzate per (utente, insieme di mesi) finché la cache dei mesi non cambia
+    analytics, cached = await asyncio.to_thread(
+        cached_analytics, username, months_fingerprint(selected_months_list), data_version(loaded),
+        loaded["segments"], bucket, top, time_class
     )
+    return {"success": True, "cached": cached, "analytics": analytics, "cache_info": loaded["cache_info"]}
+
+@app.post("/api/exports")
+async def create_export(username: str = Form(...), selected_months: str = Form(...), format: str = Form("csv")):
+    if format not in available_formats():
+        raise HTTPException(status_code=400, detail=f"Formato di export non supportato: {format}")
+    
+    if not await check_user_exists(username):
+        raise HTTPException(status_code=404, detail="Utente non trovato su Chess.com")
+    
+    # Avvia il job in background (o restituisce quello già in corso per gli stessi mesi e formato)
+    job = start_export(username, json.loads(selected_months), format)
+    return {"success": True, "job": job_status(job)}
+
+@app.get("/api/exports/{job_id}")
+async def get_export_status(job_id: str):
+    # Lo stato arriva dal worker corrente o, se il job è di un altro worker, dalla cache condivisa
+    job = await get_export(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export non trovato")
+    return {"success": True, "job": job}
+
+@app.get("/api/scheduler-metrics")
+async def get_scheduler_metrics():
+    # Stato delle richieste verso Chess.com: coda, tempi di attesa, limitazioni e nuovi tentativi
+    return {"success": True, "metrics": scheduler_metrics()}
+
+@app.get("/metrics")
+async def get_metrics():
+    # Metriche in formato testuale Prometheus: fasi, cache, latenza verso Chess.com, richieste in corso
+    return PlainTextResponse(render_metrics(scheduler_metrics()), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/download-file/{file_path}")
+async def download_file(request: Request, file_path: str):
+    full_path = resolve_download_path(file_path)
+    if full_path is None:
+        raise HTTPException(status_code=404, detail="File non trovato")
+    
+    stat_result = full_path.stat()
+    size = stat_result.st_size
+    headers = download_headers(full_path, stat_result)
+    media_type = content_type(full_path)
+    
+    # Richiesta parziale (ripresa di un download): solo l'intervallo richiesto, senza compressione.
+    # Con If-Range l'intervallo vale solo se il file non è cambiato nel frattempo.
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == headers["ETag"]):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            raise HTTPException(status_code=416, detail="Intervallo non valido", headers={"Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(iter_file(full_path, start, end), status_code=206, media_type=media_type, headers=headers)
+    
+    # File completo: compresso al volo se il client lo accetta (CSV/JSON), altrimenti letto a blocchi
+    encoding = negotiate_encoding(full_path, request.headers.get("accept-encoding"))
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+        headers["Vary"] = "Accept-Encoding"
+        # L'ETag del contenuto compresso deve essere diverso da quello del file originale
+        headers["ETag"] = f'{headers["ETag"][:-1]}-{encoding}"'
+        return StreamingResponse(iter_compressed(full_path, encoding), media_type=media_type, headers=headers)
+    
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(iter_file(full_path), media_type=media_type, headers=headers)
 
 if __name__ == "__main__":
     import uvicorn
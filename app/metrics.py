@@ -0,0 +1,171 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Limiti superiori (in secondi) dei bucket degli istogrammi di durata
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Descrizione delle metriche esposte da /metrics: nome -> (tipo, testo di aiuto)
+METRICS = {
+    "chess_stat_http_requests_total": ("counter", "Richieste HTTP servite, per percorso, metodo e stato"),
+    "chess_stat_http_request_seconds": ("histogram", "Durata delle richieste HTTP, per percorso"),
+    "chess_stat_http_in_flight": ("gauge", "Richieste HTTP in corso"),
+    "chess_stat_stage_seconds": ("histogram", "Durata delle fasi delle richieste (download, lettura cache, parsing, ...)"),
+    "chess_stat_upstream_requests_total": ("counter", "Risposte ricevute da Chess.com, per stato"),
+    "chess_stat_upstream_seconds": ("histogram", "Latenza delle richieste verso Chess.com"),
+    "chess_stat_upstream_in_flight": ("gauge", "Richieste verso Chess.com in corso"),
+    "chess_stat_cache_requests_total": ("counter", "Accessi alle cache, per cache ed esito (hit, miss, ...)"),
+    "chess_stat_cache_hit_ratio": ("gauge", "Rapporto tra hit e accessi totali di ogni cache"),
+    "chess_stat_scheduler": ("gauge", "Stato dello scheduler delle richieste verso Chess.com"),
+}
+
+# Valori di contatori e gauge: (nome, etichette) -> valore
+_values = {}
+
+# Istogrammi: (nome, etichette) -> {"buckets": conteggi cumulativi per bucket, "sum": ..., "count": ...}
+_histograms = {}
+
+# Le metriche vengono aggiornate anche dai thread (asyncio.to_thread), quindi servono sotto lock
+_lock = threading.Lock()
+
+# Profilo della richiesta corrente (None se la profilazione non è attiva).
+# asyncio.to_thread copia il contesto, quindi anche le fasi eseguite nei thread finiscono qui.
+_profile = contextvars.ContextVar("chess_stat_profile", default=None)
+
+# Funzione per ottenere la chiave di una metrica con le sue etichette (in ordine di nome)
+def _metric_key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+# Funzione per incrementare un contatore (o un gauge, con un valore negativo per decrementarlo)
+def inc(name, value=1, **labels):
+    key = _metric_key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + value
+
+# Funzione per impostare il valore di un gauge
+def set_gauge(name, value, **labels):
+    with _lock:
+        _values[_metric_key(name, labels)] = value
+
+# Funzione per registrare una durata (in secondi) in un istogramma
+def observe(name, seconds, **labels):
+    key = _metric_key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][index] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+# Funzione per registrare l'esito di un accesso a una cache (hit, miss, revalidated, shared, ...)
+def cache_access(cache, result):
+    inc("chess_stat_cache_requests_total", cache=cache, result=result)
+
+# Context manager per misurare una fase (ad es. "upstream_fetch", "cache_read", "dataframe"):
+# la durata va nell'istogramma delle fasi e, se attiva, nel profilo della richiesta corrente
+@contextmanager
+def span(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        finished = time.perf_counter()
+        observe("chess_stat_stage_seconds", finished - started, stage=stage)
+        profile = _profile.get()
+        if profile is not None:
+            profile["stages"].append({
+                "stage": stage,
+                "start_ms": round((started - profile["started"]) * 1000, 2),
+                "ms": round((finished - started) * 1000, 2),
+            })
+
+# Context manager per profilare una richiesta: restituisce il profilo (None se non abilitato),
+# da convertire con profile_report al termine. Passando un profilo esistente lo si riattiva,
+# ad es. nei blocchi di una risposta in streaming prodotti dopo la fine dell'endpoint.
+@contextmanager
+def profiling(enabled=True, profile=None):
+    if not enabled:
+        yield None
+        return
+    if profile is None:
+        profile = {"started": time.perf_counter(), "stages": []}
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+
+# Funzione per riassumere un profilo: fasi in ordine di inizio e tempo totale per fase.
+# Le fasi possono sovrapporsi (ad es. i mesi scaricati in parallelo).
+def profile_report(profile):
+    stages = sorted(profile["stages"], key=lambda stage: stage["start_ms"])
+    by_stage = {}
+    for stage in stages:
+        by_stage[stage["stage"]] = round(by_stage.get(stage["stage"], 0) + stage["ms"], 2)
+    return {
+        "total_ms": round((time.perf_counter() - profile["started"]) * 1000, 2),
+        "by_stage": by_stage,
+        "stages": stages,
+    }
+
+# Funzione per calcolare i rapporti di hit delle cache (hit / accessi totali) a partire dai contatori
+def cache_hit_ratios():
+    totals = {}
+    with _lock:
+        for (name, labels), value in _values.items():
+            if name != "chess_stat_cache_requests_total":
+                continue
+            labels = dict(labels)
+            counts = totals.setdefault(labels["cache"], {"hits": 0, "total": 0})
+            counts["total"] += value
+            if labels["result"] == "hit":
+                counts["hits"] += value
+    return {cache: counts["hits"] / counts["total"] for cache, counts in totals.items() if counts["total"]}
+
+# Funzione per formattare le etichette nel formato di Prometheus, ad es. {stage="parse"}
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = [(key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for key, value in pairs]
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+# Funzione per produrre il testo di /metrics (formato di esposizione testuale di Prometheus).
+# scheduler contiene lo stato dello scheduler (scheduler_metrics): i valori numerici diventano gauge.
+def render_metrics(scheduler=None):
+    for name, value in (scheduler or {}).items():
+        if isinstance(value, (int, float)):
+            set_gauge("chess_stat_scheduler", value, metric=name)
+    for cache, ratio in cache_hit_ratios().items():
+        set_gauge("chess_stat_cache_hit_ratio", ratio, cache=cache)
+
+    with _lock:
+        values = sorted(_values.items())
+        histograms = sorted((key, {**histogram, "buckets": list(histogram["buckets"])}) for key, histogram in _histograms.items())
+
+    lines = []
+    described = set()
+    def describe(name):
+        if name in described:
+            return
+        described.add(name)
+        kind, help_text = METRICS[name]
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in values:
+        describe(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), histogram in histograms:
+        describe(name)
+        for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', str(bound))])} {count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,359 @@
+import asyncio
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.store import RESULT_LOSS, encode_categories, get_month_store_paths, write_atomic
+
+# Versione del formato della cache delle statistiche delle mosse: se cambia, i PGN vengono rianalizzati
+MOVES_VERSION = 1
+
+# PGN analizzati per ogni blocco inviato al pool di processi
+PGN_BATCH_SIZE = 2000
+
+# Sotto questa soglia l'analisi si fa in un thread, senza il costo di avvio del pool
+PGN_POOL_THRESHOLD = 4000
+
+# Processi del pool di analisi (default: numero di CPU)
+PGN_WORKERS = int(os.environ.get("CHESS_STAT_PGN_WORKERS", "0")) or None
+
+# Mosse dell'utente considerate nelle curve del tempo sull'orologio
+MAX_CLOCK_MOVES = 100
+
+# Numero di aperture riportate di default (le più giocate) e massimo consentito
+DEFAULT_TOP_OPENINGS = 20
+MAX_TOP_OPENINGS = 100
+
+_HEADER_RE = re.compile(r'^\[(\w+) "([^"]*)"\]', re.MULTILINE)
+_CLOCK_TAG = b"[%clk "
+_COMMENT_RE = re.compile(r"\{[^}]*\}|\([^)]*\)")
+
+# Pool di processi per l'analisi dei PGN, creato al primo utilizzo
+_pool = None
+
+# Funzione per ottenere il nome di un'apertura dall'URL di Chess.com,
+# ad es. ".../openings/Sicilian-Defense-Najdorf-Variation" -> "Sicilian Defense Najdorf Variation"
+def _opening_name(eco_url):
+    return eco_url.rstrip("/").rsplit("/", 1)[-1].replace("-", " ") if eco_url else ""
+
+# Funzione per leggere tutti gli orologi "[%clk h:mm:ss(.s)]" di un buffer di byte in modo vettoriale.
+# Ritorna (secondi residui, posizione di ogni annotazione nel buffer).
+def _parse_clocks(buffer):
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    if len(data) < len(_CLOCK_TAG):
+        return np.array([], dtype=np.float32), np.array([], dtype=np.int64)
+    tag = np.frombuffer(_CLOCK_TAG, dtype=np.uint8)
+    found = data[:len(data) - len(tag) + 1] == tag[0]
+    for offset in range(1, len(tag)):
+        found &= data[offset:len(data) - len(tag) + 1 + offset] == tag[offset]
+    positions = np.flatnonzero(found)
+    closing = np.flatnonzero(data == ord("]"))
+
+    # Ogni valore va da dopo "[%clk " fino alla "]" successiva; i secondi possono avere un decimale
+    start = positions + len(tag)
+    end = closing[np.searchsorted(closing, start)]
+
+    def digit(index):
+        return data[index].astype(np.float64) - ord("0")
+
+    has_tenths = data[end - 2] == ord(".")
+    seconds_end = np.where(has_tenths, end - 2, end)
+    seconds = digit(seconds_end - 2) * 10 + digit(seconds_end - 1) + np.where(has_tenths, digit(end - 1) / 10, 0)
+    minutes = digit(seconds_end - 5) * 10 + digit(seconds_end - 4)
+    hours_end = seconds_end - 6
+    hours = np.zeros(len(positions))
+    for width in range(int((hours_end - start).max(initial=0))):
+        # Le ore hanno lunghezza variabile (le partite per corrispondenza superano le 9 ore)
+        index = start + width
+        valid = index < hours_end
+        hours = np.where(valid, hours * 10 + digit(np.where(valid, index, start)), hours)
+    return (hours * 3600 + minutes * 60 + seconds).astype(np.float32), positions
+
+# Funzione per analizzare un blocco di PGN: intestazioni ECO/apertura, numero di semimosse e orologi.
+# Ritorna (eco, aperture, semimosse, orologi per partita, orologi in secondi) come liste/array piatti.
+def parse_pgn_batch(pgns):
+    ecos = []
+    openings = []
+    movetexts = []
+
+    for pgn in pgns:
+        header_end = pgn.find("\n\n")
+        headers = dict(_HEADER_RE.findall(pgn, 0, header_end if header_end >= 0 else len(pgn)))
+        ecos.append(headers.get("ECO", ""))
+        openings.append(_opening_name(headers.get("ECOUrl", "")))
+        movetexts.append(pgn[header_end + 2:].encode("utf-8") if header_end >= 0 else b"")
+
+    # Gli orologi di tutto il blocco vengono letti in un'unica passata sul testo delle mosse concatenato
+    lengths = np.array([len(movetext) for movetext in movetexts], dtype=np.int64)
+    clock_seconds, positions = _parse_clocks(b"".join(movetexts))
+    clock_counts = np.bincount(
+        np.searchsorted(np.cumsum(lengths), positions, side="right"), minlength=len(pgns)
+    ).astype(np.int32)
+
+    # Chess.com annota l'orologio dopo ogni semimossa; senza orologi si contano le mosse SAN
+    # (i numeri di mossa e il risultato iniziano con una cifra)
+    plies = clock_counts.copy()
+    for index in np.flatnonzero(clock_counts == 0):
+        movetext = _COMMENT_RE.sub(" ", movetexts[index].decode("utf-8"))
+        plies[index] = sum(1 for token in movetext.split() if token[0].isalpha())
+
+    return ecos, openings, plies, clock_counts, clock_seconds
+
+# Funzione per ottenere il pool di processi dell'analisi dei PGN
+def get_pgn_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PGN_WORKERS)
+    return _pool
+
+# Funzione per chiudere il pool di processi (chiamata allo spegnimento dell'app)
+def shutdown_pgn_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+# Funzione per analizzare una lista di PGN: in un thread se sono pochi, altrimenti a blocchi nel pool
+async def parse_pgns(pgns):
+    if len(pgns) < PGN_POOL_THRESHOLD:
+        return await asyncio.to_thread(parse_pgn_batch, pgns)
+
+    loop = asyncio.get_running_loop()
+    pool = get_pgn_pool()
+    batches = await asyncio.gather(*[
+        loop.run_in_executor(pool, parse_pgn_batch, pgns[start:start + PGN_BATCH_SIZE])
+        for start in range(0, len(pgns), PGN_BATCH_SIZE)
+    ])
+    return (
+        [eco for batch in batches for eco in batch[0]],
+        [opening for batch in batches for opening in batch[1]],
+        np.concatenate([batch[2] for batch in batches]),
+        np.concatenate([batch[3] for batch in batches]),
+        np.concatenate([batch[4] for batch in batches]),
+    )
+
+# Funzione per ottenere il percorso della cache delle statistiche delle mosse di un mese
+def get_month_moves_path(username, year, month):
+    npz_path, _ = get_month_store_paths(username, year, month)
+    return npz_path.with_suffix(".moves.npz")
+
+# Funzione per leggere la cache delle mosse di un mese (None se mancante o di un'altra versione)
+def _read_month_moves(username, year, month):
+    moves_path = get_month_moves_path(username, year, month)
+    if not moves_path.exists():
+        return None
+    with np.load(moves_path, allow_pickle=False) as data:
+        if int(data["version"]) != MOVES_VERSION:
+            return None
+        return {name: data[name] for name in data.files}
+
+# Funzione per leggere dal blob del mese i PGN delle partite non ancora presenti nella cache delle mosse.
+# Ritorna (cache esistente o None, righe mancanti, PGN mancanti).
+def _missing_month_pgns(username, year, month, columns):
+    cached = _read_month_moves(username, year, month)
+    if cached is None:
+        missing_rows = np.arange(len(columns["url"]))
+    else:
+        missing_rows = np.flatnonzero(~np.isin(columns["url"], cached["url"]))
+    if not len(missing_rows):
+        return cached, missing_rows, []
+
+    _, pgn_path = get_month_store_paths(username, year, month)
+    blob = pgn_path.read_bytes() if pgn_path.exists() else b""
+    offsets = columns["pgn_offsets"]
+    pgns = [blob[offsets[row]:offsets[row + 1]].decode("utf-8") for row in missing_rows]
+    return cached, missing_rows, pgns
+
+# Funzione per aggiungere alla cache delle mosse di un mese le partite appena analizzate (per URL)
+def _append_month_moves(username, year, month, cached, urls, parsed):
+    ecos, openings, plies, clock_counts, clock_seconds = parsed
+    if cached is None:
+        cached = {
+            "url": np.array([], dtype=bytes), "eco": np.array([], dtype=str), "opening": np.array([], dtype=str),
+            "plies": np.array([], dtype=np.int32), "clock_offsets": np.zeros(1, dtype=np.int64),
+            "clocks": np.array([], dtype=np.float32),
+        }
+    else:
+        cached = {
+            **cached,
+            "eco": cached["eco_names"][cached["eco_codes"]],
+            "opening": cached["opening_names"][cached["opening_codes"]],
+        }
+
+    moves = {"version": np.array(MOVES_VERSION)}
+    moves["url"] = np.concatenate([cached["url"], urls])
+    moves["eco_codes"], moves["eco_names"] = encode_categories(np.concatenate([cached["eco"], np.array(ecos, dtype=str)]))
+    moves["opening_codes"], moves["opening_names"] = encode_categories(np.concatenate([cached["opening"], np.array(openings, dtype=str)]))
+    moves["plies"] = np.concatenate([cached["plies"], plies])
+    moves["clock_offsets"] = np.concatenate([cached["clock_offsets"], cached["clock_offsets"][-1] + np.cumsum(clock_counts, dtype=np.int64)])
+    moves["clocks"] = np.concatenate([cached["clocks"], clock_seconds])
+    write_atomic(get_month_moves_path(username, year, month), lambda f: np.savez(f, **moves))
+    return moves
+
+# Funzione per allineare la cache delle mosse di un mese alle righe delle sue colonne (tramite URL)
+def _align_month_moves(columns, moves):
+    order = np.argsort(moves["url"])
+    positions = order[np.searchsorted(moves["url"], columns["url"], sorter=order)]
+    starts = moves["clock_offsets"][positions]
+    ends = moves["clock_offsets"][positions + 1]
+    return {
+        "eco": moves["eco_names"][moves["eco_codes"][positions]],
+        "opening": moves["opening_names"][moves["opening_codes"][positions]],
+        "plies": moves["plies"][positions],
+        "clock_starts": starts,
+        "clock_ends": ends,
+        "clocks": moves["clocks"],
+    }
+
+# Funzione per ottenere le statistiche delle mosse di un insieme di mesi già caricato (vedi load_games),
+# analizzando solo i PGN delle partite mai viste prima. Ritorna colonne allineate a loaded["columns"].
+async def load_moves(loaded):
+    username = loaded["username"]
+    segments = loaded["segments"]
+
+    pending = await asyncio.gather(*[
+        asyncio.to_thread(_missing_month_pgns, username, year, month, columns)
+        for (year, month), columns in segments
+    ])
+    all_pgns = [pgn for _, _, pgns in pending for pgn in pgns]
+    if all_pgns:
+        print(f"Analisi di {len(all_pgns)} PGN per {username}")
+        parsed = await parse_pgns(all_pgns)
+
+    month_moves = []
+    start = 0
+    if all_pgns:
+        clock_offsets = np.concatenate([[0], np.cumsum(parsed[3], dtype=np.int64)])
+    for ((year, month), columns), (cached, missing_rows, pgns) in zip(segments, pending):
+        if not len(columns["url"]):
+            month_moves.append(None)
+            continue
+        if pgns:
+            end = start + len(pgns)
+            part = (
+                parsed[0][start:end], parsed[1][start:end], parsed[2][start:end], parsed[3][start:end],
+                parsed[4][clock_offsets[start]:clock_offsets[end]],
+            )
+            cached = await asyncio.to_thread(
+                _append_month_moves, username, year, month, cached, columns["url"][missing_rows], part
+            )
+            start = end
+        month_moves.append(_align_month_moves(columns, cached))
+
+    # Riporta le statistiche nell'ordine delle colonne unite (per data decrescente)
+    merged_columns = loaded["columns"]
+    moves = {name: np.empty(len(merged_columns["end_time"]), dtype=object) for name in ("eco", "opening")}
+    moves["plies"] = np.zeros(len(merged_columns["end_time"]), dtype=np.int32)
+    clock_parts = []
+    clock_starts = np.zeros(len(merged_columns["end_time"]), dtype=np.int64)
+    clock_ends = np.zeros(len(merged_columns["end_time"]), dtype=np.int64)
+    base = 0
+    for index, aligned in enumerate(month_moves):
+        if aligned is None:
+            continue
+        positions = np.flatnonzero(merged_columns["segment"] == index)
+        rows = merged_columns["row"][positions]
+        moves["eco"][positions] = aligned["eco"][rows]
+        moves["opening"][positions] = aligned["opening"][rows]
+        moves["plies"][positions] = aligned["plies"][rows]
+        clock_starts[positions] = aligned["clock_starts"][rows] + base
+        clock_ends[positions] = aligned["clock_ends"][rows] + base
+        clock_parts.append(aligned["clocks"])
+        base += len(aligned["clocks"])
+    moves["clock_starts"] = clock_starts
+    moves["clock_ends"] = clock_ends
+    moves["clocks"] = np.concatenate(clock_parts) if clock_parts else np.array([], dtype=np.float32)
+    return moves
+
+# Funzione per ottenere il tempo base (in secondi) di una cadenza, ad es. "600+5" -> 600, "1/86400" -> 86400
+def _base_seconds(time_control):
+    value = time_control.split("/")[-1].split("+")[0]
+    return float(value) if value.replace(".", "", 1).isdigit() and float(value) > 0 else np.nan
+
+# Funzione per calcolare le statistiche delle mosse: frequenza e rendimento delle aperture (ECO),
+# lunghezza media delle partite in semimosse e curve del tempo residuo sull'orologio per cadenza
+def move_stats(columns, moves, top=DEFAULT_TOP_OPENINGS):
+    n = len(columns["end_time"])
+    result_index = np.asarray(columns["result"], dtype=np.int64) - RESULT_LOSS
+
+    # Aperture: conteggio e risultati [sconfitte, patte, vittorie] per codice ECO
+    openings = []
+    eco = moves["eco"].astype(str) if n else np.array([], dtype=str)
+    eco_names, eco_codes = np.unique(eco, return_inverse=True)
+    if n:
+        counts = np.bincount(eco_codes * 3 + result_index, minlength=len(eco_names) * 3).reshape(-1, 3)
+        opening = moves["opening"].astype(str)
+        # Le partite senza ECO (varianti, posizioni personalizzate) si escludono prima di prendere le top
+        order = np.argsort(-counts.sum(axis=1), kind="stable")
+        for code in order[eco_names[order] != ""][:top]:
+            losses, draws, wins = (int(value) for value in counts[code])
+            games = wins + draws + losses
+            names, name_counts = np.unique(opening[eco_codes == code], return_counts=True)
+            openings.append({
+                "eco": str(eco_names[code]),
+                "name": str(names[np.argmax(name_counts)]),
+                "games": games,
+                "wins": wins,
+                "draws": draws,
+                "losses": losses,
+                "win_rate": round(wins / games, 4),
+                "score": round((wins + draws / 2) / games, 4),
+            })
+
+    # Lunghezza media (in semimosse), in totale e per cadenza
+    class_names, class_codes = np.unique(np.asarray(columns["time_class"], dtype=str), return_inverse=True)
+    plies = moves["plies"]
+    class_games = np.bincount(class_codes, minlength=len(class_names))
+    class_plies = np.bincount(class_codes, weights=plies, minlength=len(class_names))
+    average_plies = {
+        "all": round(float(plies.mean()), 2) if n else 0.0,
+        **{str(name): round(float(class_plies[code] / class_games[code]), 2) for code, name in enumerate(class_names)},
+    }
+
+    # Curve dell'orologio: per ogni mossa dell'utente, tempo residuo medio (in secondi e in frazione del tempo base)
+    clock_curves = {}
+    lengths = moves["clock_ends"] - moves["clock_starts"]
+    if lengths.sum():
+        game_index = np.repeat(np.arange(n), lengths)
+        ply = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        # Semimosse pari = bianco, dispari = nero: si tengono solo quelle dell'utente
+        mine = ((ply % 2 == 0) == columns["is_white"][game_index]) & (ply // 2 < MAX_CLOCK_MOVES)
+        game_index, ply = game_index[mine], ply[mine]
+        clocks = moves["clocks"][moves["clock_starts"][game_index] + ply]
+        move_number = ply // 2
+
+        control_names, control_codes = np.unique(np.asarray(columns["time_control"], dtype=str), return_inverse=True)
+        base = np.array([_base_seconds(name) for name in control_names])[control_codes][game_index]
+        clock_classes = class_codes[game_index]
+
+        for code, name in enumerate(class_names):
+            selected = clock_classes == code
+            if not selected.any():
+                continue
+            numbers = move_number[selected]
+            games = np.bincount(numbers)
+            total_seconds = np.bincount(numbers, weights=clocks[selected])
+            fractions = clocks[selected] / base[selected]
+            valid = ~np.isnan(fractions)
+            total_fraction = np.bincount(numbers[valid], weights=fractions[valid], minlength=len(games))
+            fraction_games = np.bincount(numbers[valid], minlength=len(games))
+            reached = games > 0
+            clock_curves[str(name)] = {
+                "moves": (np.flatnonzero(reached) + 1).tolist(),
+                "games": games[reached].tolist(),
+                "avg_seconds": np.round(total_seconds[reached] / games[reached], 1).tolist(),
+                "avg_fraction": [
+                    round(float(total / count), 4) if count else None
+                    for total, count in zip(total_fraction[reached], fraction_games[reached])
+                ],
+            }
+
+    return {
+        "games": int(n),
+        "openings": openings,
+        "average_plies": average_plies,
+        "clock_curves": clock_curves,
+    }
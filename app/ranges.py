@@ -0,0 +1,125 @@
+import numpy as np
+
+from app.aggregates import timezone_key
+from app.stats import LOCAL_TZ, heatmap_cells
+from app.store import RESULT_LOSS
+
+# Numero di partite per blocco negli indici a somme prefisse: i conteggi sono salvati solo ai
+# confini dei blocchi, e le partite ai bordi dell'intervallo vengono contate direttamente
+RANGE_BLOCK_SIZE = 1024
+
+# Numero di celle della heatmap (giorno x ora x [sconfitte, patte, vittorie])
+HEATMAP_CELLS = 7 * 24 * 3
+
+# Funzione per costruire le somme prefisse a blocchi dei codici di categoria (da 0 a n_codes - 1):
+# la riga b contiene i conteggi delle partite [0, b * RANGE_BLOCK_SIZE)
+def _block_prefix_counts(codes, n_codes):
+    blocks = len(codes) // RANGE_BLOCK_SIZE
+    block_id = np.arange(blocks * RANGE_BLOCK_SIZE) // RANGE_BLOCK_SIZE
+    counts = np.bincount(block_id * n_codes + codes[:blocks * RANGE_BLOCK_SIZE], minlength=blocks * n_codes)
+    prefix = np.zeros((blocks + 1, n_codes), dtype=np.int64)
+    np.cumsum(counts.reshape(blocks, n_codes), axis=0, out=prefix[1:])
+    return prefix
+
+# Funzione per contare i codici di categoria delle partite [lo, hi): blocchi interi dalle somme
+# prefisse, più le partite dei due blocchi parziali ai bordi
+def _window_counts(codes, prefix, n_codes, lo, hi):
+    first_block = -(-lo // RANGE_BLOCK_SIZE)
+    last_block = min(hi // RANGE_BLOCK_SIZE, len(prefix) - 1)
+    if first_block >= last_block:
+        return np.bincount(codes[lo:hi], minlength=n_codes)
+    return (
+        prefix[last_block] - prefix[first_block]
+        + np.bincount(codes[lo:first_block * RANGE_BLOCK_SIZE], minlength=n_codes)
+        + np.bincount(codes[last_block * RANGE_BLOCK_SIZE:hi], minlength=n_codes)
+    )
+
+# Funzione per costruire l'indice per intervalli di date di un insieme di partite:
+# partite in ordine cronologico (end_time crescente) con le somme prefisse di risultati per
+# cadenza e colore e delle celle della heatmap nel fuso orario indicato
+def build_range_index(columns, timezone=LOCAL_TZ):
+    # Le colonne sono ordinate per data decrescente: l'ordine cronologico è quello inverso
+    order = np.arange(len(columns["end_time"]))[::-1]
+    end_time = columns["end_time"][order]
+    result = np.asarray(columns["result"][order], dtype=np.int64) - RESULT_LOSS
+    is_white = np.asarray(columns["is_white"][order], dtype=np.int64)
+    class_names, class_codes = np.unique(np.asarray(columns["time_class"], dtype=str)[order], return_inverse=True)
+
+    # Un codice per combinazione (cadenza, colore, risultato) e uno per cella della heatmap
+    n_summary = len(class_names) * 6
+    summary_codes = (class_codes * 2 + is_white) * 3 + result
+    heatmap_codes = heatmap_cells(end_time, columns["result"][order], timezone)
+
+    return {
+        "timezone": timezone_key(timezone),
+        "order": order,
+        "end_time": end_time,
+        "user_rating": columns["user_rating"][order],
+        "class_names": class_names.tolist(),
+        # Posizioni (cronologiche) delle partite di ogni cadenza, per trovarne prima e ultima con una ricerca binaria
+        "class_positions": [np.flatnonzero(class_codes == code) for code in range(len(class_names))],
+        "summary_codes": summary_codes,
+        "summary_prefix": _block_prefix_counts(summary_codes, n_summary),
+        "heatmap_codes": heatmap_codes,
+        "heatmap_prefix": _block_prefix_counts(heatmap_codes, HEATMAP_CELLS),
+    }
+
+# Funzione per ottenere l'indice per intervalli di un caricamento di partite nel fuso indicato.
+# L'indice viene salvato nel caricamento stesso, quindi vive quanto le colonne in memoria.
+def get_range_index(loaded, timezone=LOCAL_TZ):
+    indexes = loaded.setdefault("range_indexes", {})
+    key = timezone_key(timezone)
+    if key not in indexes:
+        indexes[key] = build_range_index(loaded["columns"], timezone)
+    return indexes[key]
+
+# Funzione per trovare con una ricerca binaria le posizioni [lo, hi) delle partite concluse
+# tra start e end (timestamp Unix, estremi inclusi; None per non limitare)
+def window_bounds(index, start=None, end=None):
+    end_time = index["end_time"]
+    lo = int(np.searchsorted(end_time, start, side="left")) if start is not None else 0
+    hi = int(np.searchsorted(end_time, end, side="right")) if end is not None else len(end_time)
+    return lo, max(lo, hi)
+
+# Funzione per calcolare sommario e statistiche per cadenza delle partite [lo, hi),
+# nello stesso formato di combine_aggregates
+def range_summary(index, lo, hi):
+    n_classes = len(index["class_names"])
+    counts = _window_counts(index["summary_codes"], index["summary_prefix"], n_classes * 6, lo, hi)
+    counts = counts.reshape(n_classes, 2, 3)
+
+    time_classes = {}
+    for code, name in enumerate(index["class_names"]):
+        positions = index["class_positions"][code]
+        first, last = np.searchsorted(positions, [lo, hi])
+        if first == last:
+            continue
+        window = positions[first:last]
+        ratings = index["user_rating"][window]
+        time_classes[name] = {
+            "results": counts[code].sum(axis=0).tolist(),
+            "first_time": int(index["end_time"][window[0]]),
+            "first_rating": int(ratings[0]),
+            "last_time": int(index["end_time"][window[-1]]),
+            "last_rating": int(ratings[-1]),
+            "min_rating": int(ratings.min()),
+            "max_rating": int(ratings.max()),
+        }
+
+    # Il colore 0 è il nero, 1 il bianco; i risultati sono [sconfitte, patte, vittorie]
+    by_color = counts.sum(axis=0)
+    totals = by_color.sum(axis=0)
+    summary = {
+        "total_games": int(totals.sum()),
+        "wins": int(totals[2]),
+        "losses": int(totals[0]),
+        "draws": int(totals[1]),
+        "as_white": int(by_color[1].sum()),
+        "as_black": int(by_color[0].sum()),
+    }
+    return {"summary": summary, "time_classes": time_classes}
+
+# Funzione per calcolare la heatmap 7x24x3 (giorno, ora, [sconfitte, patte, vittorie]) delle partite [lo, hi)
+def range_heatmap(index, lo, hi):
+    counts = _window_counts(index["heatmap_codes"], index["heatmap_prefix"], HEATMAP_CELLS, lo, hi)
+    return counts.reshape(7, 24, 3)
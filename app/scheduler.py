@@ -0,0 +1,142 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+
+# Priorità delle richieste verso Chess.com (valore più basso = servita prima):
+# verifiche utente/profilo/archivi richieste dalla UI, mesi di partite, import massivi in background
+PRIORITY_INTERACTIVE = 0
+PRIORITY_MONTH = 1
+PRIORITY_BACKFILL = 2
+
+# Token bucket: richieste al secondo a regime e numero massimo di richieste in raffica
+RATE_LIMIT = float(os.environ.get("CHESS_STAT_RATE_LIMIT", "8"))
+RATE_BURST = float(os.environ.get("CHESS_STAT_RATE_BURST", "8"))
+
+# Limite minimo a cui può scendere il rate dopo ripetuti 403/429, e recupero per ogni risposta riuscita
+MIN_RATE = 0.5
+RATE_RECOVERY = 0.1
+
+# Nuovi tentativi con backoff esponenziale (e jitter) sulle risposte di limitazione o errore del server
+MAX_RETRIES = int(os.environ.get("CHESS_STAT_MAX_RETRIES", "4"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+THROTTLE_STATUSES = {403, 429}
+RETRY_STATUSES = THROTTLE_STATUSES | {500, 502, 503, 504}
+
+# Stato del token bucket (il rate si adatta alle risposte di Chess.com)
+_bucket = {"rate": RATE_LIMIT, "tokens": RATE_BURST, "updated": time.monotonic(), "paused_until": 0.0}
+
+# Coda con priorità delle richieste in attesa: (priorità, sequenza, istante di accodamento, future)
+_queue = []
+_sequence = itertools.count()
+
+# Task che assegna i token alle richieste in coda (attivo solo finché la coda non è vuota)
+_dispatcher = None
+
+# Metriche dello scheduler
+_metrics = {
+    "requests": 0,
+    "retries": 0,
+    "throttled": 0,
+    "server_errors": 0,
+    "max_queue_depth": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+}
+
+# Funzione per ricaricare i token maturati dall'ultimo aggiornamento
+def _refill(now):
+    elapsed = now - _bucket["updated"]
+    _bucket["tokens"] = min(RATE_BURST, _bucket["tokens"] + elapsed * _bucket["rate"])
+    _bucket["updated"] = now
+
+# Ciclo che serve la coda in ordine di priorità, un token per richiesta
+async def _dispatch():
+    global _dispatcher
+    try:
+        while _queue:
+            now = time.monotonic()
+            _refill(now)
+            delay = max(_bucket["paused_until"] - now, 0.0)
+            if delay == 0.0 and _bucket["tokens"] < 1:
+                delay = (1 - _bucket["tokens"]) / _bucket["rate"]
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, enqueued_at, future = heapq.heappop(_queue)
+            if future.done():
+                # Richiesta annullata mentre era in coda
+                continue
+            _bucket["tokens"] -= 1
+            wait = now - enqueued_at
+            _metrics["wait_seconds_total"] += wait
+            _metrics["wait_seconds_max"] = max(_metrics["wait_seconds_max"], wait)
+            future.set_result(wait)
+    finally:
+        _dispatcher = None
+
+# Funzione per attendere il proprio turno (e un token) prima di inviare una richiesta.
+# Ritorna il tempo trascorso in coda, in secondi.
+async def acquire(priority=PRIORITY_INTERACTIVE):
+    global _dispatcher
+    future = asyncio.get_running_loop().create_future()
+    heapq.heappush(_queue, (priority, next(_sequence), time.monotonic(), future))
+    _metrics["requests"] += 1
+    _metrics["max_queue_depth"] = max(_metrics["max_queue_depth"], len(_queue))
+    if _dispatcher is None:
+        _dispatcher = asyncio.ensure_future(_dispatch())
+    return await future
+
+# Funzione per adattare il rate alla risposta ricevuta: dimezzato e pausa globale su 403/429,
+# recupero graduale fino a RATE_LIMIT sulle risposte riuscite
+def record_response(status_code, retry_after=None):
+    if status_code in THROTTLE_STATUSES:
+        _metrics["throttled"] += 1
+        _bucket["rate"] = max(MIN_RATE, _bucket["rate"] / 2)
+        pause = retry_after if retry_after is not None else BACKOFF_BASE
+        _bucket["paused_until"] = max(_bucket["paused_until"], time.monotonic() + pause)
+    elif status_code >= 500:
+        _metrics["server_errors"] += 1
+    else:
+        _bucket["rate"] = min(RATE_LIMIT, _bucket["rate"] + RATE_RECOVERY)
+
+# Funzione per leggere l'header Retry-After (solo nella forma in secondi)
+def parse_retry_after(value):
+    if value and value.strip().isdigit():
+        return min(float(value), BACKOFF_MAX)
+    return None
+
+# Funzione per calcolare l'attesa prima del tentativo successivo (backoff esponenziale con "full jitter")
+def backoff_delay(attempt, retry_after=None):
+    _metrics["retries"] += 1
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+# Funzione per ottenere le metriche dello scheduler (profondità della coda, attese, limitazioni)
+def scheduler_metrics():
+    served = _metrics["requests"] - len(_queue)
+    return {
+        **_metrics,
+        "queue_depth": len(_queue),
+        "queue_depth_by_priority": {
+            name: sum(1 for entry in _queue if entry[0] == priority)
+            for name, priority in (("interactive", PRIORITY_INTERACTIVE), ("month", PRIORITY_MONTH), ("backfill", PRIORITY_BACKFILL))
+        },
+        "wait_seconds_avg": _metrics["wait_seconds_total"] / served if served else 0.0,
+        "current_rate": _bucket["rate"],
+    }
+
+# Funzione per azzerare lo stato dello scheduler (chiamata alla chiusura del client HTTP)
+def reset_scheduler():
+    global _dispatcher
+    if _dispatcher is not None:
+        _dispatcher.cancel()
+        _dispatcher = None
+    for _, _, _, future in _queue:
+        future.cancel()
+    _queue.clear()
+    _bucket.update({"rate": RATE_LIMIT, "tokens": RATE_BURST, "updated": time.monotonic(), "paused_until": 0.0})
@@ -0,0 +1,90 @@
+import numpy as np
+
+from app.store import RESULT_NAMES
+
+# Numero di punti restituiti di default per ogni serie Elo, e limiti accettati
+DEFAULT_SERIES_POINTS = 500
+MIN_SERIES_POINTS = 3
+MAX_SERIES_POINTS = 5000
+
+# Funzione per scegliere gli indici dei punti da mantenere con l'algoritmo LTTB
+# (Largest-Triangle-Three-Buckets): per ogni bucket si tiene il punto che forma il triangolo
+# di area maggiore con il punto scelto prima e con la media del bucket successivo.
+# Il primo e l'ultimo punto vengono sempre mantenuti.
+def lttb_indices(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < MIN_SERIES_POINTS:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, n)
+        average_x = x[end:next_end].mean()
+        average_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[previous] - average_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (average_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+# Funzione per descrivere una partita (punto della serie, minimo o massimo)
+def _game_point(columns, index):
+    return {
+        "timestamp": int(columns["end_time"][index]),
+        "rating": int(columns["user_rating"][index]),
+        "result": RESULT_NAMES[int(columns["result"][index])],
+        "opponent": str(columns["opponent"][index]),
+        "user_color": "white" if columns["is_white"][index] else "black",
+        "time_class": str(columns["time_class"][index]),
+    }
+
+# Funzione per calcolare la serie Elo di un insieme di partite (indici in ordine cronologico):
+# minimo e massimo sull'intera serie e punti ridotti con LTTB (minimo e massimo sempre inclusi)
+def _rating_series(columns, indices, points):
+    if not len(indices):
+        return {"total_games": 0, "points": None, "max": None, "min": None}
+
+    ratings = columns["user_rating"][indices]
+    # Come nel grafico originale: in caso di parità si considera la prima partita in ordine di tempo
+    max_index = indices[int(np.argmax(ratings))]
+    min_index = indices[int(np.argmin(ratings))]
+
+    kept = indices[lttb_indices(columns["end_time"][indices], ratings, points)]
+    kept = np.union1d(kept, [max_index, min_index])
+    kept = kept[np.argsort(columns["end_time"][kept], kind="stable")]
+
+    return {
+        "total_games": int(len(indices)),
+        "points": {
+            "timestamp": columns["end_time"][kept].tolist(),
+            "rating": columns["user_rating"][kept].tolist(),
+            "result": [RESULT_NAMES[int(value)] for value in columns["result"][kept]],
+            "opponent": np.asarray(columns["opponent"][kept], dtype=str).tolist(),
+            "user_color": np.where(columns["is_white"][kept], "white", "black").tolist(),
+            "time_class": np.asarray(columns["time_class"][kept], dtype=str).tolist(),
+        },
+        "max": _game_point(columns, max_index),
+        "min": _game_point(columns, min_index),
+    }
+
+# Funzione per calcolare le serie Elo per cadenza (più "all" con tutte le partite) delle partite
+# [lo, hi) dell'indice per intervalli (posizioni in ordine cronologico, vedi app.ranges)
+def elo_series(columns, index, lo=0, hi=None, points=DEFAULT_SERIES_POINTS):
+    points = min(max(int(points), MIN_SERIES_POINTS), MAX_SERIES_POINTS)
+    hi = len(index["order"]) if hi is None else hi
+
+    series = {"all": _rating_series(columns, index["order"][lo:hi], points)}
+    for name, positions in zip(index["class_names"], index["class_positions"]):
+        first, last = np.searchsorted(positions, [lo, hi])
+        series[name] = _rating_series(columns, index["order"][positions[first:last]], points)
+    return series
@@ -0,0 +1,152 @@
+import asyncio
+import importlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from app.storage import DATA_DIR
+
+# Backend della cache condivisa tra i worker: "sqlite" (default, un file locale condiviso da tutti i
+# processi della macchina) oppure il percorso di un modulo Python (ad es. "mypackage.redis_cache")
+# che espone le funzioni di BACKEND_OPERATIONS, per usare uno store di rete tra più macchine
+CACHE_BACKEND = os.environ.get("CHESS_STAT_CACHE_BACKEND", "sqlite")
+
+# File del database SQLite, in downloads/users/ con la cache dei mesi: gli export (e i download)
+# usano solo i file direttamente in downloads/, quindi non viene servito né ripulito con loro
+CACHE_DB_PATH = Path(os.environ.get("CHESS_STAT_CACHE_DB", str(DATA_DIR / "shared_cache.sqlite3")))
+
+# Operazioni che ogni backend deve fornire (funzioni sincrone, eseguite in un thread):
+#   get(key) -> bytes o None             valore non scaduto
+#   set(key, value, ttl)                 salva bytes per ttl secondi
+#   try_lock(key, owner, lease) -> bool  prende il lock se libero o scaduto (lease in secondi)
+#   unlock(key, owner)                   rilascia il lock solo se appartiene a owner
+BACKEND_OPERATIONS = ("get", "set", "try_lock", "unlock")
+
+# Durata massima (in secondi) di un lock: se il worker che lo tiene muore, dopo questo tempo
+# un altro worker può prenderlo
+LOCK_LEASE = 120
+
+# Tempo massimo di attesa di un lock; scaduto, si procede comunque (al massimo si duplica il lavoro)
+LOCK_TIMEOUT = 60
+
+# Attesa iniziale e massima (in secondi) tra due tentativi di prendere un lock occupato
+LOCK_POLL_MIN = 0.02
+LOCK_POLL_MAX = 0.5
+
+# Intervallo (in secondi) tra due pulizie delle voci scadute nel database SQLite
+PRUNE_INTERVAL = 300
+
+# Identificativo di questo processo come proprietario dei lock
+OWNER = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+# Connessioni SQLite, una per thread (sqlite3 non condivide le connessioni tra thread)
+_local = threading.local()
+
+# Backend in uso (caricato al primo utilizzo) e istante dell'ultima pulizia
+_backend = None
+_last_prune = 0.0
+
+# Funzione per aprire (una volta per thread) la connessione al database della cache condivisa.
+# WAL permette letture concorrenti mentre un altro processo scrive.
+def _connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        CACHE_DB_PATH.parent.mkdir(exist_ok=True, parents=True)
+        conn = sqlite3.connect(CACHE_DB_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+        _local.conn = conn
+    return conn
+
+def sqlite_get(key):
+    row = _connection().execute(
+        "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, time.time())
+    ).fetchone()
+    return row[0] if row else None
+
+def sqlite_set(key, value, ttl):
+    global _last_prune
+    conn = _connection()
+    now = time.time()
+    conn.execute(
+        "INSERT INTO entries (key, value, expires_at) VALUES (?, ?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+        (key, value, now + ttl)
+    )
+    if now - _last_prune > PRUNE_INTERVAL:
+        _last_prune = now
+        conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        conn.execute("DELETE FROM locks WHERE expires_at <= ?", (now,))
+
+def sqlite_try_lock(key, owner, lease):
+    now = time.time()
+    # Un solo statement: inserisce il lock, o lo sostituisce solo se quello esistente è scaduto
+    cursor = _connection().execute(
+        "INSERT INTO locks (key, owner, expires_at) VALUES (?, ?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+        "WHERE locks.expires_at <= ?",
+        (key, owner, now + lease, now)
+    )
+    return cursor.rowcount == 1
+
+def sqlite_unlock(key, owner):
+    _connection().execute("DELETE FROM locks WHERE key = ? AND owner = ?", (key, owner))
+
+# Backend SQLite di default
+SQLITE_BACKEND = {
+    "get": sqlite_get,
+    "set": sqlite_set,
+    "try_lock": sqlite_try_lock,
+    "unlock": sqlite_unlock,
+}
+
+# Funzione per caricare un backend dal nome: "sqlite" o il percorso di un modulo con le stesse funzioni
+def load_backend(name):
+    if name == "sqlite":
+        return SQLITE_BACKEND
+    module = importlib.import_module(name)
+    missing = [operation for operation in BACKEND_OPERATIONS if not callable(getattr(module, operation, None))]
+    if missing:
+        raise ValueError(f"Il backend di cache {name} non definisce: {', '.join(missing)}")
+    return {operation: getattr(module, operation) for operation in BACKEND_OPERATIONS}
+
+# Funzione per ottenere il backend in uso (caricato al primo utilizzo)
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = load_backend(CACHE_BACKEND)
+    return _backend
+
+# Funzioni asincrone usate dall'app: le operazioni del backend vengono eseguite in un thread
+async def shared_get(key):
+    return await asyncio.to_thread(get_backend()["get"], key)
+
+async def shared_set(key, value, ttl):
+    await asyncio.to_thread(get_backend()["set"], key, value, ttl)
+
+# Lock condiviso tra i worker (e tra le macchine, con un backend di rete) su una chiave.
+# Restituisce True se il lock è stato preso, False se l'attesa ha superato il timeout: in quel caso
+# si procede comunque, perché le scritture sono atomiche e al massimo si ripete un download.
+@asynccontextmanager
+async def shared_lock(key, timeout=LOCK_TIMEOUT, lease=LOCK_LEASE):
+    backend = get_backend()
+    deadline = time.monotonic() + timeout
+    delay = LOCK_POLL_MIN
+    acquired = await asyncio.to_thread(backend["try_lock"], key, OWNER, lease)
+    while not acquired and time.monotonic() < deadline:
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, LOCK_POLL_MAX)
+        acquired = await asyncio.to_thread(backend["try_lock"], key, OWNER, lease)
+    if not acquired:
+        print(f"Lock condiviso {key} non ottenuto entro {timeout}s: si procede senza")
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            await asyncio.to_thread(backend["unlock"], key, OWNER)
@@ -0,0 +1,91 @@
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+import pandas as pd
+from dateutil import tz
+
+from app.store import RESULT_LOSS, read_pgns
+
+# Fuso orario del server, usato per le date mostrate nella tabella e negli export.
+# gettz() legge il file del fuso (TZ o /etc/localtime), che pandas converte in modo vettoriale.
+LOCAL_TZ = tz.gettz() or tz.tzlocal()
+
+# Categorie (nell'ordine dei codici) per colore e risultato dell'utente
+COLOR_CATEGORIES = ["black", "white"]
+RESULT_CATEGORIES = ["loss", "draw", "win"]
+
+# Giorni della settimana (righe della heatmap) e ore (colonne)
+DAYS_OF_WEEK = ["Domenica", "Lunedì", "Martedì", "Mercoledì", "Giovedì", "Venerdì", "Sabato"]
+HOURS = list(range(24))
+
+# Colonne del DataFrame delle partite, nell'ordine usato per gli export
+GAME_COLUMNS = [
+    "date", "timestamp", "user_color", "opponent", "result", "time_control",
+    "time_class", "variant", "user_rating", "opponent_rating", "pgn", "url"
+]
+
+# Funzione per convertire un array di timestamp Unix in orari locali (senza fuso) del fuso indicato
+def to_local_datetimes(end_time, timezone=LOCAL_TZ):
+    return pd.to_datetime(end_time, unit="s", utc=True).tz_convert(timezone).tz_localize(None)
+
+# Funzione per ottenere il fuso orario richiesto dal client (nome IANA, ad es. "Europe/Rome").
+# Senza nome si usa il fuso del server; un nome sconosciuto solleva ValueError.
+def resolve_timezone(name):
+    if not name:
+        return LOCAL_TZ
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        raise ValueError(f"Fuso orario non valido: {name}") from e
+
+# Funzione per costruire il DataFrame delle partite direttamente dalle colonne caricate,
+# con operazioni vettoriali al posto del ciclo per partita
+def games_frame(loaded, include_pgn=True):
+    columns = loaded["columns"]
+    n = len(columns["end_time"])
+
+    if include_pgn:
+        pgns = read_pgns(loaded["username"], loaded["segments"], columns["segment"], columns["row"])
+    else:
+        pgns = np.full(n, "", dtype=object)
+
+    return pd.DataFrame({
+        "date": to_local_datetimes(columns["end_time"]).strftime("%Y-%m-%d %H:%M:%S"),
+        "timestamp": columns["end_time"],
+        "user_color": pd.Categorical.from_codes(columns["is_white"].astype(np.int8), COLOR_CATEGORIES),
+        "opponent": columns["opponent"],
+        "result": pd.Categorical.from_codes(columns["result"].astype(np.int8) - RESULT_LOSS, RESULT_CATEGORIES),
+        "time_control": columns["time_control"],
+        "time_class": columns["time_class"],
+        "variant": columns["variant"],
+        "user_rating": columns["user_rating"],
+        "opponent_rating": columns["opponent_rating"],
+        "pgn": pgns,
+        "url": columns["url"].astype(str),
+    }, columns=GAME_COLUMNS)
+
+# Funzione per convertire il DataFrame delle partite in record JSON per il frontend
+def frame_to_records(df):
+    return df.astype({"user_color": str, "result": str}).to_dict(orient="records")
+
+# Funzione per calcolare la cella della heatmap (giorno, ora, risultato) di ogni partita,
+# come indice da 0 a 7 * 24 * 3 - 1; il risultato va da 0 (loss) a 2 (win)
+def heatmap_cells(end_time, result, timezone=LOCAL_TZ):
+    local_seconds = to_local_datetimes(end_time, timezone).values.astype("datetime64[s]").astype(np.int64)
+
+    # Il 01/01/1970 era un giovedì: con Domenica = 0 il giorno è (giorni dall'epoca + 4) % 7
+    day = (local_seconds // 86400 + 4) % 7
+    hour = (local_seconds // 3600) % 24
+    return (day * 24 + hour) * 3 + (np.asarray(result, dtype=np.int64) - RESULT_LOSS)
+
+# Funzione per calcolare le matrici 7x24 (giorno x ora) di vittorie, sconfitte, patte e totali
+# con un'unica passata di binning (bincount) su end_time e risultato
+def heatmap_matrices(end_time, result, timezone=LOCAL_TZ):
+    counts = np.bincount(heatmap_cells(end_time, result, timezone), minlength=7 * 24 * 3).reshape(7, 24, 3)
+
+    return {
+        "wins": counts[:, :, 2],
+        "losses": counts[:, :, 0],
+        "draws": counts[:, :, 1],
+        "totals": counts.sum(axis=2),
+    }
@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# orjson (dipendenza del progetto) codifica e decodifica i JSON molto più velocemente di json;
+# se manca (ad es. installazione parziale) si ricade sulla libreria standard
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Directory per lo storage dei dati utenti
+DATA_DIR = Path("downloads/users")
+DATA_DIR.mkdir(exist_ok=True, parents=True)
+
+# Cartelle già create in questo processo: mkdir viene chiamato una sola volta per cartella
+_created_dirs = set()
+
+# Margine (in secondi) dopo la fine di un mese prima di considerarlo chiuso e immutabile
+MONTH_CLOSE_GRACE = 3600
+
+# Funzione per creare una cartella (se manca) solo la prima volta che serve in questo processo
+def ensure_dir(path):
+    if path not in _created_dirs:
+        path.mkdir(exist_ok=True, parents=True)
+        _created_dirs.add(path)
+    return path
+
+# Funzione per scrivere un file in modo atomico (scrittura su file temporaneo + rename):
+# chi legge nello stesso momento trova la versione precedente o quella nuova, mai un file a metà.
+# Il nome temporaneo include processo e thread, così scritture concorrenti non si sovrappongono.
+def write_atomic(path, write):
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        f = open(tmp_path, "wb")
+    except FileNotFoundError:
+        # La cartella è stata rimossa dopo essere stata creata (ad es. cache svuotata a mano)
+        _created_dirs.discard(path.parent)
+        ensure_dir(path.parent)
+        f = open(tmp_path, "wb")
+    try:
+        with f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+# Funzioni per codificare e decodificare il JSON della cache (con orjson se installato, molto più veloce)
+def dumps_json(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+def loads_json(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+# Funzione per leggere un file JSON (None se non esiste)
+def read_json(path):
+    try:
+        raw = path.read_bytes()
+    except FileNotFoundError:
+        return None
+    return loads_json(raw)
+
+# Funzione per salvare un file JSON in modo atomico
+def write_json(path, data):
+    raw = dumps_json(data)
+    write_atomic(path, lambda f: f.write(raw))
+
+# Funzione per ottenere la cartella di un utente (creata al primo uso)
+def get_user_dir(username):
+    return ensure_dir(DATA_DIR / username.lower())
+
+# Funzione per ottenere il percorso dove salvare i dati di un mese specifico
+def get_user_month_path(username, year, month):
+    month_str = str(month).zfill(2)
+    return get_user_dir(username) / f"{year}_{month_str}.json"
+
+# Funzione per ottenere il percorso dei metadati (validatori HTTP, immutabilità) di un mese
+def get_user_month_meta_path(username, year, month):
+    month_path = get_user_month_path(username, year, month)
+    return month_path.with_name(f"{month_path.stem}.meta.json")
+
+# Funzione per verificare se un mese specifico esiste già localmente
+def month_exists_locally(username, year, month):
+    file_path = get_user_month_path(username, year, month)
+    return file_path.exists()
+
+# Funzione per salvare i dati di un mese specifico
+def save_month_data(username, year, month, data):
+    write_json(get_user_month_path(username, year, month), data)
+
+# Funzione per caricare i dati di un mese specifico
+def load_month_data(username, year, month):
+    return read_json(get_user_month_path(username, year, month))
+
+# Funzione per caricare i metadati di un mese (None se non ancora salvati)
+def load_month_meta(username, year, month):
+    return read_json(get_user_month_meta_path(username, year, month))
+
+# Funzione per salvare i metadati di un mese
+def save_month_meta(username, year, month, meta):
+    write_json(get_user_month_meta_path(username, year, month), meta)
+
+# Funzione per leggere in un colpo solo lo stato locale di un mese: (esiste, metadati, immutabile).
+# Fa solo I/O su disco, quindi i chiamanti asincroni la eseguono in un thread.
+def local_month_state(username, year, month):
+    if not month_exists_locally(username, year, month):
+        return False, None, False
+    meta = load_month_meta(username, year, month)
+    return True, meta, is_month_immutable(username, year, month, meta)
+
+# Funzione per ottenere il timestamp Unix (UTC) della fine di un mese
+def month_end_timestamp(year, month):
+    year, month = int(year), int(month)
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return datetime(next_year, next_month, 1, tzinfo=timezone.utc).timestamp()
+
+# Funzione per verificare se un mese era già chiuso in un certo istante (di default adesso)
+def is_month_closed(year, month, at=None):
+    at = time.time() if at is None else at
+    return at >= month_end_timestamp(year, month) + MONTH_CLOSE_GRACE
+
+# Funzione per verificare se la copia locale di un mese è definitiva (non serve più ricontrollarla).
+# Per le cache create prima dei metadati si usa la data di modifica del file.
+def is_month_immutable(username, year, month, meta=None):
+    if meta is not None:
+        return bool(meta.get("immutable"))
+    file_path = get_user_month_path(username, year, month)
+    return file_path.exists() and is_month_closed(year, month, at=file_path.stat().st_mtime)
+
+# Funzione per unire alle partite in cache quelle nuove di un payload, confrontandole per URL.
+# Ritorna il payload unito e l'elenco delle sole partite nuove.
+def merge_month_games(cached_data, month_data):
+    cached_games = cached_data.get("games", []) if cached_data else []
+    known_urls = {game.get("url") for game in cached_games}
+    new_games = [game for game in month_data.get("games", []) if game.get("url") not in known_urls]
+    return {**month_data, "games": cached_games + new_games}, new_games
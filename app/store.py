@@ -0,0 +1,181 @@
+import numpy as np
+
+from app.storage import DATA_DIR, ensure_dir, get_user_month_path, load_month_data, write_atomic
+
+# Versione del formato dell'archivio a colonne: se cambia, i mesi vengono ricostruiti dal JSON
+STORE_VERSION = 2
+
+# Codifica dei risultati dal punto di vista dell'utente
+RESULT_WIN = 1
+RESULT_DRAW = 0
+RESULT_LOSS = -1
+RESULT_NAMES = {RESULT_WIN: "win", RESULT_DRAW: "draw", RESULT_LOSS: "loss"}
+
+# Colonne testuali a bassa cardinalità, salvate come codici interi + vocabolario
+CATEGORY_COLUMNS = ("opponent", "time_class", "time_control", "variant")
+
+# Funzione per ottenere la cartella dell'archivio a colonne di un utente
+def get_user_store_dir(username):
+    return ensure_dir(DATA_DIR / username.lower() / "store")
+
+# Funzione per ottenere i percorsi delle colonne (.npz) e del blob dei PGN (.pgn) di un mese
+def get_month_store_paths(username, year, month):
+    base = get_user_store_dir(username) / f"{year}_{str(month).zfill(2)}"
+    return base.with_suffix(".npz"), base.with_suffix(".pgn")
+
+# Funzione per codificare una lista di stringhe come codici interi + vocabolario
+def encode_categories(values):
+    names, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+    return codes.astype(np.int32), names
+
+# Funzione per estrarre le colonne (dal punto di vista dell'utente) da un payload mensile di Chess.com.
+# Ritorna le colonne e la lista dei PGN codificati in UTF-8.
+def month_columns(username, month_data):
+    games = month_data.get("games", []) if month_data else []
+    user = username.lower()
+    n = len(games)
+
+    # Estrae i campi grezzi in array (un solo accesso per campo), poi deriva tutto con operazioni vettoriali
+    whites = [game.get("white", {}) for game in games]
+    blacks = [game.get("black", {}) for game in games]
+    white_player = np.array([side.get("username", "unknown").lower() for side in whites], dtype=str)
+    black_player = np.array([side.get("username", "unknown").lower() for side in blacks], dtype=str)
+    white_rating = np.array([side.get("rating", 0) for side in whites], dtype=np.int32)
+    black_rating = np.array([side.get("rating", 0) for side in blacks], dtype=np.int32)
+    white_wins = np.array([side.get("result", "") == "win" for side in whites], dtype=bool)
+    black_wins = np.array([side.get("result", "") == "win" for side in blacks], dtype=bool)
+
+    # Determina se il giocatore richiesto era bianco o nero
+    is_white = white_player == user
+
+    # Risultato dal punto di vista dell'utente: vince chi ha "win", altrimenti patta
+    winner = np.where(white_wins, 1, np.where(black_wins, -1, 0)).astype(np.int8)
+    result = np.where(is_white, winner, -winner).astype(np.int8)
+
+    columns = {
+        "version": np.array(STORE_VERSION),
+        "end_time": np.array([game.get("end_time", 0) for game in games], dtype=np.int64),
+        "is_white": is_white,
+        "result": result,
+        "user_rating": np.where(is_white, white_rating, black_rating),
+        "opponent_rating": np.where(is_white, black_rating, white_rating),
+        "url": np.array([game.get("url", "") for game in games], dtype=bytes),
+    }
+    columns["opponent_codes"], columns["opponent_names"] = encode_categories(np.where(is_white, black_player, white_player))
+    columns["time_class_codes"], columns["time_class_names"] = encode_categories([game.get("time_class", "") for game in games])
+    columns["time_control_codes"], columns["time_control_names"] = encode_categories([game.get("time_control", "") for game in games])
+    columns["variant_codes"], columns["variant_names"] = encode_categories([game.get("rules", "") for game in games])
+
+    pgns = [game.get("pgn", "").encode("utf-8") for game in games]
+
+    # I PGN vanno in un blob separato, letto solo quando servono; le colonne tengono gli offset
+    pgn_offsets = np.zeros(n + 1, dtype=np.int64)
+    pgn_offsets[1:] = np.cumsum([len(pgn) for pgn in pgns])
+    columns["pgn_offsets"] = pgn_offsets
+    return columns, pgns
+
+# Funzione per ottenere la data di modifica del JSON da cui deriva l'archivio di un mese (0 se assente)
+def source_mtime_ns(username, year, month):
+    json_path = get_user_month_path(username, year, month)
+    return json_path.stat().st_mtime_ns if json_path.exists() else 0
+
+# Funzione per salvare le colonne di un mese, registrando la versione del JSON da cui derivano
+def _save_month_columns(username, year, month, columns):
+    columns["source_mtime_ns"] = np.array(source_mtime_ns(username, year, month), dtype=np.int64)
+    npz_path, _ = get_month_store_paths(username, year, month)
+    write_atomic(npz_path, lambda f: np.savez(f, **columns))
+    return columns
+
+# Funzione per leggere le colonne salvate di un mese (None se mancanti o di un'altra versione)
+def _read_month_columns(username, year, month):
+    npz_path, _ = get_month_store_paths(username, year, month)
+    if not npz_path.exists():
+        return None
+    with np.load(npz_path, allow_pickle=False) as data:
+        if int(data["version"]) != STORE_VERSION:
+            return None
+        return {name: data[name] for name in data.files}
+
+# Funzione per costruire (e salvare) l'archivio a colonne di un mese a partire dal payload di Chess.com
+def build_month_store(username, year, month, month_data):
+    columns, pgns = month_columns(username, month_data)
+    _, pgn_path = get_month_store_paths(username, year, month)
+    write_atomic(pgn_path, lambda f: f.write(b"".join(pgns)))
+    return _save_month_columns(username, year, month, columns)
+
+# Funzione per aggiungere nuove partite all'archivio di un mese senza riscriverlo da capo:
+# il blob dei PGN viene esteso in coda (gli offset già salvati restano validi).
+# Ritorna None se l'archivio esistente manca o non è coerente: in quel caso va ricostruito.
+def append_month_store(username, year, month, new_games):
+    existing = _read_month_columns(username, year, month)
+    _, pgn_path = get_month_store_paths(username, year, month)
+    if existing is None or not pgn_path.exists() or pgn_path.stat().st_size != existing["pgn_offsets"][-1]:
+        return None
+
+    added, pgns = month_columns(username, {"games": new_games})
+    with open(pgn_path, "ab") as f:
+        f.write(b"".join(pgns))
+
+    columns = {"version": np.array(STORE_VERSION)}
+    for name in ("end_time", "is_white", "result", "user_rating", "opponent_rating", "url"):
+        columns[name] = np.concatenate([existing[name], added[name]])
+    for name in CATEGORY_COLUMNS:
+        values = np.concatenate([
+            existing[f"{name}_names"][existing[f"{name}_codes"]],
+            added[f"{name}_names"][added[f"{name}_codes"]],
+        ])
+        columns[f"{name}_codes"], columns[f"{name}_names"] = encode_categories(values)
+    columns["pgn_offsets"] = np.concatenate([existing["pgn_offsets"], existing["pgn_offsets"][-1] + added["pgn_offsets"][1:]])
+    return _save_month_columns(username, year, month, columns)
+
+# Funzione per caricare le colonne di un mese.
+# Al primo accesso (o se il JSON è cambiato) l'archivio viene costruito dalla cache JSON esistente.
+def load_month_columns(username, year, month):
+    columns = _read_month_columns(username, year, month)
+    if columns is not None and int(columns["source_mtime_ns"]) == source_mtime_ns(username, year, month):
+        return columns
+
+    month_data = load_month_data(username, year, month)
+    if month_data is None:
+        return None
+    print(f"Costruito archivio a colonne per {username} {year}/{month}")
+    return build_month_store(username, year, month, month_data)
+
+# Funzione per unire le colonne di più mesi, ordinate per data decrescente.
+# segments è una lista di ((anno, mese), colonne); le colonne categoriche vengono decodificate.
+def concat_month_columns(segments):
+    parts = {name: [] for name in ("end_time", "is_white", "result", "user_rating", "opponent_rating", "url", "segment", "row", *CATEGORY_COLUMNS)}
+
+    for index, (_, columns) in enumerate(segments):
+        n = len(columns["end_time"])
+        for name in ("end_time", "is_white", "result", "user_rating", "opponent_rating", "url"):
+            parts[name].append(columns[name])
+        for name in CATEGORY_COLUMNS:
+            parts[name].append(columns[f"{name}_names"][columns[f"{name}_codes"]])
+        parts["segment"].append(np.full(n, index, dtype=np.int32))
+        parts["row"].append(np.arange(n, dtype=np.int32))
+
+    merged = {}
+    for name, arrays in parts.items():
+        merged[name] = np.concatenate(arrays) if arrays else np.array([])
+    if not segments:
+        merged["end_time"] = merged["end_time"].astype(np.int64)
+
+    # Ordina le partite per data decrescente (dal più recente al meno recente)
+    order = np.argsort(-merged["end_time"], kind="stable")
+    return {name: values[order] for name, values in merged.items()}
+
+# Funzione per leggere (in modo pigro) i PGN indicati da (segmento, riga) dai blob dei mesi
+def read_pgns(username, segments, segment_idx, rows):
+    pgns = [""] * len(rows)
+    for index in np.unique(segment_idx):
+        (year, month), columns = segments[index]
+        _, pgn_path = get_month_store_paths(username, year, month)
+        if not pgn_path.exists():
+            continue
+        blob = pgn_path.read_bytes()
+        offsets = columns["pgn_offsets"]
+        for position in np.flatnonzero(segment_idx == index):
+            row = rows[position]
+            pgns[position] = blob[offsets[row]:offsets[row + 1]].decode("utf-8")
+    return pgns
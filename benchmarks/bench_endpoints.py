@@ -0,0 +1,307 @@
+# Benchmark end-to-end degli endpoint principali contro il server finto di Chess.com.
+#
+# Per ogni dimensione (partite totali dell'utente, ad es. 1k, 10k, 100k, 500k) avvia l'app in un
+# processo separato, con una cartella di lavoro vuota, e misura /api/check-username,
+# /api/download-games e /api/heatmap-data in tre stati:
+#   - cold: cache su disco vuota, primo avvio (tutti i mesi vengono scaricati);
+#   - disk: nuovo processo con la cache su disco già popolata (nessun dato in memoria);
+#   - warm: stesso processo, richieste ripetute (cache in memoria e su disco).
+# Per ogni misura registra latenza (mediana, p95, massimo), byte della risposta, partite al secondo,
+# richieste al secondo e picco di memoria (VmHWM) del processo dell'app.
+#
+# I risultati vengono salvati in JSON (di default in benchmarks/results/, esclusa da git, un file per revisione)
+# e possono essere confrontati con un'esecuzione precedente con --compare.
+#
+# Uso (dalla radice del repository):
+#     python -m benchmarks.bench_endpoints --sizes 1000 10000 100000
+#     python -m benchmarks.bench_endpoints --sizes 500000 --repeats 3 --compare benchmarks/results/<file>.json
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from benchmarks.bench_scheduler import free_port, start_mock_server
+
+# Radice del repository (contiene app/, static/ e templates/)
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Cartella di default dei risultati
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+# Endpoint misurati, nell'ordine in cui li chiama l'interfaccia
+ENDPOINTS = ("check-username", "download-games", "heatmap-data")
+
+# Timeout (in secondi) per ogni richiesta all'app: i caricamenti a freddo più grandi sono lenti
+REQUEST_TIMEOUT = 600
+
+# Funzione per ottenere la revisione git corrente (None se non disponibile)
+def git_revision():
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+        return f"{revision}-dirty" if dirty else revision
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Funzione per leggere il picco di memoria residente (in MB) di un processo (solo Linux, altrimenti None)
+def peak_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+# Funzione per preparare la cartella di lavoro dell'app: cache vuota, static e template del repository
+def make_workdir(root):
+    workdir = Path(root)
+    workdir.mkdir(parents=True, exist_ok=True)
+    for name in ("static", "templates"):
+        target = workdir / name
+        if not target.exists():
+            target.symlink_to(REPO_ROOT / name, target_is_directory=True)
+    return workdir
+
+# Funzione per avviare l'app in un processo uvicorn separato e attendere che risponda
+def start_app(workdir, port, api_base, rate_limit):
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(REPO_ROOT) + os.pathsep + os.environ.get("PYTHONPATH", ""),
+        "CHESS_STAT_API_BASE": api_base,
+        "CHESS_STAT_RATE_LIMIT": str(rate_limit),
+        "CHESS_STAT_RATE_BURST": str(rate_limit),
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"L'app non si è avviata: {process.stderr.read().decode('utf-8', 'replace')}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("L'app non ha risposto entro 60 secondi")
+
+# Funzione per fermare il processo dell'app, restituendo il suo picco di memoria
+def stop_app(process):
+    peak = peak_rss_mb(process.pid)
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    return peak
+
+# Funzione per eseguire una richiesta a un endpoint; ritorna (secondi, byte, corpo JSON)
+async def call_endpoint(client, endpoint, username, months):
+    started = time.perf_counter()
+    if endpoint == "check-username":
+        response = await client.get(f"/api/check-username/{username}")
+    elif endpoint == "download-games":
+        response = await client.post("/api/download-games", data={"username": username, "selected_months": json.dumps(months)})
+    else:
+        response = await client.post("/api/heatmap-data", data={
+            "username": username, "selected_months": json.dumps(months), "timezone": "Europe/Rome"
+        })
+    body = response.content
+    elapsed = time.perf_counter() - started
+    response.raise_for_status()
+    return elapsed, len(body), json.loads(body)
+
+# Funzione per riassumere una serie di latenze (in millisecondi)
+def latency_stats(samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "median_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(p95 * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+# Funzione per misurare i tre endpoint in uno stato della cache: `repeats` giri in sequenza
+async def measure_state(port, username, state, repeats, months=None):
+    results = []
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=REQUEST_TIMEOUT) as client:
+        samples = {endpoint: [] for endpoint in ENDPOINTS}
+        sizes = {}
+        total_games = 0
+        started = time.perf_counter()
+        for _ in range(repeats):
+            for endpoint in ENDPOINTS:
+                elapsed, size, body = await call_endpoint(client, endpoint, username, months)
+                samples[endpoint].append(elapsed)
+                sizes[endpoint] = size
+                if endpoint == "check-username" and months is None:
+                    months = [url for url, _ in body["months"]]
+                if endpoint == "download-games":
+                    total_games = body["summary"]["total_games"]
+        wall = time.perf_counter() - started
+
+    for endpoint in ENDPOINTS:
+        stats = latency_stats(samples[endpoint])
+        results.append({
+            "state": state,
+            "endpoint": endpoint,
+            "requests": len(samples[endpoint]),
+            **stats,
+            "response_bytes": sizes[endpoint],
+            "games_per_second": round(total_games / statistics.median(samples[endpoint])) if endpoint != "check-username" else None,
+        })
+    return results, months, total_games, round(len(ENDPOINTS) * repeats / wall, 2)
+
+# Funzione per eseguire il benchmark di una dimensione (partite totali dell'utente)
+def bench_size(games, args, api_base, workroot):
+    username = f"benchgames{games}"
+    workdir = make_workdir(Path(workroot) / f"games{games}")
+    rows = []
+    memory = {}
+    throughput = {}
+
+    # cold: cache vuota e processo nuovo (un solo giro: dal secondo la cache non è più fredda)
+    port = free_port()
+    process = start_app(workdir, port, api_base, args.rate_limit)
+    try:
+        cold, months, total_games, throughput["cold"] = asyncio.run(measure_state(port, username, "cold", 1))
+        rows += cold
+        # warm: stesso processo, cache in memoria e su disco
+        warm, _, _, throughput["warm"] = asyncio.run(measure_state(port, username, "warm", args.repeats, months))
+        rows += warm
+    finally:
+        memory["cold+warm"] = stop_app(process)
+
+    # disk: nuovo processo, cache su disco già popolata (un giro per processo, ripetuto)
+    disk_rows = []
+    peaks = []
+    for _ in range(args.repeats):
+        port = free_port()
+        process = start_app(workdir, port, api_base, args.rate_limit)
+        try:
+            disk, _, _, throughput["disk"] = asyncio.run(measure_state(port, username, "disk", 1, months))
+            disk_rows.append(disk)
+        finally:
+            peaks.append(stop_app(process))
+    for index, endpoint in enumerate(ENDPOINTS):
+        runs = [run[index] for run in disk_rows]
+        rows.append({
+            **runs[0],
+            "requests": len(runs),
+            "median_ms": round(statistics.median(run["median_ms"] for run in runs), 2),
+            "p95_ms": max(run["p95_ms"] for run in runs),
+            "max_ms": max(run["max_ms"] for run in runs),
+            "games_per_second": round(statistics.median(run["games_per_second"] for run in runs)) if runs[0]["games_per_second"] else None,
+        })
+    memory["disk"] = max((peak for peak in peaks if peak is not None), default=None)
+
+    for row in rows:
+        row.update({"games": games, "total_games": total_games, "months": len(months)})
+    return {"games": games, "total_games": total_games, "months": len(months), "peak_rss_mb": memory,
+            "requests_per_second": throughput, "results": rows}
+
+# Funzione per confrontare i risultati con un'esecuzione precedente (variazione della latenza mediana)
+def compare(current, previous):
+    baseline = {
+        (row["games"], row["state"], row["endpoint"]): row
+        for size in previous["sizes"] for row in size["results"]
+    }
+    print(f"\nConfronto con {previous.get('revision') or 'esecuzione precedente'} (latenza mediana):")
+    for size in current["sizes"]:
+        for row in size["results"]:
+            old = baseline.get((row["games"], row["state"], row["endpoint"]))
+            if old is None:
+                continue
+            change = (row["median_ms"] - old["median_ms"]) / old["median_ms"] * 100 if old["median_ms"] else 0.0
+            print(
+                f"  {row['games']:>7} {row['state']:<5} {row['endpoint']:<15}"
+                f" {old['median_ms']:>10.1f} ms -> {row['median_ms']:>10.1f} ms ({change:+.1f}%)"
+            )
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end degli endpoint con dati sintetici")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="partite totali per utente")
+    parser.add_argument("--months", type=int, default=24, help="mesi di archivio per utente")
+    parser.add_argument("--repeats", type=int, default=5, help="ripetizioni per gli stati warm e disk")
+    parser.add_argument("--with-pgn", action="store_true", help="includi i PGN nelle partite sintetiche")
+    parser.add_argument("--latency-ms", type=int, default=0, help="latenza aggiunta dal server finto")
+    parser.add_argument("--rate-limit", type=float, default=1000, help="richieste al secondo concesse allo scheduler dell'app")
+    parser.add_argument("--output", help="file JSON dei risultati (default: benchmarks/results/bench_endpoints-<revisione>.json)")
+    parser.add_argument("--compare", help="file JSON di un'esecuzione precedente da confrontare")
+    parser.add_argument("--keep-data", action="store_true", help="non cancellare le cartelle di lavoro dell'app")
+    args = parser.parse_args()
+
+    # I mesi sono generati una volta sola dal server finto e poi riusati (anche tra una dimensione e l'altra)
+    port = free_port()
+    server, mock = start_mock_server(port, months=args.months, games_per_month=0, latency_ms=args.latency_ms, with_pgn=args.with_pgn)
+    api_base = f"http://127.0.0.1:{port}/pub"
+    workroot = tempfile.mkdtemp(prefix="chess-stat-bench-")
+
+    revision = git_revision()
+    report = {
+        "benchmark": "bench_endpoints",
+        "revision": revision,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "months": args.months, "repeats": args.repeats, "with_pgn": args.with_pgn,
+            "latency_ms": args.latency_ms, "rate_limit": args.rate_limit,
+        },
+        "sizes": [],
+    }
+    try:
+        for games in args.sizes:
+            # Genera in anticipo i mesi dell'utente, così la misura a freddo non include la generazione
+            username = f"benchgames{games}"
+            archives = httpx.get(f"{api_base}/player/{username}/games/archives").json()["archives"]
+            for url in archives:
+                httpx.get(url, timeout=REQUEST_TIMEOUT)
+
+            print(f"Benchmark con {games} partite in {args.months} mesi...")
+            size = bench_size(games, args, api_base, workroot)
+            report["sizes"].append(size)
+            for row in size["results"]:
+                print(
+                    f"  {row['state']:<5} {row['endpoint']:<15} mediana {row['median_ms']:>9.1f} ms"
+                    f"  p95 {row['p95_ms']:>9.1f} ms  {row['response_bytes']:>10} byte"
+                    + (f"  {row['games_per_second']} partite/s" if row["games_per_second"] else "")
+                )
+            print(f"  picco di memoria dell'app (MB): {size['peak_rss_mb']}")
+    finally:
+        server.should_exit = True
+        if not args.keep_data:
+            shutil.rmtree(workroot, ignore_errors=True)
+        else:
+            print(f"Cartelle di lavoro mantenute in {workroot}")
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"bench_endpoints-{revision or 'unknown'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Risultati salvati in {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
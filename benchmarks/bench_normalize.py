@@ -0,0 +1,181 @@
+# Benchmark della normalizzazione delle partite e del calcolo del sommario.
+#
+# Confronta il vecchio ciclo per partita (dict per partita + sei maschere booleane sul DataFrame)
+# con la pipeline dell'app (colonne NumPy -> aggregato del mese -> sommario, più il DataFrame delle partite).
+# "vettoriale" include l'estrazione delle colonne dal JSON (fatta una volta, alla costruzione
+# dell'archivio); "da colonne" è il costo di ogni richiesta con l'archivio già costruito.
+#
+# Uso (dalla radice del repository):
+#     python -m benchmarks.bench_normalize --games 100000 250000
+import argparse
+import random
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from app.aggregates import combine_aggregates, month_aggregate
+from app.stats import games_frame
+from app.store import concat_month_columns, month_columns
+
+USERNAME = "benchuser"
+
+# Aperture usate nei PGN sintetici: (ECO, slug dell'URL di Chess.com, prime mosse)
+OPENINGS = [
+    ("B01", "Scandinavian-Defense", ["e4", "d5", "exd5", "Qxd5"]),
+    ("C50", "Italian-Game", ["e4", "e5", "Nf3", "Nc6", "Bc4"]),
+    ("B20", "Sicilian-Defense", ["e4", "c5", "Nf3", "d6"]),
+    ("D02", "Queens-Pawn-Opening-London-System", ["d4", "d5", "Nf3", "Nf6", "Bf4"]),
+    ("A00", "Van-Geet-Opening", ["Nc3", "e5"]),
+]
+FILLER_MOVES = ["Nf3", "Nc6", "Be2", "Be7", "O-O", "O-O", "h3", "a6", "Re1", "Rb8", "Qd2", "b5"]
+
+# Funzione per generare un PGN sintetico in stile Chess.com, con [%clk] dopo ogni semimossa
+def synthetic_pgn(rng, white, black, result, time_control):
+    eco, slug, opening_moves = rng.choice(OPENINGS)
+    n_plies = rng.randrange(20, 120)
+    base = float(time_control.split("/")[-1].split("+")[0])
+    clocks = [base, base]
+    movetext = []
+    for ply in range(n_plies):
+        move = opening_moves[ply] if ply < len(opening_moves) else rng.choice(FILLER_MOVES)
+        clocks[ply % 2] = max(0.1, clocks[ply % 2] - rng.uniform(0, base / 40))
+        hours, rest = divmod(clocks[ply % 2], 3600)
+        minutes, seconds = divmod(rest, 60)
+        prefix = f"{ply // 2 + 1}. " if ply % 2 == 0 else f"{ply // 2 + 1}... "
+        movetext.append(f"{prefix}{move} {{[%clk {int(hours)}:{int(minutes):02d}:{seconds:04.1f}]}}")
+    headers = [
+        '[Event "Live Chess"]', '[Site "Chess.com"]', f'[White "{white}"]', f'[Black "{black}"]',
+        f'[Result "{result}"]', f'[ECO "{eco}"]', f'[ECOUrl "https://www.chess.com/openings/{slug}"]',
+        f'[TimeControl "{time_control}"]',
+    ]
+    return "\n".join(headers) + "\n\n" + " ".join(movetext) + f" {result}\n"
+
+# Funzione per generare un payload mensile sintetico nel formato di Chess.com
+def synthetic_month(n_games, seed=0, username=USERNAME, start=1_600_000_000, step=97, with_pgn=False):
+    rng = random.Random(seed)
+    games = []
+    for i in range(n_games):
+        user_is_white = rng.random() < 0.5
+        opponent = f"opponent{rng.randrange(5000)}"
+        outcome = rng.choice(("white", "black", "draw"))
+        white_result = "win" if outcome == "white" else ("agreed" if outcome == "draw" else "resigned")
+        black_result = "win" if outcome == "black" else ("agreed" if outcome == "draw" else "checkmated")
+        games.append({
+            "url": f"https://www.chess.com/game/live/{10_000_000 + seed * 1_000_000 + i}",
+            "pgn": "",
+            "time_control": rng.choice(("60", "180+2", "600", "1/86400")),
+            "end_time": start + i * step,
+            "rated": True,
+            "time_class": rng.choice(("bullet", "blitz", "rapid", "daily")),
+            "rules": "chess",
+            "white": {
+                "rating": rng.randrange(800, 2400),
+                "result": white_result,
+                "username": username if user_is_white else opponent,
+            },
+            "black": {
+                "rating": rng.randrange(800, 2400),
+                "result": black_result,
+                "username": opponent if user_is_white else username,
+            },
+        })
+    if with_pgn:
+        results = {"white": "1-0", "black": "0-1", "draw": "1/2-1/2"}
+        for game in games:
+            outcome = "white" if game["white"]["result"] == "win" else ("black" if game["black"]["result"] == "win" else "draw")
+            game["pgn"] = synthetic_pgn(rng, game["white"]["username"], game["black"]["username"], results[outcome], game["time_control"])
+    return {"games": games}
+
+# Vecchia implementazione (prima della pipeline vettoriale), mantenuta come riferimento
+def legacy_normalize_and_summarize(all_games, username):
+    processed_games = []
+    for game in all_games:
+        white_player = game.get("white", {}).get("username", "unknown").lower()
+        black_player = game.get("black", {}).get("username", "unknown").lower()
+        is_white = (username.lower() == white_player)
+        white_rating = game.get("white", {}).get("rating", 0)
+        black_rating = game.get("black", {}).get("rating", 0)
+        if game.get("white", {}).get("result", "") == "win":
+            result = "win" if is_white else "loss"
+        elif game.get("black", {}).get("result", "") == "win":
+            result = "win" if not is_white else "loss"
+        else:
+            result = "draw"
+        date_played = datetime.fromtimestamp(game.get("end_time", 0))
+        processed_games.append({
+            "date": date_played.strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": game.get("end_time", 0),
+            "user_color": "white" if is_white else "black",
+            "opponent": black_player if is_white else white_player,
+            "result": result,
+            "time_control": game.get("time_control", ""),
+            "time_class": game.get("time_class", ""),
+            "variant": game.get("rules", ""),
+            "user_rating": white_rating if is_white else black_rating,
+            "opponent_rating": black_rating if is_white else white_rating,
+            "pgn": game.get("pgn", ""),
+            "url": game.get("url", "")
+        })
+    processed_games.sort(key=lambda x: x["timestamp"], reverse=True)
+    df = pd.DataFrame(processed_games)
+    summary = {
+        "total_games": len(df),
+        "wins": len(df[df["result"] == "win"]),
+        "losses": len(df[df["result"] == "loss"]),
+        "draws": len(df[df["result"] == "draw"]),
+        "as_white": len(df[df["user_color"] == "white"]),
+        "as_black": len(df[df["user_color"] == "black"]),
+    }
+    return df, summary
+
+# Nuova pipeline: colonne del mese -> DataFrame vettoriale e sommario dall'aggregato del mese
+def vectorized_normalize_and_summarize(month_data, username):
+    columns, _ = month_columns(username, month_data)
+    return frame_and_summarize(columns, username)
+
+# Percorso di una richiesta con l'archivio a colonne già costruito, come in /api/download-games:
+# DataFrame delle partite + sommario dagli aggregati mensili
+def frame_and_summarize(columns, username):
+    segments = [(("2020", "01"), columns)]
+    loaded = {"username": username, "segments": segments, "columns": concat_month_columns(segments)}
+    df = games_frame(loaded, include_pgn=False)
+    return df, combine_aggregates([month_aggregate(columns)])["summary"]
+
+# Funzione per misurare il tempo migliore su più ripetizioni
+def best_of(repeats, func, *args):
+    best = None
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark normalizzazione + sommario")
+    parser.add_argument("--games", type=int, nargs="+", default=[100_000, 250_000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'partite':>10} {'legacy (s)':>12} {'vettoriale (s)':>15} {'speedup':>8} {'da colonne (s)':>15} {'speedup':>8}")
+    for n_games in args.games:
+        month_data = synthetic_month(n_games)
+        legacy_time, (legacy_df, legacy_summary) = best_of(args.repeats, legacy_normalize_and_summarize, month_data["games"], USERNAME)
+        vector_time, (vector_df, vector_summary) = best_of(args.repeats, vectorized_normalize_and_summarize, month_data, USERNAME)
+        columns, _ = month_columns(USERNAME, month_data)
+        stored_time, _ = best_of(args.repeats, frame_and_summarize, columns, USERNAME)
+
+        # Le due pipeline devono produrre gli stessi risultati
+        assert legacy_summary == vector_summary, (legacy_summary, vector_summary)
+        compared = ["date", "timestamp", "user_color", "opponent", "result", "user_rating", "opponent_rating", "url"]
+        assert (legacy_df[compared].astype(str).values == vector_df[compared].astype(str).values).all()
+
+        print(
+            f"{n_games:>10} {legacy_time:>12.3f} {vector_time:>15.3f} {legacy_time / vector_time:>7.1f}x"
+            f" {stored_time:>15.3f} {legacy_time / stored_time:>7.1f}x"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Benchmark dell'analisi dei PGN (aperture ECO, lunghezza in semimosse, orologi [%clk]).
+#
+# Confronta l'analisi in un solo processo con quella a blocchi nel pool di processi e
+# verifica che diano gli stessi risultati; poi calcola le statistiche delle mosse.
+#
+# Uso (dalla radice del repository):
+#     python -m benchmarks.bench_pgn --games 50000
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.pgn import move_stats, parse_pgn_batch, parse_pgns, shutdown_pgn_pool
+from app.store import concat_month_columns, month_columns
+from benchmarks.bench_normalize import USERNAME, synthetic_month
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark analisi PGN")
+    parser.add_argument("--games", type=int, nargs="+", default=[50_000])
+    args = parser.parse_args()
+
+    print(f"{'partite':>10} {'1 processo (s)':>15} {'pool (s)':>10} {'speedup':>8} {'statistiche (s)':>16}")
+    for n_games in args.games:
+        month_data = synthetic_month(n_games, with_pgn=True)
+        pgns = [game["pgn"] for game in month_data["games"]]
+
+        start = time.perf_counter()
+        single = parse_pgn_batch(pgns)
+        single_time = time.perf_counter() - start
+
+        # Il pool viene avviato prima della misura, come in un server già in esecuzione
+        asyncio.run(parse_pgns(pgns[:10_000]))
+        start = time.perf_counter()
+        pooled = asyncio.run(parse_pgns(pgns))
+        pool_time = time.perf_counter() - start
+
+        assert single[0] == pooled[0] and single[1] == pooled[1]
+        assert all(np.array_equal(a, b) for a, b in zip(single[2:], pooled[2:]))
+
+        columns, _ = month_columns(USERNAME, month_data)
+        merged = concat_month_columns([(("2020", "01"), columns)])
+        order = merged["row"]
+        clock_offsets = np.concatenate([[0], np.cumsum(single[3], dtype=np.int64)])
+        moves = {
+            "eco": np.array(single[0], dtype=object)[order],
+            "opening": np.array(single[1], dtype=object)[order],
+            "plies": single[2][order],
+            "clock_starts": clock_offsets[:-1][order],
+            "clock_ends": clock_offsets[1:][order],
+            "clocks": single[4],
+        }
+        start = time.perf_counter()
+        stats = move_stats(merged, moves)
+        stats_time = time.perf_counter() - start
+
+        print(f"{n_games:>10} {single_time:>15.3f} {pool_time:>10.3f} {single_time / pool_time:>7.1f}x {stats_time:>16.3f}")
+        print(f"  aperture più giocate: {[(o['eco'], o['games']) for o in stats['openings'][:3]]}")
+        print(f"  semimosse medie: {stats['average_plies']['all']}")
+    shutdown_pgn_pool()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Benchmark dello scheduler delle richieste verso Chess.com contro il server finto locale.
+#
+# Avvia benchmarks.mock_chess_api (con un limite di richieste al secondo), accoda un import
+# massivo di mesi a priorità bassa e, mentre è in corso, alcune verifiche utente interattive.
+# Mostra la latenza delle richieste interattive, la durata dell'import, le risposte 429 ricevute
+# e le metriche dello scheduler (profondità della coda, tempi di attesa, rate corrente).
+#
+# Uso (dalla radice del repository):
+#     python -m benchmarks.bench_scheduler --months 60 --lookups 10 --server-rate 10
+import argparse
+import asyncio
+import socket
+import statistics
+import threading
+import time
+
+import uvicorn
+
+from benchmarks.mock_chess_api import create_app, recent_months
+
+# Funzione per trovare una porta libera in locale
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+# Funzione per avviare il server finto in un thread; ritorna (server uvicorn, app)
+def start_mock_server(port, **options):
+    mock = create_app(**options)
+    server = uvicorn.Server(uvicorn.Config(mock, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, mock
+
+async def run(args, base_url):
+    from app import chess_api
+    from app.scheduler import PRIORITY_BACKFILL, scheduler_metrics
+
+    await chess_api.start_client()
+    month_urls = [f"{base_url}/player/backfill/games/{year}/{month:02d}" for year, month in recent_months(args.months)]
+
+    async def backfill():
+        start = time.perf_counter()
+        await asyncio.gather(*[chess_api.fetch_month(url, priority=PRIORITY_BACKFILL) for url in month_urls])
+        return time.perf_counter() - start
+
+    async def lookup(i):
+        await asyncio.sleep(0.2 + i * 0.1)
+        start = time.perf_counter()
+        await chess_api.api_get(f"{base_url}/player/lookup{i}")
+        return time.perf_counter() - start
+
+    backfill_time, *lookup_times = await asyncio.gather(backfill(), *[lookup(i) for i in range(args.lookups)])
+    metrics = scheduler_metrics()
+    await chess_api.close_client()
+    return backfill_time, lookup_times, metrics
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scheduler richieste Chess.com")
+    parser.add_argument("--months", type=int, default=60, help="mesi scaricati dall'import massivo")
+    parser.add_argument("--lookups", type=int, default=10, help="verifiche utente interattive")
+    parser.add_argument("--games", type=int, default=200, help="partite per mese")
+    parser.add_argument("--server-rate", type=int, default=10, help="richieste al secondo accettate dal server finto")
+    parser.add_argument("--latency-ms", type=int, default=20)
+    args = parser.parse_args()
+
+    port = free_port()
+    server, mock = start_mock_server(
+        port, months=args.months, games_per_month=args.games,
+        rate_limit=args.server_rate, latency_ms=args.latency_ms
+    )
+    base_url = f"http://127.0.0.1:{port}/pub"
+    try:
+        backfill_time, lookup_times, metrics = asyncio.run(run(args, base_url))
+    finally:
+        server.should_exit = True
+
+    print(f"import massivo: {args.months} mesi in {backfill_time:.2f}s")
+    print(
+        f"richieste interattive: mediana {statistics.median(lookup_times) * 1000:.0f} ms,"
+        f" massimo {max(lookup_times) * 1000:.0f} ms"
+    )
+    print(f"server finto: {mock.state.counters}")
+    print("metriche scheduler:")
+    for name, value in metrics.items():
+        print(f"  {name}: {round(value, 4) if isinstance(value, float) else value}")
+
+if __name__ == "__main__":
+    main()
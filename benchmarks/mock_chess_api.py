@@ -0,0 +1,121 @@
+# Server locale che imita le API pubbliche di Chess.com (profilo, statistiche, archivi, mesi),
+# per provare il client (scheduler, cache, richieste condizionali) senza toccare il servizio reale.
+#
+# Ogni utente ha MOCK_MONTHS mesi da MOCK_GAMES_PER_MONTH partite sintetiche; gli utenti il cui nome
+# finisce con "games<N>" (ad es. "benchgames100000") hanno invece N partite in totale, divise tra i mesi.
+# Oltre MOCK_RATE_LIMIT richieste al secondo il server risponde 429 con Retry-After, come fa Chess.com
+# sotto carico; MOCK_LATENCY_MS aggiunge una latenza fissa a ogni risposta e MOCK_WITH_PGN=1 aggiunge
+# i PGN alle partite.
+# Per i test dello scheduler, create_app accetta anche fail_first: le prime N richieste ricevono
+# fail_status (429 o 403) con l'header Retry-After indicato (nessun header se None).
+#
+# Uso (dalla radice del repository):
+#     uvicorn benchmarks.mock_chess_api:app --port 8001
+#     CHESS_STAT_API_BASE=http://127.0.0.1:8001/pub uv run -m uvicorn app.main:app --port 8000
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from benchmarks.bench_normalize import synthetic_month
+
+# Funzione per calcolare gli (anno, mese) degli ultimi n mesi, dal più vecchio al più recente
+def recent_months(n_months, now=None):
+    now = now or datetime.now(timezone.utc)
+    months = []
+    year, month = now.year, now.month
+    for _ in range(n_months):
+        months.append((year, month))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return months[::-1]
+
+# Nomi utente con un numero di partite esplicito, ad es. "benchgames100000"
+USER_GAMES_RE = re.compile(r"games(\d+)$")
+
+# Funzione per creare l'app del server finto con i parametri indicati
+def create_app(months=12, games_per_month=500, rate_limit=None, latency_ms=0, with_pgn=False,
+               fail_first=0, fail_status=429, retry_after="1"):
+    mock = FastAPI(title="Mock Chess.com API")
+    recent_requests = deque()
+    counters = {"requests": 0, "throttled": 0, "not_modified": 0}
+    mock.state.counters = counters
+    # Percorsi richiesti, nell'ordine di arrivo
+    mock.state.paths = []
+
+    # Payload (JSON già serializzato + ETag) di un mese: generato una volta e poi riusato
+    @lru_cache(maxsize=256)
+    def month_payload(username, year, month):
+        n_games = games_per_month
+        match = USER_GAMES_RE.search(username)
+        if match:
+            n_games = -(-int(match.group(1)) // months)
+        start = int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp())
+        step = max(1, (28 * 86400) // max(n_games, 1))
+        seed = year * 12 + month
+        body = json.dumps(synthetic_month(n_games, seed=seed, username=username, start=start, step=step, with_pgn=with_pgn))
+        return body, f'"{hashlib.sha1(body.encode("utf-8")).hexdigest()}"'
+
+    # Simulazione del limite di richieste (finestra scorrevole di un secondo) e della latenza
+    @mock.middleware("http")
+    async def throttle(request: Request, call_next):
+        counters["requests"] += 1
+        mock.state.paths.append(request.url.path)
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        if counters["requests"] <= fail_first:
+            counters["throttled"] += 1
+            headers = {"Retry-After": retry_after} if retry_after is not None else {}
+            return JSONResponse({"code": 0, "message": "Too many requests"}, status_code=fail_status, headers=headers)
+        if rate_limit:
+            now = time.monotonic()
+            while recent_requests and recent_requests[0] <= now - 1:
+                recent_requests.popleft()
+            if len(recent_requests) >= rate_limit:
+                counters["throttled"] += 1
+                return JSONResponse({"code": 0, "message": "Too many requests"}, status_code=429, headers={"Retry-After": "1"})
+            recent_requests.append(now)
+        return await call_next(request)
+
+    @mock.get("/pub/player/{username}")
+    async def player(username: str):
+        if username.lower().startswith("missing"):
+            return JSONResponse({"code": 0, "message": "User not found"}, status_code=404)
+        return {"username": username.lower(), "player_id": 1, "status": "basic", "joined": 1_500_000_000}
+
+    @mock.get("/pub/player/{username}/stats")
+    async def stats(username: str):
+        return {"chess_rapid": {"last": {"rating": 1500}}, "chess_blitz": {"last": {"rating": 1400}}}
+
+    @mock.get("/pub/player/{username}/games/archives")
+    async def archives(request: Request, username: str):
+        base = str(request.base_url).rstrip("/")
+        return {"archives": [
+            f"{base}/pub/player/{username.lower()}/games/{year}/{month:02d}"
+            for year, month in recent_months(months)
+        ]}
+
+    @mock.get("/pub/player/{username}/games/{year}/{month}")
+    async def month_games(request: Request, username: str, year: int, month: int):
+        body, etag = month_payload(username.lower(), year, month)
+        if request.headers.get("if-none-match") == etag:
+            counters["not_modified"] += 1
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, media_type="application/json", headers={"ETag": etag})
+
+    return mock
+
+app = create_app(
+    months=int(os.environ.get("MOCK_MONTHS", "12")),
+    games_per_month=int(os.environ.get("MOCK_GAMES_PER_MONTH", "500")),
+    rate_limit=int(os.environ.get("MOCK_RATE_LIMIT", "0")) or None,
+    latency_ms=int(os.environ.get("MOCK_LATENCY_MS", "0")),
+    with_pgn=os.environ.get("MOCK_WITH_PGN", "0") == "1",
+)
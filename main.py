@@ -1,5 +1,105 @@
+import argparse
+import asyncio
+import os
+from pathlib import Path
+
+from app.ingest import CHECKPOINT_PATH, ingest, parse_month_arg
+
+
+# Funzione per leggere gli username da riga di comando e/o da file (uno per riga, # per i commenti)
+def read_usernames(usernames, users_file):
+    names = list(usernames)
+    if users_file:
+        with open(users_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                name = line.split("#", 1)[0].strip()
+                if name:
+                    names.append(name)
+    # Rimuove i duplicati mantenendo l'ordine (Chess.com non distingue maiuscole e minuscole)
+    unique = {}
+    for name in names:
+        unique.setdefault(name.lower(), name)
+    return list(unique.values())
+
+
+# Funzione per avviare l'app in produzione con più worker uvicorn.
+# I worker si coordinano attraverso la cache condivisa (app/shared_cache.py): un solo worker alla volta
+# scarica un mese o un profilo, gli altri riusano il risultato. Il limite di richieste verso Chess.com
+# vale per processo, quindi viene diviso tra i worker per rispettare lo stesso limite complessivo.
+def serve(host, port, workers, cache_backend=None, cache_db=None):
+    import uvicorn
+
+    if cache_backend:
+        os.environ["CHESS_STAT_CACHE_BACKEND"] = cache_backend
+    if cache_db:
+        os.environ["CHESS_STAT_CACHE_DB"] = cache_db
+    # Il burst resta almeno 1, altrimenti nessuna richiesta potrebbe mai partire
+    for name, minimum in (("CHESS_STAT_RATE_LIMIT", 0.5), ("CHESS_STAT_RATE_BURST", 1.0)):
+        total = float(os.environ.get(name, "8"))
+        os.environ[name] = str(max(total / workers, minimum))
+
+    print(f"Avvio di {workers} worker su {host}:{port} (cache condivisa: {os.environ.get('CHESS_STAT_CACHE_BACKEND', 'sqlite')})")
+    uvicorn.run("app.main:app", host=host, port=port, workers=workers)
+
+
 def main():
-    print("Hello from chessdotcom-stat!")
+    parser = argparse.ArgumentParser(description="Chess.com Stats Downloader")
+    subparsers = parser.add_subparsers(dest="command")
+
+    # Import massivo nella cache (ad es. la rosa di un club prima di un evento)
+    ingest_parser = subparsers.add_parser("ingest", help="scarica in cache le partite di più utenti")
+    ingest_parser.add_argument("usernames", nargs="*", help="username Chess.com")
+    ingest_parser.add_argument("--users-file", help="file con un username per riga")
+    ingest_parser.add_argument("--months", nargs="+", help="mesi da scaricare, ad es. 2024-01 2024-02 (default: tutti)")
+    ingest_parser.add_argument("--since", help="primo mese da scaricare, ad es. 2023-09")
+    ingest_parser.add_argument("--until", help="ultimo mese da scaricare, ad es. 2024-06")
+    ingest_parser.add_argument("--concurrency", type=int, default=8, help="mesi scaricati contemporaneamente")
+    ingest_parser.add_argument("--workers", type=int, default=None, help="processi per la decodifica (default: numero di CPU)")
+    ingest_parser.add_argument("--checkpoint", default=str(CHECKPOINT_PATH), help="file di checkpoint per riprendere l'import")
+    ingest_parser.add_argument("--restart", action="store_true", help="ignora il checkpoint e ricomincia da capo")
+
+    # Avvio in produzione con più worker e cache condivisa (senza --reload)
+    serve_parser = subparsers.add_parser("serve", help="avvia l'app con più worker e cache condivisa")
+    serve_parser.add_argument("--host", default="0.0.0.0", help="indirizzo di ascolto")
+    serve_parser.add_argument("--port", type=int, default=8000, help="porta di ascolto")
+    serve_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="numero di worker (default: numero di CPU)")
+    serve_parser.add_argument("--cache-backend", help="backend della cache condivisa: sqlite (default) o modulo Python")
+    serve_parser.add_argument("--cache-db", help="file SQLite della cache condivisa")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        if args.workers < 1:
+            parser.error("--workers deve essere almeno 1")
+        serve(args.host, args.port, args.workers, args.cache_backend, args.cache_db)
+    elif args.command == "ingest":
+        usernames = read_usernames(args.usernames, args.users_file)
+        if not usernames:
+            parser.error("indicare almeno un username o --users-file")
+        try:
+            months = {parse_month_arg(value) for value in args.months} if args.months else None
+            since = parse_month_arg(args.since) if args.since else None
+            until = parse_month_arg(args.until) if args.until else None
+        except ValueError as e:
+            parser.error(str(e))
+
+        try:
+            stats = asyncio.run(ingest(
+                usernames, months, since, until,
+                concurrency=args.concurrency, workers=args.workers,
+                checkpoint_path=Path(args.checkpoint), restart=args.restart
+            ))
+        except KeyboardInterrupt:
+            print("Import interrotto: rilancia lo stesso comando per riprendere dal checkpoint")
+            return
+        print(
+            f"Import completato in {stats['seconds']}s: {stats['api']} mesi scaricati, "
+            f"{stats['revalidated']} invariati (304), {stats['cache']} già in cache, "
+            f"{stats['skipped']} saltati dal checkpoint, {stats['failed']} errori, "
+            f"{stats['new_games']} partite nuove"
+        )
+    else:
+        parser.print_help()
 
 
 if __name__ == "__main__":
@@ -12,8 +12,8 @@ document.addEventListener('DOMContentLoaded', function() {
     const errorMessage = document.getElementById('error-message');
     const resultSummary = document.getElementById('result-summary');
     const resultTable = document.getElementById('result-table');
-    const downloadCSVBtn = document.getElementById('download-csv');
-    const downloadJSONBtn = document.getElementById('download-json');
+    const exportButtons = document.querySelectorAll('[data-export-format]');
+    const exportStatus = document.getElementById('export-status');
     const playerBadgeContainer = document.getElementById('player-badge-container');
     const playerBadge = document.getElementById('player-badge');
     
@@ -23,6 +23,10 @@ document.addEventListener('DOMContentLoaded', function() {
     let dateRangeEnd = 100;
     let gameDates = [];
     let lastHeatmapData = null; // Per memorizzare gli ultimi dati della heatmap
+    let eloSeriesData = null; // Serie Elo per tempo di gioco, già ridotte dal server
+    let eloSeriesKey = null; // Utente, mesi e intervallo dell'ultima richiesta delle serie Elo
+    let lastSummary = null; // Sommario dell'intero periodo (con periodo e info sulla cache)
+    let rangeStatsRequest = 0; // Numero dell'ultima richiesta per intervallo di date
     const dateRangeStartSlider = document.getElementById('date-range-start-slider');
     const dateRangeEndSlider = document.getElementById('date-range-end-slider');
     const dateRangeStartLabel = document.getElementById('date-range-start');
@@ -56,6 +60,8 @@ document.addEventListener('DOMContentLoaded', function() {
         unselectAllBtn.addEventListener('click', unselectAllMonths);
     }
 
+    exportButtons.forEach(button => button.addEventListener('click', handleExportClick));
+
     // Funzione per configurare la rotazione delle icone nei collapsible
     function setupCollapseIconToggle() {
         // Gestisce la rotazione dell'icona quando un collapsible cambia stato
@@ -227,33 +233,28 @@ document.addEventListener('DOMContentLoaded', function() {
             const formData = new FormData();
             formData.append('username', username);
             formData.append('selected_months', JSON.stringify(selectedMonths));
+            // Riceve sommario e partite in streaming (NDJSON), senza i PGN
+            formData.append('stream', 'true');
             
             const response = await fetch('/api/download-games', {
                 method: 'POST',
                 body: formData
             });
             
-            const data = await response.json();
+            let data;
+            const contentType = response.headers.get('content-type') || '';
+            if (contentType.includes('application/x-ndjson')) {
+                data = await consumeGamesStream(response, username);
+            } else {
+                data = await response.json();
+            }
             
             if (data.success) {
                 renderResults(data, username);
                 hideElement(loadingSpinner);
                 showElement(resultSection);
-                
-                // Configura i bottoni di download
-                if (data.summary.csv_path) {
-                    const csvFilename = data.summary.csv_path.split('/').pop();
-                    downloadCSVBtn.setAttribute('data-file', csvFilename);
-                    downloadCSVBtn.addEventListener('click', handleFileDownload);
-                }
-                
-                if (data.summary.json_path) {
-                    const jsonFilename = data.summary.json_path.split('/').pop();
-                    downloadJSONBtn.setAttribute('data-file', jsonFilename);
-                    downloadJSONBtn.addEventListener('click', handleFileDownload);
-                }
             } else {
-                showError(data.error || 'Errore nel recupero delle partite');
+                showError(data.error || data.detail || 'Errore nel recupero delle partite');
                 hideElement(loadingSpinner);
             }
         } catch (error) {
@@ -263,44 +264,125 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    // Gestione download file
-    async function handleFileDownload(e) {
-        const filename = e.target.getAttribute('data-file');
-        if (!filename) return;
+    // Legge la risposta NDJSON di /api/download-games: mostra subito il sommario e chiede
+    // al server le serie Elo senza aspettare che arrivino tutti i blocchi di partite
+    async function consumeGamesStream(response, username) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        const chronologicalGames = [];
+        let summary = null;
+        let buffer = '';
+        
+        const handleMessage = (message) => {
+            if (message.type === 'summary') {
+                summary = message.summary;
+                lastSummary = summary;
+                renderSummary(summary, username);
+                hideElement(loadingSpinner);
+                showElement(resultSection);
+                // Il sommario arriva dopo il caricamento delle partite sul server: le serie sono già calcolabili
+                loadEloSeries(username);
+            } else if (message.type === 'games') {
+                for (const game of message.games) {
+                    chronologicalGames.push(game);
+                }
+            }
+        };
         
-        try {
-            const response = await fetch(`/api/download-file/${filename}`);
-            const data = await response.json();
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
             
-            // Converti hex a bytes array
-            const byteString = atob(
-                data.file_content_base64.match(/.{1,2}/g)
-                    .map(hex => String.fromCharCode(parseInt(hex, 16)))
-                    .join('')
-            );
+            let newlineIndex;
+            while ((newlineIndex = buffer.indexOf('\n')) >= 0) {
+                const line = buffer.slice(0, newlineIndex).trim();
+                buffer = buffer.slice(newlineIndex + 1);
+                if (line) {
+                    handleMessage(JSON.parse(line));
+                }
+            }
+        }
+        if (buffer.trim()) {
+            handleMessage(JSON.parse(buffer));
+        }
+        
+        if (!summary) {
+            return { success: false, error: 'Risposta incompleta dal server' };
+        }
+        // Il resto dell'interfaccia si aspetta le partite dalla più recente alla meno recente
+        return { success: true, summary: summary, data: chronologicalGames.reverse() };
+    }
+
+    // Gestione export: avvia il job sul server, ne segue l'avanzamento e scarica il file quando è pronto
+    async function handleExportClick(e) {
+        const button = e.currentTarget;
+        const format = button.getAttribute('data-export-format');
+        const username = document.getElementById('hidden-username').value;
+        const selectedMonths = getSelectedMonths();
+        
+        if (!username || selectedMonths.length === 0) {
+            showError('Seleziona almeno un mese');
+            return;
+        }
+        
+        button.disabled = true;
+        exportStatus.textContent = 'Preparazione export...';
+        
+        try {
+            const formData = new FormData();
+            formData.append('username', username);
+            formData.append('selected_months', JSON.stringify(selectedMonths));
+            formData.append('format', format);
             
-            let buffer = new ArrayBuffer(byteString.length);
-            let intArray = new Uint8Array(buffer);
-            for (let i = 0; i < byteString.length; i++) {
-                intArray[i] = byteString.charCodeAt(i);
+            const response = await fetch('/api/exports', {
+                method: 'POST',
+                body: formData
+            });
+            const data = await response.json();
+            if (!response.ok || !data.success) {
+                throw new Error(data.detail || data.error || 'Errore nella creazione dell\'export');
             }
             
-            const blob = new Blob([intArray], { type: data.mime_type });
-            const url = URL.createObjectURL(blob);
+            let job = data.job;
+            while (job.status === 'queued' || job.status === 'running') {
+                exportStatus.textContent = `Preparazione export... ${Math.round(job.progress * 100)}%`;
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                const statusResponse = await fetch(`/api/exports/${job.id}`);
+                const statusData = await statusResponse.json();
+                if (!statusResponse.ok || !statusData.success) {
+                    throw new Error(statusData.detail || 'Export non trovato');
+                }
+                job = statusData.job;
+            }
             
-            const a = document.createElement('a');
-            a.href = url;
-            a.download = data.file_name;
-            document.body.appendChild(a);
-            a.click();
-            document.body.removeChild(a);
-            URL.revokeObjectURL(url);
+            if (job.status !== 'done') {
+                throw new Error(job.error || 'Errore durante l\'export');
+            }
+            exportStatus.textContent = '';
+            downloadFile(job.file);
         } catch (error) {
-            console.error('Error downloading file:', error);
-            showError('Errore nel download del file');
+            console.error('Error exporting games:', error);
+            exportStatus.textContent = '';
+            showError(error.message || 'Errore durante l\'export');
+        } finally {
+            button.disabled = false;
         }
     }
 
+    // Gestione download file: il browser scarica direttamente la risposta in streaming,
+    // senza caricare il file in memoria nella pagina
+    function downloadFile(filename) {
+        if (!filename) return;
+        
+        const a = document.createElement('a');
+        a.href = `/api/download-file/${encodeURIComponent(filename)}`;
+        a.download = filename;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+    }
+
     // Rendering del selettore dei periodi
     function renderMonthSelector(months, username) {
         const startPeriodSelect = document.getElementById('start-period');
@@ -456,6 +538,90 @@ document.addEventListener('DOMContentLoaded', function() {
         // Inizializza lo slider dell'intervallo date
         initializeDateRangeSlider(gameData);
         
+        // Popola il sommario
+        lastSummary = summary;
+        renderSummary(summary, username);
+
+        // Crea il grafico dell'andamento Elo con le serie calcolate dal server
+        loadEloSeries(username);
+        
+        // Aggiungi event listener ai radio button per aggiornare il grafico quando cambia la selezione
+        // (le serie di tutti i tempi di gioco sono già state ricevute, non serve una nuova richiesta)
+        document.querySelectorAll('input[name="timeControl"]').forEach(radio => {
+            radio.addEventListener('change', () => createEloChart());
+        });
+        
+        // Assicurati che il radio button "rapid" sia selezionato di default
+        document.getElementById('rapid').checked = true;
+        
+        // Riattiva la gestione delle icone nei collapse dopo aver caricato nuovi contenuti
+        setupCollapseIconToggle();
+
+        // Carica i dati per la heatmap
+        loadHeatmapData(username);
+        
+        // Popola la tabella delle partite (mostra solo le prime 20 partite per prestazioni migliori)
+        const tableBody = resultTable.querySelector('tbody');
+        tableBody.innerHTML = '';
+        
+        // Ottieni il riferimento all'intestazione della tabella
+        const tableHead = document.querySelector('#result-table thead tr');
+        
+        // Determina se mostrare tutte le partite o solo un sottoinsieme
+        const MAX_PREVIEW_GAMES = 20;
+        const gamesToShow = gameData.slice(0, MAX_PREVIEW_GAMES);
+        const totalGames = gameData.length;
+        
+        // Rimuovi eventuali note informative esistenti
+        const existingNotes = document.querySelectorAll('.alert.alert-info.mt-2');
+        existingNotes.forEach(note => note.remove());
+        
+        // Aggiungi una nota se stiamo mostrando solo un sottoinsieme delle partite
+        if (totalGames > MAX_PREVIEW_GAMES) {
+            const note = document.createElement('div');
+            note.className = 'alert alert-info mt-2';
+            note.innerHTML = `
+                <i class="fas fa-info-circle me-2"></i>
+                Mostrando le prime ${MAX_PREVIEW_GAMES} partite di ${totalGames} totali nel periodo selezionato.
+                Per vedere tutte le partite, scarica i dati completi utilizzando i pulsanti qui sopra.
+            `;
+            resultTable.parentNode.insertBefore(note, resultTable);
+        }
+        
+        gamesToShow.forEach(game => {
+            const row = document.createElement('tr');
+            
+            const resultClass = game.result === 'win' 
+                ? 'result-win' 
+                : (game.result === 'loss' ? 'result-loss' : 'result-draw');
+            
+            const resultText = game.result === 'win'
+                ? 'Vittoria'
+                : (game.result === 'loss' ? 'Sconfitta' : 'Patta');
+            
+            const colorIcon = game.user_color === 'white' 
+                ? '<span class="mini-board mini-white"></span>' 
+                : '<span class="mini-board mini-black"></span>';
+                
+            row.innerHTML = `
+                <td>${game.date}</td>
+                <td>${colorIcon} ${game.user_color === 'white' ? 'Bianco' : 'Nero'}</td>
+                <td>${game.opponent}</td>
+                <td class="${resultClass}">${resultText}</td>
+                <td>${game.time_class}</td>
+                <td>
+                    <a href="${game.url}" target="_blank" class="btn btn-sm btn-outline-primary">
+                        Visualizza
+                    </a>
+                </td>
+            `;
+            
+            tableBody.appendChild(row);
+        });
+    }
+
+    // Rendering del sommario (periodo, cache, risultati e colori)
+    function renderSummary(summary, username) {
         // Formattazione del periodo
         const period = summary.period || {};
         const monthNames = {
@@ -554,82 +720,6 @@ document.addEventListener('DOMContentLoaded', function() {
                 </div>
             </div>
         `;
-
-        // Crea il grafico dell'andamento Elo con tutti i dati
-        createEloChart(gameData);
-        
-        // Aggiungi event listener ai radio button per aggiornare il grafico quando cambia la selezione
-        document.querySelectorAll('input[name="timeControl"]').forEach(radio => {
-            radio.addEventListener('change', () => createEloChart(gameData));
-        });
-        
-        // Assicurati che il radio button "rapid" sia selezionato di default
-        document.getElementById('rapid').checked = true;
-        
-        // Riattiva la gestione delle icone nei collapse dopo aver caricato nuovi contenuti
-        setupCollapseIconToggle();
-
-        // Carica i dati per la heatmap
-        loadHeatmapData(username);
-        
-        // Popola la tabella delle partite (mostra solo le prime 20 partite per prestazioni migliori)
-        const tableBody = resultTable.querySelector('tbody');
-        tableBody.innerHTML = '';
-        
-        // Ottieni il riferimento all'intestazione della tabella
-        const tableHead = document.querySelector('#result-table thead tr');
-        
-        // Determina se mostrare tutte le partite o solo un sottoinsieme
-        const MAX_PREVIEW_GAMES = 20;
-        const gamesToShow = gameData.slice(0, MAX_PREVIEW_GAMES);
-        const totalGames = gameData.length;
-        
-        // Rimuovi eventuali note informative esistenti
-        const existingNotes = document.querySelectorAll('.alert.alert-info.mt-2');
-        existingNotes.forEach(note => note.remove());
-        
-        // Aggiungi una nota se stiamo mostrando solo un sottoinsieme delle partite
-        if (totalGames > MAX_PREVIEW_GAMES) {
-            const note = document.createElement('div');
-            note.className = 'alert alert-info mt-2';
-            note.innerHTML = `
-                <i class="fas fa-info-circle me-2"></i>
-                Mostrando le prime ${MAX_PREVIEW_GAMES} partite di ${totalGames} totali nel periodo selezionato.
-                Per vedere tutte le partite, scarica i dati completi utilizzando i pulsanti qui sopra.
-            `;
-            resultTable.parentNode.insertBefore(note, resultTable);
-        }
-        
-        gamesToShow.forEach(game => {
-            const row = document.createElement('tr');
-            
-            const resultClass = game.result === 'win' 
-                ? 'result-win' 
-                : (game.result === 'loss' ? 'result-loss' : 'result-draw');
-            
-            const resultText = game.result === 'win'
-                ? 'Vittoria'
-                : (game.result === 'loss' ? 'Sconfitta' : 'Patta');
-            
-            const colorIcon = game.user_color === 'white' 
-                ? '<span class="mini-board mini-white"></span>' 
-                : '<span class="mini-board mini-black"></span>';
-                
-            row.innerHTML = `
-                <td>${game.date}</td>
-                <td>${colorIcon} ${game.user_color === 'white' ? 'Bianco' : 'Nero'}</td>
-                <td>${game.opponent}</td>
-                <td class="${resultClass}">${resultText}</td>
-                <td>${game.time_class}</td>
-                <td>
-                    <a href="${game.url}" target="_blank" class="btn btn-sm btn-outline-primary">
-                        Visualizza
-                    </a>
-                </td>
-            `;
-            
-            tableBody.appendChild(row);
-        });
     }
 
     // Funzione per caricare i dati della heatmap
@@ -647,6 +737,8 @@ document.addEventListener('DOMContentLoaded', function() {
             const formData = new FormData();
             formData.append('username', username);
             formData.append('selected_months', JSON.stringify(selectedMonths));
+            // Fuso orario del browser, per collocare le partite nel giorno e nell'ora locali
+            formData.append('timezone', Intl.DateTimeFormat().resolvedOptions().timeZone || '');
             
             const response = await fetch('/api/heatmap-data', {
                 method: 'POST',
@@ -661,9 +753,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 renderHeatmap(data.heatmap_data);
                 
                 // Aggiungi listener per i radio button della heatmap
+                // (usa gli ultimi dati ricevuti, che possono essere quelli di un intervallo di date)
                 document.querySelectorAll('input[name="heatmapResult"]').forEach(radio => {
                     radio.addEventListener('change', () => {
-                        renderHeatmap(data.heatmap_data, radio.value);
+                        renderHeatmap(lastHeatmapData, radio.value);
                     });
                 });
             } else {
@@ -896,8 +989,103 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Funzione per caricare dal server le serie Elo (per tempo di gioco, con minimo e massimo)
+    // ridotte a circa un punto per pixel del grafico, eventualmente limitate a un intervallo di date
+    async function loadEloSeries(username, startTimestamp = null, endTimestamp = null) {
+        const selectedMonths = getSelectedMonths();
+        const requestKey = JSON.stringify([username, selectedMonths, startTimestamp, endTimestamp]);
+        if (requestKey === eloSeriesKey) {
+            return;
+        }
+        eloSeriesKey = requestKey;
+        
+        const canvas = document.getElementById('eloChart');
+        const points = Math.max(100, Math.min(2000, canvas.clientWidth || 500));
+        
+        try {
+            const formData = new FormData();
+            formData.append('username', username);
+            formData.append('selected_months', JSON.stringify(selectedMonths));
+            formData.append('points', points);
+            if (startTimestamp !== null && endTimestamp !== null) {
+                formData.append('start', startTimestamp);
+                formData.append('end', endTimestamp);
+            }
+            
+            const response = await fetch('/api/elo-series', {
+                method: 'POST',
+                body: formData
+            });
+            const data = await response.json();
+            
+            // Ignora le risposte arrivate dopo una richiesta più recente (ad es. slider spostato di nuovo)
+            if (requestKey !== eloSeriesKey) {
+                return;
+            }
+            if (data.success) {
+                eloSeriesData = data.series;
+                createEloChart();
+            } else {
+                console.error('Errore nel caricamento delle serie Elo:', data.detail);
+            }
+        } catch (error) {
+            console.error('Error:', error);
+            if (requestKey === eloSeriesKey) {
+                eloSeriesKey = null;
+            }
+        }
+    }
+
+    // Funzione per caricare dal server sommario, heatmap e serie Elo di un intervallo di date
+    // (timestamp Unix, null per l'intero periodo): tutti i pannelli mostrano le stesse partite
+    async function loadRangeStats(username, startTimestamp = null, endTimestamp = null) {
+        const selectedMonths = getSelectedMonths();
+        const requestId = ++rangeStatsRequest;
+        const canvas = document.getElementById('eloChart');
+        
+        try {
+            const formData = new FormData();
+            formData.append('username', username);
+            formData.append('selected_months', JSON.stringify(selectedMonths));
+            formData.append('timezone', Intl.DateTimeFormat().resolvedOptions().timeZone || '');
+            formData.append('points', Math.max(100, Math.min(2000, canvas.clientWidth || 500)));
+            if (startTimestamp !== null && endTimestamp !== null) {
+                formData.append('start', startTimestamp);
+                formData.append('end', endTimestamp);
+            }
+            
+            const response = await fetch('/api/range-stats', {
+                method: 'POST',
+                body: formData
+            });
+            const data = await response.json();
+            
+            // Ignora le risposte superate da uno spostamento più recente dello slider
+            if (requestId !== rangeStatsRequest) {
+                return;
+            }
+            if (!data.success) {
+                console.error('Errore nel caricamento delle statistiche per intervallo:', data.detail);
+                return;
+            }
+            
+            // Periodo e info sulla cache restano quelli dell'intero caricamento
+            renderSummary({ ...lastSummary, ...data.summary }, username);
+            
+            lastHeatmapData = data.heatmap_data;
+            const heatmapRadio = document.querySelector('input[name="heatmapResult"]:checked');
+            renderHeatmap(lastHeatmapData, heatmapRadio ? heatmapRadio.value : 'wins');
+            
+            eloSeriesKey = JSON.stringify([username, selectedMonths, startTimestamp, endTimestamp]);
+            eloSeriesData = data.series;
+            createEloChart();
+        } catch (error) {
+            console.error('Error:', error);
+        }
+    }
+
     // Funzione per creare il grafico dell'andamento Elo
-    function createEloChart(gameData) {
+    function createEloChart() {
         // Controlla se abbiamo già un grafico e lo distrugge per evitare sovrapposizioni
         if (window.eloChart instanceof Chart) {
             window.eloChart.destroy();
@@ -909,64 +1097,50 @@ document.addEventListener('DOMContentLoaded', function() {
         // Ottieni la categoria di tempo selezionata
         const selectedTimeControl = document.querySelector('input[name="timeControl"]:checked').value;
         
-        // Filtra le partite in base alla categoria di tempo selezionata
-        let filteredGames = gameData;
-        if (selectedTimeControl !== 'all') {
-            filteredGames = gameData.filter(game => game.time_class === selectedTimeControl);
-            
-            // Se non ci sono partite per la categoria selezionata, mostra un messaggio
-            if (filteredGames.length === 0) {
-                // Crea un grafico vuoto con un messaggio
-                window.eloChart = new Chart(ctx, {
-                    type: 'bar',
-                    data: {
-                        labels: ['Nessun dato'],
-                        datasets: []
-                    },
-                    options: {
-                        responsive: true,
-                        maintainAspectRatio: false,
-                        plugins: {
-                            title: {
-                                display: true,
-                                text: `Nessuna partita trovata con tempo di gioco "${selectedTimeControl}" nel periodo selezionato`,
-                                color: '#e0e0e0',
-                                font: {
-                                    size: 16
-                                }
+        // Serie della categoria selezionata, già ordinata cronologicamente e ridotta dal server
+        const series = eloSeriesData ? eloSeriesData[selectedTimeControl] : null;
+        if (!series || series.total_games === 0) {
+            // Se non ci sono partite per la categoria selezionata, crea un grafico vuoto con un messaggio
+            window.eloChart = new Chart(ctx, {
+                type: 'bar',
+                data: {
+                    labels: ['Nessun dato'],
+                    datasets: []
+                },
+                options: {
+                    responsive: true,
+                    maintainAspectRatio: false,
+                    plugins: {
+                        title: {
+                            display: true,
+                            text: `Nessuna partita trovata con tempo di gioco "${selectedTimeControl}" nel periodo selezionato`,
+                            color: '#e0e0e0',
+                            font: {
+                                size: 16
                             }
                         }
                     }
-                });
-                
-                // Rimuovi eventuali statistiche di min/max precedenti
-                const statsContainer = document.querySelector('.elo-stats-container');
-                if (statsContainer) {
-                    statsContainer.innerHTML = '';
                 }
-                
-                return;
+            });
+            
+            // Rimuovi eventuali statistiche di min/max precedenti
+            const statsContainer = document.querySelector('.elo-stats-container');
+            if (statsContainer) {
+                statsContainer.innerHTML = '';
             }
+            
+            return;
         }
 
-        // Le partite arrivano ordinate per data decrescente (dal più recente al meno recente)
-        // Per il grafico abbiamo bisogno di ordinarle cronologicamente per data crescente
-        const sortedGames = [...filteredGames].sort((a, b) => {
-            return new Date(a.date) - new Date(b.date);
-        });
-
-        // Calcola il punteggio minimo e massimo nel periodo
-        const ratings = sortedGames.map(game => game.user_rating);
-        const maxRating = Math.max(...ratings);
-        const minRating = Math.min(...ratings);
-        
-        // Trova le date e i dettagli delle partite con punteggio massimo e minimo
-        const maxRatingGame = sortedGames.find(game => game.user_rating === maxRating);
-        const minRatingGame = sortedGames.find(game => game.user_rating === minRating);
+        // Punteggio minimo e massimo del periodo, calcolati dal server su tutte le partite
+        const maxRatingGame = series.max;
+        const minRatingGame = series.min;
+        const maxRating = maxRatingGame.rating;
+        const minRating = minRatingGame.rating;
         
         // Formatta le date
-        const maxRatingDate = new Date(maxRatingGame.date).toLocaleDateString();
-        const minRatingDate = new Date(minRatingGame.date).toLocaleDateString();
+        const maxRatingDate = new Date(maxRatingGame.timestamp * 1000).toLocaleDateString();
+        const minRatingDate = new Date(minRatingGame.timestamp * 1000).toLocaleDateString();
         
         // Aggiorna o crea il container per le statistiche di min/max
         let statsContainer = document.querySelector('.elo-stats-container');
@@ -1027,21 +1201,19 @@ document.addEventListener('DOMContentLoaded', function() {
             </div>
         </div>`;
 
-        // Estrai i dati per il grafico
-        const labels = sortedGames.map(game => {
+        // Estrai i dati per il grafico (i punti arrivano in colonne: timestamp, rating, result, ...)
+        const points = series.points;
+        const labels = points.timestamp.map(timestamp => {
             // Formatta la data in formato più corto per il grafico
-            const date = new Date(game.date);
-            return date.toLocaleDateString();
+            return new Date(timestamp * 1000).toLocaleDateString();
         });
 
-        const ratingValues = sortedGames.map(game => {
-            return game.user_rating;
-        });
+        const ratingValues = points.rating;
 
         // Usa colori diversi per i punti in base al risultato della partita
-        const pointBackgroundColors = sortedGames.map(game => {
-            if (game.result === 'win') return '#75b175'; // Verde per le vittorie
-            if (game.result === 'loss') return '#c33'; // Rosso per le sconfitte
+        const pointBackgroundColors = points.result.map(result => {
+            if (result === 'win') return '#75b175'; // Verde per le vittorie
+            if (result === 'loss') return '#c33'; // Rosso per le sconfitte
             return '#3498db'; // Blu per le patte
         });
 
@@ -1075,7 +1247,8 @@ document.addEventListener('DOMContentLoaded', function() {
                     borderColor: borderColor,
                     tension: 0.2,
                     pointBackgroundColor: pointBackgroundColors,
-                    pointRadius: 5,
+                    // Con molti punti i cerchi si sovrappongono: si rimpiccioliscono
+                    pointRadius: ratingValues.length > 300 ? 2 : 5,
                     pointHoverRadius: 8
                 }]
             },
@@ -1099,15 +1272,15 @@ document.addEventListener('DOMContentLoaded', function() {
                     tooltip: {
                         callbacks: {
                             afterLabel: function(context) {
-                                const game = sortedGames[context.dataIndex];
-                                const result = game.result === 'win' ? 'Vittoria' : 
-                                              (game.result === 'loss' ? 'Sconfitta' : 'Patta');
-                                const color = game.user_color === 'white' ? 'Bianco' : 'Nero';
+                                const index = context.dataIndex;
+                                const result = points.result[index] === 'win' ? 'Vittoria' : 
+                                              (points.result[index] === 'loss' ? 'Sconfitta' : 'Patta');
+                                const color = points.user_color[index] === 'white' ? 'Bianco' : 'Nero';
                                 return [
-                                    `Avversario: ${game.opponent}`,
+                                    `Avversario: ${points.opponent[index]}`,
                                     `Risultato: ${result}`,
                                     `Colore: ${color}`,
-                                    `Tempo: ${game.time_class}`
+                                    `Tempo: ${points.time_class[index]}`
                                 ];
                             }
                         }
@@ -1209,11 +1382,11 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Funzione per inizializzare lo slider dell'intervallo date
     function initializeDateRangeSlider(gameData) {
-        // Crea una copia delle partite e le ordina cronologicamente
-        const sortedGames = [...gameData].sort((a, b) => new Date(a.date) - new Date(b.date));
+        // Le partite arrivano dalla più recente alla meno recente: basta invertirle
+        const sortedGames = [...gameData].reverse();
         
-        // Estrai le date delle partite
-        gameDates = sortedGames.map(game => new Date(game.date));
+        // Estrai le date delle partite (dal timestamp, senza interpretare le stringhe di data)
+        gameDates = sortedGames.map(game => new Date(game.timestamp * 1000));
         
         // Salva i dati ordinati per data per uso futuro
         window.sortedGameData = sortedGames;
@@ -1302,21 +1475,13 @@ document.addEventListener('DOMContentLoaded', function() {
             dateRangeStartLabel.textContent = startDate.toLocaleDateString();
             dateRangeEndLabel.textContent = endDate.toLocaleDateString();
             
-            // Filtra le partite in base alle date effettive
-            const filteredGameData = allGameData.filter(game => {
-                const gameDate = new Date(game.date);
-                return gameDate >= startDate && gameDate <= endDate;
-            });
-            
-            // Aggiorna i grafici con i dati filtrati
-            createEloChart(filteredGameData);
-            
-            // Aggiorna la heatmap se disponibile
-            if (lastHeatmapData) {
-                // Filtra i dati della heatmap in base alle date selezionate
-                // Questo è un esempio, potrebbe essere necessario adattare in base al formato dei dati
-                renderHeatmap(lastHeatmapData);
-            }
+            // Sommario, grafico Elo e heatmap del solo intervallo selezionato, calcolati dal server
+            const username = document.getElementById('hidden-username').value;
+            loadRangeStats(
+                username,
+                window.sortedGameData[startValue].timestamp,
+                window.sortedGameData[endValue].timestamp
+            );
         }
     }
 
@@ -1345,10 +1510,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         updateDateRangeLabels();
         
-        // Aggiorna i grafici con tutti i dati
-        createEloChart(allGameData);
-        if (lastHeatmapData) {
-            renderHeatmap(lastHeatmapData);
-        }
+        // Aggiorna sommario e grafici con tutti i dati
+        loadRangeStats(document.getElementById('hidden-username').value);
     }
 });
\ No newline at end of file
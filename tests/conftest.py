@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# I moduli dell'app creano downloads/ (cache, export, database) nella cartella corrente quando vengono
+# importati: i test girano in una cartella temporanea per non toccare la cache reale
+def pytest_sessionstart(session):
+    os.chdir(tempfile.mkdtemp(prefix="chess-stat-tests-"))
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from app.downloads import parse_range, resolve_download_path
+from app.exports import EXPORTS_DIR
+
+@pytest.fixture
+def export_file():
+    path = EXPORTS_DIR / "alice_games_0123456789abcdef.csv"
+    path.write_text("date,result\n", encoding="utf-8")
+    yield path
+    path.unlink(missing_ok=True)
+
+def test_resolves_existing_export(export_file):
+    assert resolve_download_path(export_file.name) == export_file.resolve()
+
+@pytest.mark.parametrize("name", [
+    "../alice_games_0123456789abcdef.csv",
+    "../../etc/passwd",
+    "/etc/passwd",
+    "..%2F..%2Fetc%2Fpasswd",
+    "%2e%2e/%2e%2e/etc/passwd",
+    "users/../../etc/passwd",
+    "alice_games\x00.csv",
+])
+def test_rejects_traversal(export_file, name):
+    assert resolve_download_path(name) is None
+
+def test_rejects_files_in_subdirectories(export_file):
+    nested = EXPORTS_DIR / "users" / "nested.csv"
+    nested.parent.mkdir(exist_ok=True)
+    nested.write_text("x", encoding="utf-8")
+    try:
+        assert resolve_download_path("users/nested.csv") is None
+    finally:
+        nested.unlink()
+
+def test_rejects_directories_missing_and_hidden_files(export_file):
+    (EXPORTS_DIR / "users").mkdir(exist_ok=True)
+    assert resolve_download_path("users") is None
+    assert resolve_download_path(".") is None
+    assert resolve_download_path("") is None
+    assert resolve_download_path("missing.csv") is None
+    hidden = EXPORTS_DIR / f".{export_file.name}.tmp"
+    hidden.write_text("partial", encoding="utf-8")
+    try:
+        assert resolve_download_path(hidden.name) is None
+    finally:
+        hidden.unlink()
+
+def test_rejects_symlinks_leaving_the_directory(tmp_path):
+    outside = tmp_path / "secret.txt"
+    outside.write_text("secret", encoding="utf-8")
+    link = EXPORTS_DIR / "link.csv"
+    os.symlink(outside, link)
+    try:
+        assert resolve_download_path("link.csv") is None
+    finally:
+        link.unlink()
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    (" bytes=10-10 ", (10, 10)),
+    ("bytes=500-", (500, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+])
+def test_parses_single_ranges(header, expected):
+    assert parse_range(header, 1000) == expected
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=5-2", "bytes=-0"])
+def test_unsatisfiable_ranges_raise(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 1000)
+
+def test_ranges_of_empty_file_are_unsatisfiable():
+    for header in ("bytes=0-", "bytes=-10"):
+        with pytest.raises(ValueError):
+            parse_range(header, 0)
+
+@pytest.mark.parametrize("header", [
+    "bytes=0-1,5-6",
+    "bytes=0-1, 5-6",
+    "bytes=-",
+    "bytes=abc-def",
+    "bytes=1-2-3",
+    "items=0-1",
+    "bytes 0-1",
+    "",
+])
+def test_multi_range_and_malformed_headers_are_ignored(header):
+    assert parse_range(header, 1000) is None
@@ -0,0 +1,47 @@
+import numpy as np
+
+from app.pgn import move_stats
+from app.store import RESULT_DRAW, RESULT_LOSS, RESULT_WIN
+
+
+def history(ecos, results):
+    n = len(ecos)
+    columns = {
+        "end_time": np.arange(n, dtype=np.int64),
+        "result": np.array(results, dtype=np.int8),
+        "is_white": np.ones(n, dtype=bool),
+        "time_class": np.array(["blitz"] * n),
+        "time_control": np.array(["300"] * n),
+    }
+    moves = {
+        "eco": np.array(ecos),
+        "opening": np.array([f"Opening {eco}" if eco else "" for eco in ecos]),
+        "plies": np.full(n, 40, dtype=np.int32),
+        "clock_starts": np.zeros(n, dtype=np.int64),
+        "clock_ends": np.zeros(n, dtype=np.int64),
+        "clocks": np.array([], dtype=np.float32),
+    }
+    return columns, moves
+
+
+def test_games_without_eco_do_not_take_a_top_slot():
+    # Le partite senza ECO sono il gruppo più numeroso
+    ecos = [""] * 10 + ["B20"] * 5 + ["C50"] * 3 + ["A00"] * 2
+    results = [RESULT_WIN, RESULT_DRAW, RESULT_LOSS, RESULT_WIN] * 5
+    columns, moves = history(ecos, results)
+
+    openings = move_stats(columns, moves, top=2)["openings"]
+
+    assert [opening["eco"] for opening in openings] == ["B20", "C50"]
+    assert openings[0]["games"] == 5
+    assert openings[0]["wins"] + openings[0]["draws"] + openings[0]["losses"] == 5
+
+
+def test_all_openings_when_top_exceeds_them():
+    ecos = [""] * 4 + ["B20"] * 2 + ["C50"]
+    columns, moves = history(ecos, [RESULT_WIN] * len(ecos))
+
+    openings = move_stats(columns, moves, top=10)["openings"]
+
+    assert [opening["eco"] for opening in openings] == ["B20", "C50"]
+    assert all(opening["eco"] for opening in openings)
@@ -0,0 +1,110 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+
+from app import ranges
+from app.ranges import build_range_index, range_heatmap, range_summary, window_bounds
+from app.stats import heatmap_matrices
+from app.store import concat_month_columns, month_columns
+from benchmarks.bench_normalize import synthetic_month
+
+TIMEZONE = ZoneInfo("Europe/Rome")
+
+# Inizio dei mesi usati nei test (timestamp Unix)
+JANUARY = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+FEBRUARY = int(datetime(2024, 2, 1, tzinfo=timezone.utc).timestamp())
+MARCH = int(datetime(2024, 3, 1, tzinfo=timezone.utc).timestamp())
+
+# Due mesi consecutivi di partite, uniti come fa il loader
+@pytest.fixture(scope="module")
+def columns():
+    january, _ = month_columns("alice", synthetic_month(3000, seed=1, username="alice", start=JANUARY, step=890))
+    february, _ = month_columns("alice", synthetic_month(2500, seed=2, username="alice", start=FEBRUARY, step=1000))
+    return concat_month_columns([(("2024", "01"), january), (("2024", "02"), february)])
+
+# Calcolo diretto, partita per partita, di sommario, cadenze e heatmap delle partite tra start e end
+def brute_force(columns, start, end):
+    end_time = columns["end_time"]
+    mask = np.ones(len(end_time), dtype=bool)
+    if start is not None:
+        mask &= end_time >= start
+    if end is not None:
+        mask &= end_time <= end
+    result = columns["result"][mask]
+    is_white = columns["is_white"][mask]
+
+    summary = {
+        "total_games": int(mask.sum()),
+        "wins": int((result == 1).sum()),
+        "losses": int((result == -1).sum()),
+        "draws": int((result == 0).sum()),
+        "as_white": int(is_white.sum()),
+        "as_black": int((~is_white).sum()),
+    }
+    time_classes = {}
+    for name in np.unique(columns["time_class"][mask]):
+        class_mask = mask & (columns["time_class"] == name)
+        times = end_time[class_mask]
+        ratings = columns["user_rating"][class_mask]
+        class_result = columns["result"][class_mask]
+        first, last = np.argmin(times), np.argmax(times)
+        time_classes[str(name)] = {
+            "results": [int((class_result == code).sum()) for code in (-1, 0, 1)],
+            "first_time": int(times[first]),
+            "first_rating": int(ratings[first]),
+            "last_time": int(times[last]),
+            "last_rating": int(ratings[last]),
+            "min_rating": int(ratings.min()),
+            "max_rating": int(ratings.max()),
+        }
+    matrices = heatmap_matrices(end_time[mask], result, TIMEZONE)
+    heatmap = np.stack([matrices["losses"], matrices["draws"], matrices["wins"]], axis=2)
+    return summary, time_classes, heatmap
+
+# Finestre di prova: bordi dei mesi, estremi che coincidono con una partita, finestre vuote e casuali
+def windows(columns):
+    end_time = np.sort(columns["end_time"])
+    january_last = int(end_time[end_time < FEBRUARY][-1])
+    cases = [
+        (None, None),
+        (JANUARY, FEBRUARY - 1),
+        (FEBRUARY, MARCH - 1),
+        (FEBRUARY - 1, FEBRUARY),
+        (january_last, january_last),
+        (january_last, int(end_time[end_time >= FEBRUARY][0])),
+        (None, january_last),
+        (january_last + 1, None),
+        (JANUARY - 1000, JANUARY - 1),
+        (MARCH, MARCH + 1000),
+        (FEBRUARY, JANUARY),
+        (january_last + 1, FEBRUARY - 1),
+    ]
+    rng = np.random.default_rng(0)
+    for _ in range(40):
+        start, end = sorted(int(value) for value in rng.integers(JANUARY - 5000, MARCH + 5000, 2))
+        cases.append((start, end))
+    return cases
+
+@pytest.mark.parametrize("block_size", [ranges.RANGE_BLOCK_SIZE, 7])
+def test_range_queries_match_brute_force(columns, monkeypatch, block_size):
+    # Blocchi piccoli: molti confini di blocco cadono dentro le finestre
+    monkeypatch.setattr(ranges, "RANGE_BLOCK_SIZE", block_size)
+    index = build_range_index(columns, TIMEZONE)
+    for start, end in windows(columns):
+        lo, hi = window_bounds(index, start, end)
+        summary, time_classes, heatmap = brute_force(columns, start, end)
+        aggregates = range_summary(index, lo, hi)
+        assert aggregates["summary"] == summary, (start, end)
+        assert aggregates["time_classes"] == time_classes, (start, end)
+        assert np.array_equal(range_heatmap(index, lo, hi), heatmap), (start, end)
+
+def test_empty_window_has_no_games(columns):
+    index = build_range_index(columns, TIMEZONE)
+    lo, hi = window_bounds(index, FEBRUARY, JANUARY)
+    assert lo == hi
+    aggregates = range_summary(index, lo, hi)
+    assert aggregates["summary"]["total_games"] == 0
+    assert aggregates["time_classes"] == {}
+    assert range_heatmap(index, lo, hi).sum() == 0
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app import chess_api, scheduler
+from app.scheduler import BACKOFF_MAX, PRIORITY_BACKFILL, PRIORITY_INTERACTIVE, backoff_delay, parse_retry_after
+from benchmarks.mock_chess_api import create_app
+
+API = "http://mock/pub"
+
+# Esegue test_body(mock) con il client HTTP collegato al server finto (in memoria, senza rete)
+def run_against_mock(test_body, **options):
+    mock = create_app(months=1, games_per_month=1, **options)
+
+    async def main():
+        chess_api._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=mock))
+        try:
+            return await test_body(mock)
+        finally:
+            await chess_api.close_client()
+
+    return asyncio.run(main())
+
+# Registra i tentativi passati a backoff_delay senza attendere davvero
+@pytest.fixture
+def backoff_calls(monkeypatch):
+    calls = []
+    def fake_backoff(attempt, retry_after=None):
+        calls.append((attempt, retry_after))
+        return 0.0
+    monkeypatch.setattr(chess_api, "backoff_delay", fake_backoff)
+    monkeypatch.setattr(scheduler, "BACKOFF_BASE", 0.01)
+    return calls
+
+@pytest.mark.parametrize("status", [429, 403])
+def test_throttled_responses_are_retried(backoff_calls, status):
+    async def body(mock):
+        response = await chess_api.api_get(f"{API}/player/alice")
+        return response, scheduler.scheduler_metrics()["current_rate"]
+
+    response, rate = run_against_mock(body, fail_first=2, fail_status=status, retry_after=None)
+    assert response.status_code == 200
+    assert backoff_calls == [(0, None), (1, None)]
+    # Ogni risposta di limitazione dimezza il rate (che poi risale di poco con la risposta riuscita)
+    assert rate < scheduler.RATE_LIMIT / 2
+
+def test_gives_up_after_max_retries(backoff_calls, monkeypatch):
+    monkeypatch.setattr(chess_api, "MAX_RETRIES", 2)
+
+    async def body(mock):
+        response = await chess_api.api_get(f"{API}/player/alice")
+        return response, mock.state.counters["requests"]
+
+    response, requests = run_against_mock(body, fail_first=100)
+    assert response.status_code == 429
+    assert requests == 3
+    assert [attempt for attempt, _ in backoff_calls] == [0, 1]
+
+def test_retry_after_is_honoured():
+    async def body(mock):
+        started = time.monotonic()
+        response = await chess_api.api_get(f"{API}/player/alice")
+        return response, time.monotonic() - started, mock.state.counters["requests"]
+
+    response, elapsed, requests = run_against_mock(body, fail_first=1, retry_after="1")
+    assert response.status_code == 200
+    assert requests == 2
+    assert elapsed >= 1.0
+
+def test_backoff_delay_grows_exponentially(monkeypatch):
+    # Con il jitter al massimo si vede il limite superiore di ogni tentativo
+    monkeypatch.setattr(scheduler.random, "uniform", lambda low, high: high)
+    assert [backoff_delay(attempt) for attempt in range(4)] == [0.5, 1.0, 2.0, 4.0]
+    assert backoff_delay(20) == BACKOFF_MAX
+    # Retry-After fa da minimo anche quando il backoff sarebbe più breve
+    assert backoff_delay(0, retry_after=5.0) == 5.0
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(" 7 ") == 7.0
+    assert parse_retry_after("999") == BACKOFF_MAX
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
+    assert parse_retry_after(None) is None
+
+def test_interactive_requests_are_served_before_backfill():
+    async def body(mock):
+        # Nessun token disponibile: tutte le richieste finiscono in coda
+        scheduler._bucket.update({"tokens": 0.0, "updated": time.monotonic()})
+        backfill = [
+            asyncio.create_task(chess_api.api_get(f"{API}/player/backfill{index}", priority=PRIORITY_BACKFILL))
+            for index in range(3)
+        ]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(chess_api.api_get(f"{API}/player/interactive", priority=PRIORITY_INTERACTIVE))
+        await asyncio.gather(*backfill, interactive)
+        return mock.state.paths
+
+    paths = run_against_mock(body)
+    assert paths[0] == "/pub/player/interactive"
+    assert sorted(paths[1:]) == [f"/pub/player/backfill{index}" for index in range(3)]
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from app.ranges import build_range_index, window_bounds
+from app.series import MAX_SERIES_POINTS, MIN_SERIES_POINTS, elo_series, lttb_indices
+from app.store import concat_month_columns, month_columns
+from benchmarks.bench_normalize import synthetic_month
+
+# Implementazione di riferimento di LTTB, punto per punto, come descritta nell'algoritmo originale
+def reference_lttb(x, y, threshold):
+    n = len(x)
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, n)
+        average_x = sum(x[end:next_end]) / (next_end - end)
+        average_y = sum(y[end:next_end]) / (next_end - end)
+        best, best_area = start, -1.0
+        for candidate in range(start, end):
+            area = abs(
+                (x[previous] - average_x) * (y[candidate] - y[previous])
+                - (x[previous] - x[candidate]) * (average_y - y[previous])
+            ) / 2
+            if area > best_area:
+                best, best_area = candidate, area
+        selected.append(best)
+        previous = best
+    selected.append(n - 1)
+    return selected
+
+@pytest.fixture(scope="module")
+def columns():
+    month, _ = month_columns("alice", synthetic_month(4000, seed=5, username="alice", start=1_700_000_000, step=600))
+    return concat_month_columns([(("2023", "11"), month)])
+
+@pytest.mark.parametrize("n, threshold", [(10, 3), (100, 7), (1000, 50), (5000, 500), (4001, 4000)])
+def test_lttb_matches_reference(n, threshold):
+    rng = np.random.default_rng(n)
+    x = np.cumsum(rng.integers(1, 1000, n)).astype(float)
+    y = rng.normal(1500, 200, n).round()
+    indices = lttb_indices(x, y, threshold)
+    assert indices.tolist() == reference_lttb(x.tolist(), y.tolist(), threshold)
+    assert len(indices) == threshold
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert np.all(np.diff(indices) > 0)
+
+def test_lttb_keeps_short_series_whole():
+    x = np.arange(10)
+    assert lttb_indices(x, x, 10).tolist() == list(range(10))
+    assert lttb_indices(x, x, 50).tolist() == list(range(10))
+    assert lttb_indices(x, x, MIN_SERIES_POINTS - 1).tolist() == list(range(10))
+
+@pytest.mark.parametrize("points", [MIN_SERIES_POINTS, 20, 500])
+def test_series_keep_first_last_min_and_max(columns, points):
+    index = build_range_index(columns)
+    series = elo_series(columns, index, points=points)
+
+    for name in ["all", *index["class_names"]]:
+        if name == "all":
+            mask = np.ones(len(columns["end_time"]), dtype=bool)
+        else:
+            mask = columns["time_class"] == name
+        order = np.argsort(columns["end_time"][mask], kind="stable")
+        times = columns["end_time"][mask][order]
+        ratings = columns["user_rating"][mask][order]
+
+        current = series[name]
+        kept = current["points"]
+        assert current["total_games"] == mask.sum()
+        assert kept["timestamp"] == sorted(kept["timestamp"])
+        assert kept["timestamp"][0] == times[0] and kept["timestamp"][-1] == times[-1]
+        # Al massimo i punti richiesti più minimo e massimo (se LTTB non li ha già scelti)
+        assert len(kept["timestamp"]) <= max(points, MIN_SERIES_POINTS) + 2
+        # Minimo e massimo: la prima partita con il rating estremo, e sempre presente tra i punti
+        assert current["max"]["rating"] == ratings.max()
+        assert current["min"]["rating"] == ratings.min()
+        assert current["max"]["timestamp"] == times[np.argmax(ratings)]
+        assert current["min"]["timestamp"] == times[np.argmin(ratings)]
+        pairs = set(zip(kept["timestamp"], kept["rating"]))
+        assert (current["max"]["timestamp"], current["max"]["rating"]) in pairs
+        assert (current["min"]["timestamp"], current["min"]["rating"]) in pairs
+
+def test_series_of_a_window(columns):
+    index = build_range_index(columns)
+    end_time = np.sort(columns["end_time"])
+    lo, hi = window_bounds(index, int(end_time[1000]), int(end_time[1999]))
+    series = elo_series(columns, index, lo, hi, points=MAX_SERIES_POINTS)
+    # Con abbastanza punti la serie contiene esattamente le partite della finestra
+    assert series["all"]["total_games"] == 1000
+    assert series["all"]["points"]["timestamp"] == end_time[1000:2000].tolist()
+
+def test_empty_window_series(columns):
+    index = build_range_index(columns)
+    series = elo_series(columns, index, 0, 0)
+    assert all(current == {"total_games": 0, "points": None, "max": None, "min": None} for current in series.values())